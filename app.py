@@ -7,32 +7,70 @@ UI Features:
   - retrieved chunks + distances
   - reranked chunks used in final answer
   - gating reason
+  - per-stage timings and token usage
+- A "Metrics" accordion with p50/p95 latency per stage (Prometheus text format)
 
 This helps you verify the system is retrieving the right info.
+
+Startup:
+- The UI comes up first. Preparing the index (restoring the snapshot, or building
+  it if there is none) and opening clients happen in a background thread, with a "warming up" status meanwhile.
+- Questions asked while warming up wait for it and are then answered.
+- Import time, warm-up phases and time to first answer are printed and exported
+  as the rag_startup_ms gauge in the Metrics accordion.
+
+KB hot reload:
+- Once warm, a background thread watches kb/ (CONFIG.kb_watch). Edits are ingested
+  into a new generation of the index while chats keep being answered from the
+  current one, which is swapped out once the new one validates (ingest.reload_index).
 """
 
+# Imported first: marks process start for the startup timings
+from core.startup import STARTUP
+
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
 import json
-import os
-from pathlib import Path
+import threading
 
 import gradio as gr
 
-from core.rag_pipeline import run_rag
-from ingest import ingest
+from core.config import CONFIG
+from core.metrics import metrics_prometheus_text
+
+STARTUP.mark("imports")
 
-if not os.path.exists("vectordb") or not os.listdir("vectordb"):
-    ingest()
 
-def ensure_vectordb():
+def warm_up():
     """
+    Runs in the background while the UI is already up.
+
     On Hugging Face Spaces, the container can start fresh.
-    If vectordb doesn't exist, build it from kb/ automatically.
+    If vectordb doesn't exist, load it from the shipped snapshot (snapshot/), or
+    build it from kb/ when there is no usable snapshot.
     """
-    if not Path("vectordb").exists():
-        os.system("python ingest.py")
+    from ingest import prepare_index
+    how = prepare_index()
+    STARTUP.mark(f"index_{how}")
+
+    # Importing the pipeline pulls in chromadb/openai on first use; do it here, not at import
+    from core.rag_pipeline import warm_up as warm_up_pipeline
+    warm_up_pipeline()
+    STARTUP.mark("pipeline")
+
+    if CONFIG.kb_watch:
+        from ingest import watch_kb
+        threading.Thread(target=watch_kb, name="kb-watcher", daemon=True).start()
+
+
+def startup_status() -> str:
+    if STARTUP.state == "warming":
+        return "⏳ _Warming up: preparing the knowledge base index. Questions will be answered once it's ready._"
+    if STARTUP.state == "failed":
+        return f"⚠️ Startup failed: `{STARTUP.error}`"
+    return f"✅ Ready (started in {STARTUP.phases['ready'] / 1000:.1f}s)"
 
 
 def format_debug(debug: dict) -> str:
@@ -42,29 +80,66 @@ def format_debug(debug: dict) -> str:
     return json.dumps(debug, indent=2, ensure_ascii=False)
 
 
-def chat_fn(message, history):
+def format_timings(debug: dict) -> str:
     """
-    Process user messages and return formatted responses.
+    One-line summary of where the time went, e.g. "embed 12 ms · retrieve 8 ms · ...".
     """
-    result = run_rag(message)
-    answer = result["answer"]
-    sources = result["sources"]
-    debug = result["debug"]
+    trace = debug.get("trace")
+    if not trace:
+        return ""
+    stages = " · ".join(f"{name} {ms:.0f} ms" for name, ms in trace["timings_ms"].items())
+    tokens = sum(u["prompt_tokens"] + u["completion_tokens"] for u in trace["usage"].values())
+    return f"**Timings:** {stages}  \n**Tokens:** {tokens}"
+
 
+def format_answer(answer: str, sources: list) -> str:
+    """
+    Answer text followed by the list of sources used.
+    """
     sources_md = (
         "\n".join([f"- {s}" for s in sources]) if sources else "_No sources used._"
     )
-    final_md = f"{answer}\n\n---\n**Sources used:**\n{sources_md}"
+    return f"{answer}\n\n---\n**Sources used:**\n{sources_md}"
 
-    return final_md, format_debug(debug)
 
+async def chat_fn(message, history):
+    """
+    Process user messages and yield formatted responses as the answer streams in.
 
-with gr.Blocks(title="HealthierYou (RAG)") as demo:
-    ensure_vectordb()
+    Async so the Gradio event loop can serve other chats while this one waits on OpenAI.
+    Yields (answer markdown so far, debug JSON, timings markdown).
+    """
+    if not STARTUP.ready:
+        yield "_Warming up, your question will be answered in a moment..._", "", ""
+        await asyncio.to_thread(STARTUP.wait)
+        if not STARTUP.ready:
+            yield f"Sorry, the assistant failed to start: `{STARTUP.error}`", "", ""
+            return
+
+    from core.rag_pipeline import run_rag_stream_async
+
+    partial = ""
+    debug_text = ""
+    async for event in run_rag_stream_async(message):
+        if event["type"] == "retrieval":
+            debug_text = format_debug(event["debug"])
+            yield "_Writing answer..._", debug_text, ""
+        elif event["type"] == "token":
+            partial += event["text"]
+            yield partial, debug_text, ""
+        else:  # done
+            debug = event["debug"]
+            STARTUP.mark_once("first_answer")
+            yield format_answer(event["answer"], event["sources"]), format_debug(debug), format_timings(debug)
 
+
+with gr.Blocks(title="HealthierYou (RAG)") as demo:
     gr.Markdown(
         "# HealthierYou Assistant (RAG)\nAsk questions about the internal knowledge base."
     )
+    status_md = gr.Markdown(startup_status())
+    # Polls the warm-up state and switches itself off once it's settled
+    status_timer = gr.Timer(1.0)
 
     with gr.Row():
         with gr.Column(scale=2): # scale=2 means column takes 2/3 of the width
@@ -74,44 +149,59 @@ with gr.Blocks(title="HealthierYou (RAG)") as demo:
 
         with gr.Column(scale=1): # scale=1 means column takes 1/3 of the width
             with gr.Accordion("Debug (retrieval + reranking)", open=False): # Collapsible section (like a dropdown)
+                timings_md = gr.Markdown()
                 debug_box = gr.Textbox(lines=25, label="Debug JSON")
+            with gr.Accordion("Metrics (latency per stage)", open=False):
+                metrics_box = gr.Textbox(lines=20, label="Prometheus text")
+                refresh_metrics = gr.Button("Refresh metrics")
 
-    def respond(user_message, chat_history):
+    async def respond(user_message, chat_history):
         """
         Handle user interactions and update the UI.
         
         This function:
-        1. Gets the response from chat_fn (which runs RAG)
-        2. Appends user message to chat history
-        3. Appends assistant response to chat history
-        4. Returns: empty string (clears input), updated history, debug info
+        1. Appends user message to chat history
+        2. Appends an assistant message and fills it in as chat_fn streams tokens
+        3. Yields: empty string (clears input), updated history, debug info, timings
         """
-        response, debug_text = chat_fn(user_message, chat_history)
-        
         # Append user message
         chat_history.append(
             {"role": "user", "content": user_message}
         )
 
-        # Append assistant response
+        # Append assistant response (updated in place while streaming)
         chat_history.append(
-            {"role": "assistant", "content": response}
+            {"role": "assistant", "content": ""}
         )
 
-        # Return 3 values to update 3 UI components
-        return "", chat_history, debug_text
+        async for response, debug_text, timings in chat_fn(user_message, chat_history):
+            chat_history[-1]["content"] = response
+
+            # Yield 4 values to update 4 UI components
+            yield "", chat_history, debug_text, timings
 
     send.click(
         respond, 
         inputs=[msg, chatbot], 
-        outputs=[msg, chatbot, debug_box]
+        outputs=[msg, chatbot, debug_box, timings_md]
     )
     msg.submit(
         respond, 
         inputs=[msg, chatbot], 
-        outputs=[msg, chatbot, debug_box]
+        outputs=[msg, chatbot, debug_box, timings_md]
     )
 
+    refresh_metrics.click(metrics_prometheus_text, outputs=[metrics_box])
+
+    def poll_status():
+        return startup_status(), gr.Timer(active=STARTUP.state == "warming")
+
+    status_timer.tick(poll_status, outputs=[status_md, status_timer])
+    demo.load(poll_status, outputs=[status_md, status_timer])
+
+STARTUP.mark("ui_built")
+STARTUP.warm_up_in_background(warm_up)
+
 
 if __name__ == "__main__":
     demo.launch(theme=gr.themes.Glass())
@@ -0,0 +1,106 @@
+"""
+Batch question answering from the command line.
+
+Reads questions from a JSON lines file and writes one JSON line per answer,
+for offline evaluation and nightly regression runs.
+
+Input: one question per line, either an object or a bare JSON string:
+    {"id": "q1", "question": "How much is the Premium plan?"}
+    "Can I cancel anytime?"
+("query" is accepted as an alias of "question"; "id" defaults to the line number.)
+
+Output fields: id, question, answer, sources, gate_reason, duplicate_of,
+answer_cache_hit, retrieval, rerank, timings_ms, usage (and the full debug payload
+with --debug). "retrieval" and "rerank" hold the adaptive rerank decisions, for
+tuning its thresholds offline.
+
+Usage:
+    python batch_qa.py questions.jsonl --out answers.jsonl --concurrency 8
+    python batch_qa.py questions.jsonl --source 02_pricing.md   # answer from one file only
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+from core.batch import run_rag_batch
+from core.config import CONFIG
+from core.retriever import metadata_filter
+
+
+def read_questions(path: str) -> List[Dict[str, Any]]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            question = item.get("question", item.get("query"))
+            if not question:
+                raise ValueError(f"{path}:{line_no}: no 'question' field")
+            questions.append({"id": item.get("id", line_no), "question": question})
+    return questions
+
+
+def answer_record(item: Dict[str, Any], result: Dict[str, Any], items: List[Dict[str, Any]], with_debug: bool) -> Dict[str, Any]:
+    debug = result["debug"]
+    duplicate_of = debug["batch"]["duplicate_of"]
+    record = {
+        "id": item["id"],
+        "question": item["question"],
+        "answer": result["answer"],
+        "sources": result["sources"],
+        "gate_reason": debug.get("gate_reason"),
+        # id of the earlier, identical question whose answer was reused
+        "duplicate_of": items[duplicate_of]["id"] if duplicate_of is not None else None,
+        "answer_cache_hit": "answer_cache" in debug,
+        "retrieval": debug.get("retrieval"),
+        "rerank": debug.get("rerank"),
+        "timings_ms": debug["trace"]["timings_ms"],
+        "usage": debug["trace"]["usage"],
+    }
+    if with_debug:
+        record["debug"] = debug
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSON lines file of questions")
+    parser.add_argument("questions", help="input JSON lines file")
+    parser.add_argument("--out", default="-", help="output JSON lines file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=CONFIG.batch_concurrency,
+                        help="questions reranked/generated at the same time")
+    parser.add_argument("--debug", action="store_true", help="include the full debug payload")
+    parser.add_argument("--source", action="append", help="only retrieve from this KB file (repeatable)")
+    parser.add_argument("--heading", help='only retrieve from this section, e.g. "Pricing > Core Programs"')
+    args = parser.parse_args(argv)
+
+    items = read_questions(args.questions)
+    where = metadata_filter(source=args.source, heading=args.heading)
+    start = time.perf_counter()
+    results = run_rag_batch([item["question"] for item in items], concurrency=args.concurrency, where=where)
+    seconds = time.perf_counter() - start
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        for item, result in zip(items, results):
+            out.write(json.dumps(answer_record(item, result, items, args.debug), ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    unique = results[0]["debug"]["batch"]["unique"] if results else 0
+    print(
+        f"Answered {len(items)} questions ({unique} unique) in {seconds:.1f}s "
+        f"({len(items) / seconds if seconds else 0:.1f} questions/sec)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
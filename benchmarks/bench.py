@@ -0,0 +1,324 @@
+"""
+Offline benchmark suite.
+
+Runs entirely against fake OpenAI clients (core/fake_openai.py), so numbers reflect
+our own code: chunking, embedding cache/batching, Chroma, reranking and the pipeline.
+
+What it measures, per corpus size:
+1) chunking throughput (MB/s, chunks/s)
+2) ingest wall time and peak RSS (in a fresh subprocess, so RSS is ingest-only)
+3) query latency p50/p95/p99 of run_rag (sequential)
+4) QPS of run_rag_async at several concurrency levels
+
+Synthetic corpora are built by replicating kb/ with per-copy variations until the
+requested chunk count is reached.
+
+Usage:
+    python -m benchmarks.bench --chunks 1000,10000 --out bench.json
+    python -m benchmarks.bench --chunks 1000 --llm-latency-ms 300 --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from core.chunking import chunk_text  # noqa: E402
+from core.config import CONFIG, override_config  # noqa: E402
+from core.fake_openai import install_fake_openai  # noqa: E402
+
+SOURCE_KB = REPO_ROOT / "kb"
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+)$", re.MULTILINE)
+
+
+# ---------- synthetic corpus ----------
+
+def synth_corpus(out_dir: Path, target_chunks: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Write markdown files into out_dir until they hold ~target_chunks chunks.
+
+    Each file is a variant of one kb/ file: headings get a copy number and every
+    paragraph gets a few random KB words, so no two chunks are identical.
+    """
+    rng = random.Random(seed)
+    sources = [(p.stem, p.read_text(encoding="utf-8")) for p in sorted(SOURCE_KB.glob("*.md"))]
+    vocab = sorted({w for _, text in sources for w in re.findall(r"[A-Za-z]{4,}", text)})
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chunks = files = total_bytes = 0
+    while chunks < target_chunks:
+        stem, text = sources[files % len(sources)]
+        copy_no = files // len(sources)
+        text = HEADING_RE.sub(lambda m: f"{m.group(1)} {m.group(2)} (edition {copy_no})", text)
+        paragraphs = [
+            p + " " + " ".join(rng.choice(vocab) for _ in range(6)) if p.strip() else p
+            for p in text.split("\n\n")
+        ]
+        text = "\n\n".join(paragraphs)
+
+        (out_dir / f"{copy_no:05d}_{stem}.md").write_text(text, encoding="utf-8")
+        chunks += len(chunk_text(text, CONFIG.max_chunk_tokens, CONFIG.chunk_overlap_tokens, CONFIG.embedding_model))
+        total_bytes += len(text.encode("utf-8"))
+        files += 1
+
+    return {"files": files, "chunks": chunks, "bytes": total_bytes}
+
+
+def synth_queries(n: int, seed: int = 1) -> List[str]:
+    """
+    Questions built from KB headings, e.g. "What is Pricing Plans?".
+    """
+    rng = random.Random(seed)
+    headings = [
+        m.group(2).strip()
+        for p in sorted(SOURCE_KB.glob("*.md"))
+        for m in HEADING_RE.finditer(p.read_text(encoding="utf-8"))
+    ]
+    templates = ["What is {}?", "Tell me about {}.", "How does {} work?", "Can you explain {}?"]
+    return [rng.choice(templates).format(rng.choice(headings)) + f" #{i}" for i in range(n)]
+
+
+# ---------- benchmarks ----------
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pct(q: float) -> float:
+        return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 3)
+
+    return {"p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "mean_ms": round(sum(values) / len(values), 3)}
+
+
+def bench_chunking(kb_dir: Path, repeat: int = 3) -> Dict[str, Any]:
+    texts = [p.read_text(encoding="utf-8") for p in sorted(kb_dir.glob("*.md"))]
+    total_bytes = sum(len(t.encode("utf-8")) for t in texts)
+    best = float("inf")
+    n_chunks = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        n_chunks = sum(
+            len(chunk_text(t, CONFIG.max_chunk_tokens, CONFIG.chunk_overlap_tokens, CONFIG.embedding_model))
+            for t in texts
+        )
+        best = min(best, time.perf_counter() - start)
+    return {
+        "seconds": round(best, 4),
+        "chunks": n_chunks,
+        "mb_per_sec": round(total_bytes / 1e6 / best, 2),
+        "chunks_per_sec": round(n_chunks / best, 1),
+    }
+
+
+def bench_ingest(workdir: Path, args) -> Dict[str, Any]:
+    """
+    Run a full ingest in a fresh interpreter and read back its wall time and peak RSS.
+    """
+    cmd = [
+        sys.executable, "-m", "benchmarks.bench", "--ingest-worker", str(workdir),
+        "--dim", str(args.dim), "--embed-latency-ms", str(args.embed_latency_ms),
+        "--backend", args.backend, "--numpy-dtype", args.numpy_dtype,
+    ]
+    out = subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def ingest_worker(workdir: Path, args) -> None:
+    os.chdir(workdir)
+    override_config(vector_backend=args.backend, numpy_store_dtype=args.numpy_dtype)
+    install_fake_openai(embed_latency_s=args.embed_latency_ms / 1000, dim=args.dim)
+    import contextlib
+    import io
+
+    from ingest import ingest
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        counts = ingest(kb_dir=Path("kb"), full=True)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+    print(json.dumps({
+        "seconds": round(seconds, 3),
+        "chunks": counts["added"],
+        "chunks_per_sec": round(counts["added"] / seconds, 1),
+        "peak_rss_mb": round(rss_mb, 1),
+    }))
+
+
+def bench_queries(queries: List[str]) -> Dict[str, Any]:
+    from core.rag_pipeline import run_rag
+
+    run_rag(queries[0])  # warm up: client, collection handle, tiktoken
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        run_rag(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"queries": len(queries), **percentiles(latencies)}
+
+
+def bench_concurrency(queries: List[str], levels: List[int]) -> Dict[str, Any]:
+    from core.rag_pipeline import run_rag_async
+
+    async def run(level: int) -> Dict[str, Any]:
+        sem = asyncio.Semaphore(level)
+        latencies = []
+
+        async def one(q: str) -> None:
+            async with sem:
+                start = time.perf_counter()
+                await run_rag_async(q)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        seconds = time.perf_counter() - start
+        return {"qps": round(len(queries) / seconds, 2), **percentiles(latencies)}
+
+    return {str(level): asyncio.run(run(level)) for level in levels}
+
+
+# ---------- driver ----------
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """
+    Print the relative change of every numeric leaf present in both runs.
+    """
+    def leaves(d: Dict[str, Any], prefix: str = ""):
+        for k, v in d.items():
+            key = f"{prefix}.{k}" if prefix else k
+            if isinstance(v, dict):
+                yield from leaves(v, key)
+            elif isinstance(v, (int, float)) and not isinstance(v, bool):
+                yield key, v
+
+    base = dict(leaves(baseline.get("results", {})))
+    print(f"\n{'metric':60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, value in leaves(current["results"]):
+        if key in base and base[key]:
+            change = (value - base[key]) / base[key] * 100
+            print(f"{key:60} {base[key]:>12} {value:>12} {change:>+7.1f}%")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Offline RAG benchmarks (fake OpenAI backend)")
+    parser.add_argument("--chunks", default="1000", help="comma-separated corpus sizes in chunks (up to 100000)")
+    parser.add_argument("--queries", type=int, default=200, help="queries per latency benchmark")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--dim", type=int, default=1536, help="fake embedding dimension")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated chat completion latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="simulated embeddings request latency")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma", help="vector backend for queries")
+    parser.add_argument("--numpy-dtype", choices=["float32", "float16", "int8"], default="float32",
+                        help="storage dtype of the numpy backend")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary corpora/DBs")
+    parser.add_argument("--ingest-worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.ingest_worker:
+        ingest_worker(Path(args.ingest_worker), args)
+        return
+
+    sizes = [int(s) for s in args.chunks.split(",")]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    out_path = Path(args.out).resolve()
+    compare_path = Path(args.compare).resolve() if args.compare else None
+
+    # Measure the pipeline itself: no answer cache, and never refuse on the gate
+    override_config(
+        answer_cache_enabled=False,
+        max_best_distance=2.0,
+        vector_backend=args.backend,
+        numpy_store_dtype=args.numpy_dtype,
+    )
+    install_fake_openai(
+        chat_latency_s=args.llm_latency_ms / 1000,
+        embed_latency_s=args.embed_latency_ms / 1000,
+        dim=args.dim,
+    )
+
+    results: Dict[str, Any] = {}
+    root = Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    original_cwd = os.getcwd()
+    try:
+        for size in sizes:
+            workdir = root / f"corpus_{size}"
+            print(f"[{size} chunks] generating corpus ...", flush=True)
+            corpus = synth_corpus(workdir / "kb", size)
+
+            print(f"[{size} chunks] chunking ...", flush=True)
+            chunking = bench_chunking(workdir / "kb")
+
+            print(f"[{size} chunks] ingest ...", flush=True)
+            ingest_result = bench_ingest(workdir, args)
+
+            # Config paths are relative, so the pipeline uses this corpus's DB
+            os.chdir(workdir)
+            from core.store import reset_store
+            reset_store()
+            queries = synth_queries(args.queries)
+
+            print(f"[{size} chunks] query latency ...", flush=True)
+            latency = bench_queries(queries)
+
+            print(f"[{size} chunks] concurrent QPS ...", flush=True)
+            qps = bench_concurrency(synth_queries(args.queries, seed=2), levels)
+            os.chdir(original_cwd)
+
+            results[str(size)] = {
+                "corpus": corpus,
+                "chunking": chunking,
+                "ingest": ingest_result,
+                "query_latency": latency,
+                "concurrency": qps,
+            }
+    finally:
+        os.chdir(original_cwd)
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "dim": args.dim,
+            "llm_latency_ms": args.llm_latency_ms,
+            "embed_latency_ms": args.embed_latency_ms,
+            "retrieve_k": CONFIG.retrieve_k,
+            "reranker": CONFIG.reranker,
+            "vector_backend": CONFIG.vector_backend,
+            "numpy_store_dtype": CONFIG.numpy_store_dtype,
+            "max_chunk_tokens": CONFIG.max_chunk_tokens,
+        },
+        "results": results,
+    }
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(results, indent=2))
+    print(f"Wrote {out_path}")
+
+    if compare_path:
+        compare(report, json.loads(compare_path.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Chunker benchmark on large markdown files.
+
+Compares, on the same synthetic corpus:
+- legacy:   the previous character chunker (sections re-concatenated as
+            f"{title}\\n{body}", fixed-size character windows), kept here as the baseline
+- offsets:  core.chunking.chunk_text in one process (token-bounded, offset records)
+- pool:     core.chunking.chunk_files with N worker processes
+
+and reports MB/s, chunk counts, how many chunks end mid-word, the largest chunk
+in tokens and the memory held by the result (strings vs offset records).
+
+Usage:
+    python -m benchmarks.chunking --files 40 --file-mb 2 --workers 1,2,4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.bench import HEADING_RE, SOURCE_KB
+from core.chunking import CHARS_PER_TOKEN, chunk_files, chunk_text
+from core.config import CONFIG
+from core.embeddings import count_tokens, get_encoding
+
+
+# ---------- baseline ----------
+
+def _legacy_windows(text: str, max_chars: int, overlap: int):
+    """(section_text, start) of every chunk the previous chunker made."""
+    matches = list(HEADING_RE.finditer(text))
+    sections = [("Document", text)] if not matches else []
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections.append((f"{m.group(1)} {m.group(2).strip()}", text[m.start():end].strip()))
+
+    for title, body in sections:
+        section_text = f"{title}\n{body}".strip()
+        i = 0
+        while True:
+            yield section_text, i
+            if i + max_chars >= len(section_text):
+                break
+            i += max_chars - overlap
+
+
+def legacy_chunk_markdown(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
+    """
+    The character chunker core/chunking.py used before offsets and token bounds.
+    """
+    return [section[i : i + max_chars] for section, i in _legacy_windows(text, max_chars, overlap)]
+
+
+def legacy_mid_word_cuts(text: str, max_chars: int, overlap: int) -> int:
+    end = lambda i: i + max_chars  # noqa: E731
+    return sum(
+        1 for section, i in _legacy_windows(text, max_chars, overlap)
+        if end(i) < len(section) and section[end(i) - 1].isalnum() and section[end(i)].isalnum()
+    )
+
+
+# ---------- corpus ----------
+
+def large_corpus(out_dir: Path, files: int, file_mb: float) -> List[str]:
+    """
+    Write `files` markdown files of about file_mb MB each, built from kb/ with
+    numbered headings and some long unbroken sections.
+    """
+    sources = [p.read_text(encoding="utf-8") for p in sorted(SOURCE_KB.glob("*.md"))]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for n in range(files):
+        parts, size, copy_no = [], 0, 0
+        while size < file_mb * 1e6:
+            text = sources[copy_no % len(sources)]
+            text = HEADING_RE.sub(lambda m: f"{m.group(1)} {m.group(2)} ({n}.{copy_no})", text)
+            if copy_no % 3 == 0:
+                # A long section, so the splitter has work to do
+                text += f"\n\n## Long notes {copy_no}\nNotes: " + " ".join(sources[copy_no % len(sources)].split()) * 3
+            parts.append(text)
+            size += len(text)
+            copy_no += 1
+        path = out_dir / f"{n:04d}.md"
+        path.write_text("\n\n".join(parts), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+# ---------- measurements ----------
+
+def timed(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def held_bytes(fn: Callable[[], Any]) -> int:
+    """Memory still allocated by fn's result after it returns."""
+    tracemalloc.start()
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def mid_word_cuts(text: str, chunks) -> int:
+    """Chunks that end inside a word."""
+    return sum(1 for c in chunks if c.end < len(text) and text[c.end - 1].isalnum() and text[c.end].isalnum())
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the chunker on large markdown files")
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--file-mb", type=float, default=2.0)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated process counts for chunk_files")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="write results as JSON here")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-chunking-"))
+    results: Dict[str, Any] = {}
+    try:
+        paths = large_corpus(workdir, args.files, args.file_mb)
+        texts = [Path(p).read_text(encoding="utf-8") for p in paths]
+        mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+        model = CONFIG.embedding_model
+        tokenizer = "tiktoken" if get_encoding(model) is not False else "offline estimate (3 chars/token)"
+        print(f"{len(paths)} files, {mb:.1f} MB, tokens: {tokenizer}", flush=True)
+
+        # Legacy chunk size in characters ~ the same size in tokens
+        max_chars = CONFIG.max_chunk_tokens * CHARS_PER_TOKEN
+        overlap_chars = CONFIG.chunk_overlap_tokens * CHARS_PER_TOKEN
+        seconds, legacy = timed(lambda: [legacy_chunk_markdown(t, max_chars, overlap_chars) for t in texts], args.repeat)
+        sample = [c for chunks in legacy[:2] for c in chunks]
+        results["legacy"] = {
+            "mb_per_sec": round(mb / seconds, 2),
+            "chunks": sum(len(c) for c in legacy),
+            "max_tokens": max(count_tokens(sample, model)),
+            "mid_word_cuts": sum(legacy_mid_word_cuts(t, max_chars, overlap_chars) for t in texts),
+            "result_bytes": held_bytes(lambda: [legacy_chunk_markdown(t, max_chars, overlap_chars) for t in texts]),
+        }
+
+        def offsets() -> List[list]:
+            return [chunk_text(t, CONFIG.max_chunk_tokens, CONFIG.chunk_overlap_tokens, model) for t in texts]
+
+        seconds, records = timed(offsets, args.repeat)
+        sample = [c.text(t) for chunks, t in zip(records[:2], texts[:2]) for c in chunks]
+        results["offsets"] = {
+            "mb_per_sec": round(mb / seconds, 2),
+            "chunks": sum(len(c) for c in records),
+            "max_tokens": max(count_tokens(sample, model)),
+            "mid_word_cuts": sum(mid_word_cuts(t, chunks) for chunks, t in zip(records, texts)),
+            "result_bytes": held_bytes(offsets),
+        }
+
+        for n in [int(w) for w in args.workers.split(",")]:
+            seconds, _ = timed(
+                lambda: list(chunk_files(paths, CONFIG.max_chunk_tokens, CONFIG.chunk_overlap_tokens, model, n)),
+                args.repeat,
+            )
+            results[f"pool_{n}"] = {"mb_per_sec": round(mb / seconds, 2)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = results["legacy"]["mb_per_sec"]
+    print(f"\n{'chunker':>10} {'MB/s':>8} {'vs legacy':>10} {'chunks':>8} {'max_tok':>8} {'mid-word':>9} {'result MB':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:>10} {r['mb_per_sec']:>8} {r['mb_per_sec'] / base:>9.2f}x {r.get('chunks', ''):>8} "
+            f"{r.get('max_tokens', ''):>8} {r.get('mid_word_cuts', ''):>9} "
+            f"{round(r['result_bytes'] / 1e6, 1) if 'result_bytes' in r else '':>10}"
+        )
+    print(f"(this machine has {os.cpu_count()} CPU cores; max_tok is measured on the first 2 files)")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({"settings": vars(args), "results": results}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
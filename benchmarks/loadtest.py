@@ -0,0 +1,138 @@
+"""
+Load test for serve.py against the fake OpenAI backend.
+
+For each worker count it starts `serve.py --fake --workers N` on a synthetic corpus,
+drives it with a fixed number of concurrent clients and reports QPS, latency
+percentiles and how close the scaling is to linear (qps_N / (N * qps_1)).
+
+With zero fake latency the workers are CPU-bound, which is what pre-forking should
+scale; add --llm-latency-ms to see the I/O-bound picture. The load generator runs on
+the same machine, so leave it a core: scaling flattens once workers + client
+exceed the CPU count.
+
+Usage:
+    python -m benchmarks.loadtest --workers 1,2,4 --concurrency 32 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.bench import REPO_ROOT, percentiles, synth_corpus, synth_queries
+
+
+def wait_ready(url: str, timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/healthz", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up within {timeout_s}s")
+
+
+async def drive(url: str, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    workers_seen = set()
+    next_query = iter(queries)
+
+    async with httpx.AsyncClient(base_url=url, timeout=60.0, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def user() -> None:
+            for q in next_query:
+                start = time.perf_counter()
+                resp = await client.post("/ask", json={"question": q})
+                statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+                if resp.status_code == 200:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    workers_seen.add(resp.json()["worker"])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    return {
+        "qps": round(statuses.get(200, 0) / seconds, 1),
+        **percentiles(latencies),
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "workers_answering": len(workers_seen),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load test serve.py with the fake OpenAI backend")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per run")
+    parser.add_argument("--chunks", type=int, default=2000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="numpy")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--max-inflight", type=int, default=64)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", help="write results as JSON here")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-loadtest-"))
+    results: Dict[str, Any] = {}
+    try:
+        print(f"Building a {args.chunks}-chunk corpus ...", flush=True)
+        synth_corpus(workdir / "kb", args.chunks)
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench", "--ingest-worker", str(workdir),
+             "--dim", str(args.dim), "--backend", args.backend],
+            cwd=REPO_ROOT, check=True, capture_output=True,
+        )
+        # Distinct questions, so the answer cache doesn't short-circuit the pipeline
+        queries = synth_queries(args.requests)
+
+        for n in [int(w) for w in args.workers.split(",")]:
+            url = f"http://127.0.0.1:{args.port}"
+            server = subprocess.Popen(
+                [sys.executable, str(REPO_ROOT / "serve.py"), "--fake", "--workers", str(n),
+                 "--port", str(args.port), "--dim", str(args.dim),
+                 "--llm-latency-ms", str(args.llm_latency_ms),
+                 "--max-inflight", str(args.max_inflight), "--max-queue", str(args.max_queue)],
+                cwd=workdir,
+                env=dict(os.environ, PYTHONPATH=str(REPO_ROOT)),
+                stdout=subprocess.DEVNULL,
+            )
+            try:
+                wait_ready(url)
+                asyncio.run(drive(url, queries[:50], min(args.concurrency, 8)))  # warm up every worker
+                print(f"[{n} workers] {args.requests} requests, {args.concurrency} clients ...", flush=True)
+                results[str(n)] = asyncio.run(drive(url, queries, args.concurrency))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = results.get(min(results, key=int)) if results else None
+    base_workers = int(min(results, key=int)) if results else 1
+    print(f"\n{'workers':>8} {'qps':>8} {'p50_ms':>8} {'p95_ms':>8} {'scaling':>8}  status")
+    for n, r in results.items():
+        scaling = r["qps"] / (base["qps"] * int(n) / base_workers) if base and base["qps"] else 0.0
+        r["scaling_efficiency"] = round(scaling, 3)
+        print(f"{n:>8} {r['qps']:>8} {r.get('p50_ms', 0):>8} {r.get('p95_ms', 0):>8} {scaling:>7.0%}  {r['status']}")
+    print(f"(this machine has {os.cpu_count()} CPU cores)")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({"settings": vars(args), "results": results}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Recall of reduced-dimension and quantized embeddings against full precision.
+
+For each embedding size (--dimensions) and storage dtype (--dtypes), the corpus and the
+questions are embedded, the vectors are written in the NumPy store layout (the same
+files a snapshot holds) and searched. The top k ids are compared with those of the
+full-size float32 index:
+
+    recall@k = |top k of the setting  ∩  top k of full precision| / k, averaged over questions
+
+Per setting it reports recall@k, the memory the vectors take, the store's size on
+disk (about the snapshot size) and the mean search time per question, so
+embedding_dimensions and numpy_store_dtype can be picked from measured data.
+
+By default this calls the OpenAI API; vectors go through the embedding cache, so
+re-runs don't pay again. --fake runs offline, but its hashed vectors aren't trained
+to be shortened the way text-embedding-3 vectors are: use it as a smoke test only.
+
+Usage:
+    python -m benchmarks.recall --dimensions 256,512,1024 --dtypes float32,float16,int8 --k 10
+    python -m benchmarks.recall --questions questions.jsonl --chunks 20000 --out recall.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from batch_qa import read_questions
+from benchmarks.bench import SOURCE_KB, synth_corpus, synth_queries
+from core.chunking import chunk_text
+from core.config import CONFIG, override_config
+from core.embeddings import embed_texts
+from core.numpy_store import DTYPES, NumpyCollection, export_numpy_store
+from ingest import chunk_ids, kb_paths
+
+
+def corpus_chunks(kb_dir: Path) -> Tuple[List[str], List[str]]:
+    """(ids, texts) of every chunk in kb_dir, chunked like ingest.py does."""
+    ids: List[str] = []
+    texts: List[str] = []
+    for path in kb_paths(kb_dir):
+        text = path.read_text(encoding="utf-8")
+        chunks = [
+            c.text(text)
+            for c in chunk_text(text, CONFIG.max_chunk_tokens, CONFIG.chunk_overlap_tokens, CONFIG.embedding_model)
+        ]
+        ids.extend(chunk_ids(path.name, chunks))
+        texts.extend(chunks)
+    return ids, texts
+
+
+def embed_at(texts: List[str], dimensions: int) -> List[List[float]]:
+    override_config(embedding_dimensions=dimensions)
+    return embed_texts(texts, CONFIG.embedding_model)
+
+
+def build_store(path: str, ids: List[str], vectors: Sequence[Sequence[float]], dtype: str) -> NumpyCollection:
+    export_numpy_store(((i, "", {}, v) for i, v in zip(ids, vectors)), path, dtype)
+    return NumpyCollection(path)
+
+
+def search(col: NumpyCollection, qvecs: List[List[float]], k: int) -> Tuple[List[List[str]], float]:
+    """Top k ids per question, one query at a time like the app; and mean ms per query."""
+    start = time.perf_counter()
+    top = [col.query([q], n_results=k, include=[])["ids"][0] for q in qvecs]
+    return top, (time.perf_counter() - start) * 1000 / max(1, len(qvecs))
+
+
+def recall_at_k(found: List[List[str]], reference: List[List[str]], k: int) -> float:
+    return float(np.mean([len(set(f) & set(r)) / min(k, len(r)) for f, r in zip(found, reference) if r]))
+
+
+def disk_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in ("vectors.npy", "scales.npy")
+               if os.path.exists(os.path.join(path, name)))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Recall@k of reduced/quantized embeddings vs full precision")
+    parser.add_argument("--dimensions", default="256,512,1024", help="comma-separated embedding sizes to test")
+    parser.add_argument("--dtypes", default="float32,float16,int8", help="comma-separated storage dtypes to test")
+    parser.add_argument("--k", type=int, default=CONFIG.retrieve_k)
+    parser.add_argument("--questions", help="JSON lines file of questions (batch_qa.py format)")
+    parser.add_argument("--queries", type=int, default=200, help="synthetic questions if --questions isn't given")
+    parser.add_argument("--chunks", type=int, default=0, help="synthetic corpus of this many chunks (default: kb/)")
+    parser.add_argument("--fake", action="store_true", help="offline fake embeddings (smoke test)")
+    parser.add_argument("--out", help="write results as JSON here")
+    args = parser.parse_args(argv)
+
+    dtypes = args.dtypes.split(",")
+    for dtype in dtypes:
+        if dtype not in DTYPES:
+            parser.error(f"unknown dtype {dtype!r} (expected one of {DTYPES})")
+    sizes = [0] + [int(d) for d in args.dimensions.split(",") if int(d)]
+    if args.fake:
+        from core.fake_openai import install_fake_openai
+        install_fake_openai()
+    original_dimensions = CONFIG.embedding_dimensions
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-recall-"))
+    results: List[Dict[str, Any]] = []
+    try:
+        kb_dir = SOURCE_KB
+        if args.chunks:
+            synth_corpus(workdir / "kb", args.chunks)
+            kb_dir = workdir / "kb"
+        ids, texts = corpus_chunks(kb_dir)
+        questions = [q["question"] for q in read_questions(args.questions)] if args.questions else synth_queries(args.queries)
+        print(f"{len(ids)} chunks, {len(questions)} questions, k={args.k}", flush=True)
+
+        reference: List[List[str]] = []
+        for dims in sizes:
+            print(f"embedding at {dims or 'full'} dimensions ...", flush=True)
+            vectors, qvecs = embed_at(texts, dims), embed_at(questions, dims)
+            for dtype in (["float32"] if dims == 0 else dtypes):
+                path = str(workdir / f"store-{dims}-{dtype}")
+                col = build_store(path, ids, vectors, dtype)
+                found, ms = search(col, qvecs, args.k)
+                if dims == 0:
+                    reference = found
+                results.append({
+                    "dimensions": col.meta["dim"],
+                    "dtype": dtype,
+                    f"recall@{args.k}": round(recall_at_k(found, reference, args.k), 4),
+                    "vector_mb": round((col.vectors.nbytes + (col.scales.nbytes if col.scales is not None else 0)) / 1e6, 2),
+                    "disk_mb": round(disk_bytes(path) / 1e6, 2),
+                    "search_ms": round(ms, 3),
+                })
+                del col
+    finally:
+        override_config(embedding_dimensions=original_dimensions)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    full = results[0]
+    print(f"\n{'dims':>6} {'dtype':>8} {'recall@' + str(args.k):>10} {'vectors MB':>11} {'disk MB':>8} {'search ms':>10} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['dimensions']:>6} {r['dtype']:>8} {r[f'recall@{args.k}']:>10} {r['vector_mb']:>11} "
+            f"{r['disk_mb']:>8} {r['search_ms']:>10} {full['search_ms'] / r['search_ms'] if r['search_ms'] else 0:>7.2f}x"
+        )
+    print("(first row: full-size float32, the reference)")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({"settings": vars(args), "results": results}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Semantic answer cache.
+
+Support users ask the same things over and over, in slightly different words.
+Instead of re-running retrieval, rerank and generation, we keep recent answers
+keyed by their query embedding:
+
+- Lookup: cosine similarity of the new query against every cached query
+  (one NumPy matrix-vector product). At or above the threshold -> reuse the answer.
+- Eviction: entries expire after a TTL; beyond max_entries the least recently
+  used entry is dropped.
+- Invalidation: each entry belongs to a KB "version" (see store.collection_version).
+  When ingestion changes the collection, the version changes and the cache is cleared.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from .config import CONFIG
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe nearest-neighbour cache of RAG results.
+    """
+
+    def __init__(self, threshold: float, ttl_s: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        # key -> (unit query vector, query text, result, created_at); most recently used last
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_key = 0
+        self._version: Optional[Hashable] = None
+        # Stacked vectors of _entries (same order as _keys), rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[int] = []
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _unit(vec: List[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _check_version(self, version: Hashable) -> None:
+        if version != self._version:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_s
+        expired = [k for k, e in self._entries.items() if e[3] < cutoff]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self.stats["expirations"] += len(expired)
+            self._matrix = None
+
+    def lookup(self, qvec: List[float], version: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of the cached result for the most similar earlier query,
+        or None if nothing is similar enough.
+        """
+        q = self._unit(qvec)
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+            if not self._entries:
+                self.stats["misses"] += 1
+                return None
+
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[k][0] for k in self._keys])
+            sims = self._matrix @ q
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            if similarity < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            key = self._keys[best]
+            self._entries.move_to_end(key)
+            _, matched_query, result, _ = self._entries[key]
+            self.stats["hits"] += 1
+
+        result = copy.deepcopy(result)
+        result["debug"]["answer_cache"] = {
+            "hit": True,
+            "similarity": round(similarity, 4),
+            "matched_query": matched_query,
+        }
+        return result
+
+    def store(self, query: str, qvec: List[float], result: Dict[str, Any], version: Hashable) -> None:
+        with self._lock:
+            self._check_version(version)
+            self._entries[self._next_key] = (self._unit(qvec), query, copy.deepcopy(result), time.monotonic())
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._matrix = None
+            self.stats["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["entries"] = len(self._entries)
+            return stats
+
+
+_cache: Optional[SemanticAnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """
+    Process-wide cache built from CONFIG (None when disabled).
+    """
+    global _cache
+    if not CONFIG.answer_cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticAnswerCache(
+                threshold=CONFIG.answer_cache_similarity,
+                ttl_s=CONFIG.answer_cache_ttl_s,
+                max_entries=CONFIG.answer_cache_max_entries,
+            )
+        return _cache
+
+
+def answer_cache_stats() -> Dict[str, float]:
+    """Hit/miss counters of the answer cache (empty if disabled)."""
+    cache = get_answer_cache()
+    return cache.get_stats() if cache is not None else {}
@@ -0,0 +1,127 @@
+"""
+Batch question answering.
+
+run_rag answers one question with one embeddings call and one Chroma query.
+For a file of questions (offline evaluation, nightly regression runs) that is
+wasteful, so the batch pipeline shares the cheap stages and parallelises the slow ones:
+
+1) identical questions (ignoring case and whitespace) are answered once
+2) all remaining questions are embedded in one embed_texts call (token-bounded batches)
+3) questions not served by the answer cache are searched in one multi-query col.query
+   (and fused with the BM25 index when hybrid retrieval is on)
+4) rerank + generation run per question, at most `concurrency` at a time
+
+Results have the same shape as run_rag's. Each trace gets the wall time of the shared
+stages (embed, retrieve) it waited for, and debug["batch"] records the batch context.
+An optional `where` metadata filter applies to every question of the batch.
+"""
+
+import asyncio
+import copy
+from typing import Any, Dict, List, Optional
+
+from .config import CONFIG
+from .embeddings import embed_texts_async
+from .metrics import Trace
+from .rag_pipeline import answer_candidates_async, cached_answer, finish
+from .retriever import adaptive_cut, fuse_lexical, query_collection_batch
+from .store import serving_collection
+
+
+def normalize_question(query: str) -> str:
+    """
+    Key used to detect repeated questions.
+    """
+    return " ".join(query.split()).casefold()
+
+
+async def run_rag_batch_async(
+    queries: List[str],
+    concurrency: Optional[int] = None,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Answer many questions at once.
+
+    Returns:
+        one run_rag-style result per query, in input order
+    """
+    concurrency = concurrency or CONFIG.batch_concurrency
+    # The whole batch answers from one KB generation, even if a reload swaps it meanwhile
+    collection = serving_collection()
+
+    # 1) Dedupe: first occurrence of each question is the one we answer
+    first_index: Dict[str, int] = {}
+    owner: List[int] = []
+    for i, q in enumerate(queries):
+        owner.append(first_index.setdefault(normalize_question(q), i))
+    unique = sorted(first_index.values())
+    traces = {i: Trace() for i in unique}
+
+    # 2) One embeddings pass for every distinct question
+    batch_trace = Trace()
+    with batch_trace.stage("embed"):
+        vectors = await embed_texts_async([queries[i] for i in unique], model=CONFIG.embedding_model, trace=batch_trace)
+    qvecs = {i: [v] for i, v in zip(unique, vectors)}
+
+    results: Dict[int, Dict[str, Any]] = {}
+    versions = {}
+    pending = []
+    for i in unique:
+        traces[i].add_time("embed", batch_trace.timings_ms["embed"])
+        cached, versions[i] = cached_answer(qvecs[i], traces[i], where, collection)
+        if cached is not None:
+            results[i] = finish(cached, traces[i], queries[i])
+        else:
+            pending.append(i)
+
+    # 3) One multi-query vector search for everything the cache didn't answer
+    def search_all() -> List[List[Dict[str, Any]]]:
+        hits = query_collection_batch(
+            [qvecs[i][0] for i in pending], CONFIG.db_dir, collection, CONFIG.retrieve_k, where
+        )
+        if CONFIG.hybrid_retrieval:
+            hits = [
+                fuse_lexical(queries[i], qvecs[i], h, CONFIG.db_dir, collection, CONFIG.retrieve_k, where)
+                for i, h in zip(pending, hits)
+            ]
+        return hits
+
+    with batch_trace.stage("retrieve"):
+        hits = await asyncio.to_thread(search_all)
+
+    # 4) Rerank + generate with bounded concurrency
+    sem = asyncio.Semaphore(concurrency)
+
+    async def answer(i: int, candidates: List[Dict[str, Any]]) -> None:
+        async with sem:
+            traces[i].add_time("retrieve", batch_trace.timings_ms["retrieve"])
+            # Same per-question retrieve_k as run_rag, cut from the one batched search
+            candidates, retrieval = adaptive_cut(candidates, CONFIG.retrieve_k)
+            results[i] = await answer_candidates_async(
+                queries[i], qvecs[i], candidates, traces[i], versions[i], where, retrieval
+            )
+
+    await asyncio.gather(*(answer(i, candidates) for i, candidates in zip(pending, hits)))
+
+    out = []
+    for i, j in enumerate(owner):
+        result = results[j] if i == j else copy.deepcopy(results[j])
+        result["debug"]["batch"] = {
+            "size": len(queries),
+            "unique": len(unique),
+            "duplicate_of": j if i != j else None,
+        }
+        out.append(result)
+    return out
+
+
+def run_rag_batch(
+    queries: List[str],
+    concurrency: Optional[int] = None,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Synchronous entry point for run_rag_batch_async (CLI, scripts).
+    """
+    return asyncio.run(run_rag_batch_async(queries, concurrency, where))
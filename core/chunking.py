@@ -7,12 +7,42 @@ Why chunking matters:
 - Markdown-aware chunking preserves section boundaries, improving accuracy.
 
 Strategy:
-1) Split by Markdown headings (#, ##, ###)
-2) If a section is still too large, sub-split with overlap.
+1) Split by Markdown headings (#, ##, ###), tracking the heading path
+   (e.g. ("Plans", "Premium", "Pricing")) with a stack.
+2) If a section is larger than max_tokens (tiktoken, embedding model), sub-split it
+   at sentence boundaries (paragraph, sentence, line, then word), with up to
+   overlap_tokens shared between consecutive pieces.
+
+Chunks are Chunk records: (start, end) character offsets into the file plus the
+token count and heading path. The file is tokenized once; sections and pieces are
+offset arithmetic on that single pass, and chunk text is only sliced out when it
+is needed (chunk.text(source)).
+
+Chunking runs at about the speed of the old character chunker, so the hot paths
+stay in C: headings are found by a regex with a literal "\n#" prefix (the engine
+skips straight to candidates instead of trying every line start), sentence starts
+in long sections by str.find/rfind, and without tiktoken token offsets are
+arithmetic instead of a list as long as the file.
+
+chunk_files() chunks many files in a process pool (ingest.py uses it for the files
+that changed).
 """
 
+import os
 import re
-from typing import List, Tuple
+import threading
+import warnings
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import accumulate, chain
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .embeddings import get_encoding
+
+# Bump when the chunk boundaries change, so ingest.py rebuilds the index
+CHUNKER_VERSION = 2
 
 # Pattern explanation:
 # - ^(#{1,6}): Matches 1-6 hash symbols at the start of a line (captured as group 1)
@@ -20,84 +50,343 @@ from typing import List, Tuple
 # - (.+)$: Matches the rest of the line as the heading text (captured as group 2)
 # - re.MULTILINE: Makes ^ match at the start of each line, not just the document start
 HEADING_RE = re.compile(r"^(#{1,6})\s+(.+)$", re.MULTILINE)
+# The same headings after the first line, starting at their "\n"
+NEXT_HEADING_RE = re.compile(r"\n(#{1,6})\s+(.+)$", re.MULTILINE)
+
+# Where a new sentence (or paragraph, or line) starts: after blank lines, after
+# sentence punctuation + whitespace, after a line break.
+# _first/_last_sentence_start() find the same matches faster (see there).
+SENTENCE_START_RE = re.compile(r"\n[ \t]*\n\s*|(?<=[.!?:;])\s+|\n\s*")
+# Where such a match begins: its line break, or the punctuation before it
+# (starting with a character set lets the regex engine scan ahead in C)
+SENTENCE_BREAK_RE = re.compile(r"[\n.!?:;](?:(?<=\n)|\s)")
+SPACE_RUN_RE = re.compile(r"\s*")
+NON_SPACE_RE = re.compile(r"\S")
+
+# Joins heading titles in the stored "heading_path" metadata
+HEADING_SEPARATOR = " > "
+
+# Rough size of a token in English text, to convert the old character-based sizes
+CHARS_PER_TOKEN = 4
+
+
+class Chunk:
+    """
+    One chunk of a file: text is source[start:end].
+    """
+
+    __slots__ = ("start", "end", "tokens", "heading_path", "level")
+
+    def __init__(self, start: int, end: int, tokens: int, heading_path: Tuple[str, ...], level: int):
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.heading_path = heading_path  # shared by all chunks of a section
+        self.level = level  # heading level of the section, 0 before the first heading
+
+    def text(self, source: str) -> str:
+        return source[self.start : self.end]
+
+    def metadata(self, source: str, doc_version: str) -> Dict[str, Any]:
+        """
+        Metadata stored with the chunk. Besides the joined heading_path, each title
+        gets its own field by depth (h1, h2, ...), so a heading-prefix filter is
+        plain equality clauses that the vector store can apply before searching.
+        """
+        meta: Dict[str, Any] = {
+            "source": source,
+            "doc_version": doc_version,
+            "heading_path": HEADING_SEPARATOR.join(self.heading_path),
+            "level": self.level,
+            "char_start": self.start,
+            "char_end": self.end,
+            "tokens": self.tokens,
+        }
+        for depth, title in enumerate(self.heading_path, start=1):
+            meta[f"h{depth}"] = title
+        return meta
 
-# Find sections in doc
-def split_markdown_into_sections(text: str) -> List[Tuple[str, str]]:
+    def __repr__(self) -> str:
+        return f"Chunk({self.start}, {self.end}, tokens={self.tokens}, heading_path={self.heading_path!r})"
+
+
+def iter_headings(text: str) -> Iterator["re.Match[str]"]:
+    """
+    The matches of HEADING_RE.finditer(text), found faster. Group 1 (the hashes)
+    starts where the heading line does.
+    """
+    first = HEADING_RE.match(text)
+    if first is None:
+        return NEXT_HEADING_RE.finditer(text)
+    return chain((first,), NEXT_HEADING_RE.finditer(text, first.end()))
+
+
+def iter_sections(text: str) -> Iterator[Tuple[int, int, int, Tuple[str, ...], int]]:
     """
-    Split markdown text into (section_title, section_body) tuples.
+    Yield (start, body_start, end, heading_path, level) per section.
 
-    If the file has no headings, we return a single "Document" section.
+    A section runs from its heading line to the next heading; body_start is where
+    the heading line ends. Text before the first heading is a section with an
+    empty path.
     """
-    # find all heading matches in the document
-    matches = list(HEADING_RE.finditer(text))
-    if not matches:
-        return [("Document", text)]
+    levels: List[int] = []  # heading level of each title in path
+    start = body_start = 0
+    path: Tuple[str, ...] = ()
+    level = 0
+    for m in iter_headings(text):
+        h_start, hashes_end = m.span(1)
+        if h_start > start:
+            yield start, body_start, h_start, path, level
+        level = hashes_end - h_start
+        while levels and levels[-1] >= level:
+            levels.pop()
+        path = path[: len(levels)] + (m.group(2).strip(),)
+        levels.append(level)
+        start, body_start = h_start, m.end()
+    yield start, body_start, len(text), path, level
 
-    # Build list of sections by extracting text between consecutive headings
-    sections = []
-    for i, m in enumerate(matches):
-        start = m.start()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
 
-        # Extract the heading components from the regex match groups
-        heading_level = m.group(1)  # e.g., "##"
-        heading_title = m.group(2).strip()
-        section_text = text[start:end].strip()
+def token_starts(text: str, model: str) -> List[int]:
+    """
+    Character offset at which each token of text starts, plus len(text) at the end.
 
-        # Reconstruct the full heading string with level and title then store as tuples
-        title = f"{heading_level} {heading_title}"
-        sections.append((title, section_text))
+    Without a tiktoken encoding (offline), every 3 characters count as a token,
+    like count_tokens().
+    """
+    enc = get_encoding(model)
+    if enc is False:
+        starts = list(range(0, len(text), 3))
+    else:
+        tokens = enc.encode_ordinary(text)
+        if text.isascii():
+            # One byte per character: offsets are cumulative token byte lengths
+            starts = list(accumulate((len(b) for b in enc.decode_tokens_bytes(tokens)), initial=0))[:-1]
+        else:
+            starts = enc.decode_with_offsets(tokens)[1]
+    starts.append(len(text))
+    return starts
 
-    return sections
 
-# Handle oversized text
-def split_with_overlap(text: str, max_chars: int, overlap: int) -> List[str]:
+def token_index(text: str, model: str) -> Tuple[Callable[[int], int], Callable[[int], int]]:
     """
-    Split a long text into overlapping chunks.
+    (token_at, offset_of) for text: token_at(offset) is the index of the first token
+    starting at or after offset, offset_of(i) is where token i starts (len(text) past
+    the last one). Same results as bisect_left and indexing on token_starts().
+    """
+    if get_encoding(model) is False:
+        n = len(text)
+        return (lambda offset: (offset + 2) // 3), (lambda i: min(3 * i, n))
+    starts = token_starts(text, model)
+    return partial(bisect_left, starts), starts.__getitem__
+
 
-    Overlap helps when an answer spans the boundary between chunks.
+def _strip(text: str, start: int, end: int) -> Tuple[int, int]:
+    if text[start : start + 1].isspace():
+        m = NON_SPACE_RE.search(text, start, end)
+        if m is None:
+            return end, end
+        start = m.start()
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _last_sentence_start(text: str, pos: int, endpos: int) -> int:
     """
-    chunks = []
-    i = 0
-    while i < len(text):
-        chunk = text[i : i + max_chars]
-        chunks.append(chunk)
-        if i + max_chars >= len(text):
+    Where the last SENTENCE_START_RE match in text[pos:endpos] ends, -1 if none.
+
+    Every match starts at a line break or at whitespace after sentence punctuation
+    and runs to the end of that whitespace, so only the last such position matters.
+    str.rfind finds it in C; backtracking the regex over each window was most of
+    the time spent splitting long sections.
+    """
+    endpos = min(endpos, len(text))
+    brk = text.rfind("\n", pos, endpos)
+    # Punctuation at pos-1..endpos-2 followed by whitespace, after the line break
+    lo, hi = max(pos - 1, brk, 0), endpos - 1
+    while lo < hi:
+        i = max(
+            text.rfind(".", lo, hi), text.rfind("!", lo, hi), text.rfind("?", lo, hi),
+            text.rfind(":", lo, hi), text.rfind(";", lo, hi),
+        )
+        if i < lo:
             break
-        i += max_chars - overlap
-    return chunks
+        if text[i + 1].isspace():
+            brk = i + 1
+            break
+        hi = i
+    if brk < 0:
+        return -1
+    return SPACE_RUN_RE.match(text, brk, endpos).end()
+
 
-# combine function 1 & 2 above 
-def chunk_markdown(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
+def _first_sentence_start(text: str, pos: int, endpos: int) -> int:
     """
-    Markdown-aware chunking:
-    - Split into sections by headings
-    - Keep sections intact if they fit
-    - Otherwise sub-split with overlap
+    Where the first SENTENCE_START_RE match in text[pos:endpos] ends, -1 if none.
+    """
+    m = SENTENCE_BREAK_RE.search(text, max(pos - 1, 0), endpos)
+    if m is not None and m.start() < pos and m.group() == "\n":
+        m = SENTENCE_BREAK_RE.search(text, pos, endpos)
+    if m is None:
+        return -1
+    return SPACE_RUN_RE.match(text, m.end() - 1, endpos).end()
 
-    The two-tier strategy ensures:
-    1. Small sections stay intact, preserving their semantic coherence
-    2. Large sections are split responsibly with overlap to maintain context
-    
-    Args:
-        text: The markdown document to chunk
-        max_chars: Maximum characters per chunk (default: 1200, tuned for embedding models)
-        overlap: Characters to overlap between sub-chunks (default: 200)
 
-    Returns:
-        A list of chunk strings, each respecting markdown structure and size constraints
+def _cut(text: str, floor: int, limit: int) -> int:
+    """
+    Best place to end a piece that must end by limit: the last sentence start after
+    floor, else the last word start, else limit itself.
     """
-    chunks = []
-    sections = split_markdown_into_sections(text)
+    last = _last_sentence_start(text, floor + 1, limit)
+    if last >= 0:
+        return last
+    space = max(text.rfind(" ", floor, limit), text.rfind("\n", floor, limit))
+    return space + 1 if space >= 0 else limit
 
-    for title, body in sections:
-        # Keep the title with the section body to preserve context.
-        section_text = f"{title}\n{body}".strip()
 
-        if len(section_text) <= max_chars:
-            chunks.append(section_text)
-        else:
-            # If too long, split with overlap
-            chunks.extend(split_with_overlap(section_text, max_chars, overlap))
+def chunk_text(text: str, max_tokens: int = 300, overlap_tokens: int = 50, model: str = "text-embedding-3-small") -> List[Chunk]:
+    """
+    Markdown-aware, token-bounded chunking of one file.
+
+    - Sections that fit in max_tokens stay whole (heading line included once)
+    - Larger sections are split at sentence boundaries, consecutive pieces sharing
+      up to overlap_tokens (starting at a sentence start where possible)
+    - Sections with only a heading produce no chunk; their title is in the
+      heading_path of the sections below them
+
+    Token counts are taken from one tokenization of the whole file, so they can
+    differ by a token or so from tokenizing a chunk on its own.
+    """
+    if max_tokens <= overlap_tokens:
+        raise ValueError("max_tokens must be larger than overlap_tokens")
+    if not text:
+        return []
+    token_at, offset_of = token_index(text, model)
+    chunks: List[Chunk] = []
+    append = chunks.append
+
+    def emit(start: int, end: int, first: int, path: Tuple[str, ...], level: int) -> None:
+        # first: token_at(start), already known
+        s, e = _strip(text, start, end)
+        if e > s:
+            append(Chunk(s, e, token_at(e) - (first if s == start else token_at(s)), path, level))
+
+    for start, body_start, end, path, level in iter_sections(text):
+        first = token_at(start)
+        if token_at(end) - first <= max_tokens:
+            # Fits whole (the common case): skip it if the body is blank.
+            # A section starts at its heading, so usually only the end needs stripping
+            if text[start].isspace():
+                start, end = _strip(text, start, end)
+                first = token_at(start)
+            else:
+                while text[end - 1].isspace():
+                    end -= 1
+            if end > body_start and end > start:
+                append(Chunk(start, end, token_at(end) - first, path, level))
+            continue
+        if NON_SPACE_RE.search(text, body_start, end) is None:
+            continue
+        last = token_at(end)
+        while last - first > max_tokens:
+            floor = offset_of(first + max_tokens // 2)
+            cut = _cut(text, floor, offset_of(first + max_tokens))
+            if floor <= start:
+                # Tokens inside one multi-byte character share an offset; always move on
+                cut = max(cut, offset_of(token_at(start + 1)))
+            emit(start, cut, first, path, level)
+
+            # Next piece: overlap_tokens back from the cut, moved forward to a sentence
+            # start (or at least a word start) inside the overlap
+            cut_token = token_at(cut)
+            back = min(cut, offset_of(max(first + 1, cut_token - overlap_tokens)))
+            sentence = _first_sentence_start(text, back, cut)
+            if 0 <= sentence < cut:
+                next_start = sentence
+            else:
+                space = text.find(" ", back, cut)
+                next_start = space + 1 if space >= 0 else back
+            start = next_start if next_start > start else cut
+            first = token_at(start)
+        emit(start, end, first, path, level)
 
     return chunks
+
+
+def chunk_markdown(
+    text: str,
+    max_tokens: int = 300,
+    overlap_tokens: int = 50,
+    model: str = "text-embedding-3-small",
+    *,
+    max_chars: Optional[int] = None,
+    overlap: Optional[int] = None,
+) -> List[str]:
+    """
+    chunk_text() as a list of chunk strings.
+
+    max_chars / overlap are the character sizes this function took before chunks
+    were measured in tokens. They still work, converted at CHARS_PER_TOKEN, with a
+    DeprecationWarning.
+    """
+    if max_chars is not None or overlap is not None:
+        warnings.warn(
+            "chunk_markdown(max_chars=, overlap=) is deprecated, pass max_tokens= and overlap_tokens= "
+            f"(converted at {CHARS_PER_TOKEN} characters per token)",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        if max_chars is not None:
+            max_tokens = max(1, max_chars // CHARS_PER_TOKEN)
+        if overlap is not None:
+            overlap_tokens = overlap // CHARS_PER_TOKEN
+    return [c.text(text) for c in chunk_text(text, max_tokens, overlap_tokens, model)]
+
+
+def chunk_file(path: str, max_tokens: int, overlap_tokens: int, model: str) -> Tuple[str, List[Chunk]]:
+    """
+    Read and chunk one file. Returns (text, chunks).
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return text, chunk_text(text, max_tokens, overlap_tokens, model)
+
+
+def chunk_files(
+    paths: Iterable[str],
+    max_tokens: int,
+    overlap_tokens: int,
+    model: str,
+    workers: int = 1,
+) -> Iterator[Tuple[str, str, List[Chunk]]]:
+    """
+    Yield (path, text, chunks) for each path, in order.
+
+    With workers > 1 files are chunked in a process pool. At most 2 * workers files
+    are in flight, so memory stays bounded when the consumer (embedding) is slower.
+    The pool forks, so it is only used from the main thread; other threads get
+    the in-process path.
+    """
+    if workers <= 1 or threading.current_thread() is not threading.main_thread():
+        for path in paths:
+            yield (path, *chunk_file(path, max_tokens, overlap_tokens, model))
+        return
+
+    import multiprocessing
+    # Load the tokenizer once here; forked workers inherit it
+    get_encoding(model)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+        pending: Deque[Tuple[str, object]] = deque()
+        for path in paths:
+            pending.append((path, pool.submit(chunk_file, path, max_tokens, overlap_tokens, model)))
+            if len(pending) >= 2 * workers:
+                done_path, future = pending.popleft()
+                yield (done_path, *future.result())
+        while pending:
+            done_path, future = pending.popleft()
+            yield (done_path, *future.result())
+
+
+def default_workers(requested: int = 0) -> int:
+    """Worker processes for chunk_files (requested, or one per CPU core if 0)."""
+    return requested if requested > 0 else (os.cpu_count() or 1)
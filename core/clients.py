@@ -0,0 +1,77 @@
+"""
+OpenAI client factory.
+
+The embeddings, reranker and generator modules all talk to OpenAI.
+Instead of each building its own client, they share one per process:
+
+- get_openai_client(): sync client (used by run_rag and ingest.py)
+- get_async_openai_client(): AsyncOpenAI client over one pooled httpx.AsyncClient,
+  so concurrent chats reuse keep-alive connections instead of opening new ones.
+
+Clients are built on first use, so importing a module never needs an API key.
+The openai and httpx packages themselves are imported on first use as well:
+together they take most of a second to import, which would delay app startup.
+"""
+
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from dotenv import load_dotenv
+
+from .config import CONFIG
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+load_dotenv()
+
+_lock = threading.Lock()
+_client: Optional["OpenAI"] = None
+_async_client: Optional["AsyncOpenAI"] = None
+
+
+def _limits() -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=CONFIG.openai_max_connections,
+        max_keepalive_connections=CONFIG.openai_max_connections,
+    )
+
+
+def get_openai_client() -> "OpenAI":
+    global _client
+    with _lock:
+        if _client is None:
+            import httpx
+            from openai import OpenAI
+
+            _client = OpenAI(http_client=httpx.Client(limits=_limits()))
+        return _client
+
+
+def get_async_openai_client() -> "AsyncOpenAI":
+    """
+    Shared async client. Its connection pool belongs to the event loop that
+    first uses it (the app's server loop), so don't share it across loops.
+    """
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            _async_client = AsyncOpenAI(http_client=httpx.AsyncClient(limits=_limits()))
+        return _async_client
+
+
+def set_openai_clients(client: Optional["OpenAI"], async_client: Optional["AsyncOpenAI"]) -> None:
+    """
+    Replace the shared clients (e.g. with fake_openai.FakeOpenAI for offline runs).
+    Passing None resets a client so the real one is built on next use.
+    """
+    global _client, _async_client
+    with _lock:
+        _client = client
+        _async_client = async_client
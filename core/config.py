@@ -11,9 +11,45 @@ class RAGConfig:
     db_dir: str = "vectordb"
     collection_name: str = "HealthierYou_kb"
 
+    # Backend used for retrieval queries:
+    # "chroma": query Chroma directly
+    # "numpy":  query a memory-mapped NumPy copy that ingest.py exports from Chroma
+    #           (near-zero cold start, exact search, pages shared across processes)
+    vector_backend: str = "chroma"
+    # Storage of the numpy copy and of snapshots: "float32", "float16" (half the size)
+    # or "int8" (a quarter). Chroma itself always keeps float32. Changing it rebuilds
+    # the index; python -m benchmarks.recall measures what it costs in recall.
+    numpy_store_dtype: str = "float32"
+
     # --- Embeddings ---
     # This is comes from OpenAI's Embeddings API - Converts text to vectors
     embedding_model: str = "text-embedding-3-small"
+    # Shorter vectors from the same model (text-embedding-3 models support e.g. 256 or
+    # 512): less memory, faster search, smaller snapshots, somewhat lower recall.
+    # 0 = the model's full size (1536). Changing it re-embeds the KB.
+    embedding_dimensions: int = 0
+
+    # Content-addressed cache of embeddings keyed by (model, sha256(text)).
+    # Unchanged chunks and repeated questions never hit the API twice.
+    # Set embedding_cache_dir to "" to disable.
+    embedding_cache_dir: str = ".embedding_cache"
+    embedding_cache_memory_mb: int = 64
+
+    # Cache misses are sent in token-bounded batches (API limits: 2048 inputs,
+    # 300k tokens per request), at most embedding_max_workers requests in flight.
+    embedding_batch_max_tokens: int = 50_000
+    embedding_batch_max_inputs: int = 256
+    embedding_max_workers: int = 4
+    # Rate-limit retries: exponential backoff starting at base, capped at max
+    embedding_max_retries: int = 5
+    embedding_retry_base_s: float = 0.5
+    embedding_retry_max_s: float = 20.0
+    # Query embeddings of concurrent requests are coalesced into one API call: while
+    # a call is in flight, the next query waits up to embedding_coalesce_window_ms for
+    # others to join (with none in flight it is sent at once), and a call carries at
+    # most embedding_coalesce_max_batch queries. 0 ms = one call per query.
+    embedding_coalesce_window_ms: float = 5.0
+    embedding_coalesce_max_batch: int = 64
 
     # --- LLM ---
     # gpt-4o-mini is one of OpenAI's cheap reasoning model optimized for Chat, RAG answering etc
@@ -21,13 +57,60 @@ class RAGConfig:
     chat_model: str = "gpt-4o-mini"
     temperature: float = 0.2
 
+    # Size of the shared HTTP connection pool used by the OpenAI clients
+    openai_max_connections: int = 64
+
     # --- Retrieval ---
     # Retrieve more than will be used, as reranking works with more candidates
     retrieve_k: int = 12
 
-    # After reranking, keep only the top N chunks as context for the answer
+    # Hybrid retrieval: also search the BM25 index built by ingest.py and merge
+    # both rankings with reciprocal rank fusion (score = sum 1 / (rrf_k + rank)).
+    # Exact terms (plan names, prices) then reach the reranker even with a small retrieve_k.
+    hybrid_retrieval: bool = False
+    lexical_retrieve_k: int = 12
+    rrf_k: int = 60
+
+    # After reranking, keep at most the top N chunks as context for the answer
     keep_n_after_rerank: int = 5
 
+    # --- Context packing ---
+    # Token budget (tiktoken, chat model) for the context blocks of the answer prompt.
+    # Reranked chunks are added in rank order until it is full; overlapping chunks
+    # of the same file are merged and repeated text is sent once. 0 = no budget.
+    context_token_budget: int = 1500
+
+    # --- Reranking ---
+    # "llm": chat completion picks the best chunks (most accurate, adds a full LLM call)
+    # "lexical": local BM25 + vector similarity, no API call
+    # "hybrid": lexical, falling back to the LLM when the top two local scores
+    #           are closer than hybrid_rerank_margin
+    reranker: str = "llm"
+    # Weight of vector similarity vs BM25 in the lexical score (0..1)
+    lexical_rerank_vector_weight: float = 0.5
+    hybrid_rerank_margin: float = 0.1
+
+    # Adaptive rerank (rerank_policy.py), decided per question from the retrieval distances:
+    # skip the rerank when the best hit is <= adaptive_skip_max_distance and at least
+    # adaptive_skip_min_gap ahead of the second; otherwise send only the hits within
+    # adaptive_shrink_margin of the best (at least keep_n_after_rerank). The first search
+    # asks for adaptive_retrieve_k_min hits and widens to retrieve_k only if all of them
+    # are within the margin. Like max_best_distance, the thresholds are dataset-dependent:
+    # tune them on batch_qa.py output (debug["retrieval"], debug["rerank"]["policy"]).
+    adaptive_rerank: bool = False
+    adaptive_skip_max_distance: float = 0.35
+    adaptive_skip_min_gap: float = 0.1
+    adaptive_shrink_margin: float = 0.15
+    adaptive_retrieve_k_min: int = 6
+
+    # Speculative generation (run_rag, run_rag_async, batch mode): start generating from
+    # the top keep_n_after_rerank vector hits while the rerank runs. If the speculative
+    # context holds every chunk the reranker kept, that answer is used (about one LLM
+    # call of latency); otherwise it is cancelled and generation restarts on the
+    # reranked chunks. Costs the extra generation tokens of rejected guesses.
+    # Not used with the "lexical" reranker, which makes no LLM call.
+    speculative_generation: bool = False
+
     # --- Confidence gating ---
     # Use this to evaluate the quality of retrieved information
     # Or the model's own answers to ensure they meet a certain threshold of reliability
@@ -37,8 +120,81 @@ class RAGConfig:
     # Start here, then adjust after testing.
     max_best_distance: float = 0.85
 
+    # --- Semantic answer cache ---
+    # Reuse a previous answer when a new question's embedding has cosine
+    # similarity >= answer_cache_similarity with an earlier one.
+    # Keep the threshold high: "cost of plan A" and "cost of plan B" are close too.
+    answer_cache_enabled: bool = True
+    answer_cache_similarity: float = 0.97
+    answer_cache_ttl_s: float = 3600.0
+    answer_cache_max_entries: int = 1000
+
+    # --- Metrics ---
+    # Append every request's trace (stage timings, tokens, cache hits) to this
+    # JSON lines file. Empty string disables the file sink.
+    metrics_jsonl_path: str = ""
+
+    # --- Batch mode (batch_qa.py) ---
+    # Questions answered concurrently; each one makes up to two LLM calls
+    batch_concurrency: int = 8
+
+    # --- Serving (serve.py) ---
+    # Worker processes forked after the index is loaded (0 = one per CPU core)
+    serve_workers: int = 0
+    # Per worker: requests processed at once, and requests allowed to wait for a
+    # slot. Beyond that the server answers 503 right away instead of queueing forever.
+    serve_max_inflight: int = 32
+    serve_max_queue: int = 64
+    # Per-process caps on concurrent stage calls in the async pipeline (0 = unlimited).
+    # "llm" covers both the rerank and the generation call.
+    max_concurrent_llm: int = 0
+    max_concurrent_embed: int = 0
+    max_concurrent_retrieve: int = 0
+
+    # --- Snapshots ---
+    # Prebuilt index shipped with the app (python ingest.py --export-snapshot snapshot).
+    # At startup it is restored instead of re-embedding kb/. If it was built with a
+    # different embedding model or chunk settings (or fails its checksums):
+    # "rebuild" ingests from kb/ instead, "refuse" stops the app with an error.
+    # Empty string disables snapshots.
+    snapshot_dir: str = "snapshot"
+    snapshot_on_mismatch: str = "rebuild"
+
     # -- Chunking --
-    max_chunk_chars: int = 1200
-    chunk_overlap_chars: int = 200
+    # Chunk size in tokens of the embedding model (tiktoken). Longer sections are
+    # split at sentence boundaries; consecutive pieces share up to chunk_overlap_tokens.
+    max_chunk_tokens: int = 300
+    chunk_overlap_tokens: int = 50
+    # Processes that chunk changed files during ingest (0 = one per CPU core)
+    chunk_workers: int = 0
+
+    # -- Ingestion --
+    # Chunks are embedded and written in batches of this size; peak memory
+    # during ingest is bounded by it rather than by the size of kb/.
+    ingest_batch_size: int = 256
+
+    # -- KB hot reload --
+    # app.py polls kb/ every kb_watch_interval_s (python ingest.py --watch does the same
+    # next to serve.py). On a change, kb/ is ingested into a new generation of the
+    # collection while the current one keeps serving; once it validates, readers switch
+    # to it at once, and the old generation is dropped kb_reload_drain_s later (after
+    # requests that started on it are done). Unchanged chunks come from the embedding
+    # cache, so a reload only pays the API for new text.
+    kb_watch: bool = True
+    kb_watch_interval_s: float = 2.0
+    kb_reload_drain_s: float = 10.0
 
 CONFIG = RAGConfig()
+
+
+def override_config(**changes) -> None:
+    """
+    Change settings on the shared CONFIG in place (benchmarks, load tests, tools).
+
+    Modules import CONFIG by reference, so replacing the object would go unnoticed.
+    Call this before the first request: caches built from CONFIG keep their settings.
+    """
+    for name, value in changes.items():
+        if name not in RAGConfig.__dataclass_fields__:
+            raise ValueError(f"Unknown RAGConfig field: {name}")
+        object.__setattr__(CONFIG, name, value)
@@ -0,0 +1,177 @@
+"""
+Context packing.
+
+The answer prompt used to get every reranked chunk verbatim, capped only by count
+(keep_n_after_rerank). Chunks range from a few lines to max_chunk_tokens, so prompt
+size and generation latency varied with them, and neighbouring pieces of a long
+section each repeated up to chunk_overlap_tokens of the same text.
+
+pack_context() builds the context under a token budget instead
+(CONFIG.context_token_budget, counted with tiktoken for the chat model):
+
+1) Hits are taken in rank order.
+2) Text already in the context is skipped: a hit contained in an earlier block is
+   dropped, and paragraphs repeated across hits (boilerplate shared by several
+   files) are kept only once.
+3) A hit that overlaps a block from the same source (one ends with what the other
+   starts with) is merged into that block, with one copy of the overlap.
+4) A block or merge is taken only if it still fits the budget; smaller, lower-ranked
+   hits may fill what is left. If even the best hit doesn't fit, it is truncated
+   (a budget too small for any text yields no blocks).
+
+The returned info (tokens used, tokens saved by merging and deduping, hits dropped
+for the budget) ends up in debug["context"].
+"""
+
+from typing import Any, Dict, List, Set, Tuple
+
+from .embeddings import count_tokens, truncate_tokens
+from .generator import build_context_blocks
+
+# Shorter suffix/prefix matches are coincidences, not chunk overlap
+MIN_OVERLAP_CHARS = 20
+# Shorter paragraphs (headings, "Notes:") are allowed to repeat
+MIN_DEDUPE_CHARS = 80
+# Block header + the "---" separator of build_context_blocks(), roughly
+BLOCK_OVERHEAD_TOKENS = 8
+
+
+def _overlap(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of left that is also a prefix of right (0 if none).
+    """
+    if len(left) < MIN_OVERLAP_CHARS or len(right) < MIN_OVERLAP_CHARS:
+        return 0
+    head = right[:MIN_OVERLAP_CHARS]
+    # The first match from the left is the longest overlap
+    pos = left.find(head)
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(head, pos + 1)
+    return 0
+
+
+def _normalize(paragraph: str) -> str:
+    return " ".join(paragraph.split()).casefold()
+
+
+def _drop_seen_paragraphs(text: str, seen: Set[str]) -> str:
+    kept = []
+    for paragraph in text.split("\n\n"):
+        key = _normalize(paragraph)
+        if len(key) >= MIN_DEDUPE_CHARS and key in seen:
+            continue
+        kept.append(paragraph)
+    return "\n\n".join(kept).strip()
+
+
+def _remember_paragraphs(text: str, seen: Set[str]) -> None:
+    for paragraph in text.split("\n\n"):
+        key = _normalize(paragraph)
+        if len(key) >= MIN_DEDUPE_CHARS:
+            seen.add(key)
+
+
+def _merge(block_text: str, text: str) -> str:
+    """
+    block_text and text joined with their overlap once, or "" if they don't overlap.
+    """
+    n = _overlap(block_text, text)
+    if n:
+        return block_text + text[n:]
+    n = _overlap(text, block_text)
+    if n:
+        return text + block_text[n:]
+    return ""
+
+
+def pack_context(
+    hits: List[Dict[str, Any]],
+    budget_tokens: int,
+    model: str,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pack ranked hits into context blocks that fit budget_tokens (0 = no budget).
+
+    Returns:
+        (blocks, info): blocks have "source", "text" and the "ids" of the hits they
+        hold, in rank order, ready for build_context_blocks(); info has the token
+        accounting for debug
+    """
+    def tokens(text: str) -> int:
+        return count_tokens([text], model)[0] + BLOCK_OVERHEAD_TOKENS
+
+    blocks: List[Dict[str, Any]] = []
+    block_tokens: List[int] = []
+    seen: Set[str] = set()
+    covered: List[Dict[str, Any]] = []  # hits whose text is in the context
+    used = 0
+    info = {"budget": budget_tokens, "merged": 0, "deduped": 0, "over_budget": 0, "truncated": False}
+
+    def fits(extra: int) -> bool:
+        return budget_tokens <= 0 or used + extra <= budget_tokens
+
+    for hit in hits:
+        text = hit["text"].strip()
+        if any(text in b["text"] for b in blocks):
+            info["deduped"] += 1
+            covered.append(hit)
+            continue
+
+        # Overlapping neighbour from the same source: extend that block
+        merged = False
+        for i, b in enumerate(blocks):
+            if b["source"] != hit["source"]:
+                continue
+            # The hit either holds the whole block or overlaps one of its ends
+            combined = text if b["text"] in text else _merge(b["text"], text)
+            if not combined:
+                continue
+            new_tokens = tokens(combined)
+            if fits(new_tokens - block_tokens[i]):
+                used += new_tokens - block_tokens[i]
+                b["text"], block_tokens[i] = combined, new_tokens
+                b["ids"].append(hit.get("id"))
+                _remember_paragraphs(combined, seen)
+                info["merged"] += 1
+                covered.append(hit)
+            else:
+                info["over_budget"] += 1
+            merged = True
+            break
+        if merged:
+            continue
+
+        text = _drop_seen_paragraphs(text, seen)
+        if not text:
+            info["deduped"] += 1
+            covered.append(hit)
+            continue
+        cost = tokens(text)
+        if not fits(cost):
+            if blocks:
+                info["over_budget"] += 1
+                continue
+            # Better a cut-off best hit than no context at all, unless the budget
+            # can't even hold a block header
+            room = max(0, budget_tokens - BLOCK_OVERHEAD_TOKENS)
+            text = truncate_tokens(text, room, model).strip() if room else ""
+            if not text:
+                info["over_budget"] += 1
+                continue
+            cost = tokens(text)
+            info["truncated"] = True
+            hit = dict(hit, text=text)  # the cut isn't a saving
+        blocks.append({"source": hit["source"], "text": text, "ids": [hit.get("id")]})
+        block_tokens.append(cost)
+        used += cost
+        covered.append(hit)
+        _remember_paragraphs(text, seen)
+
+    # Exact figures on the final prompt text, against the same hits sent verbatim
+    info["tokens"] = count_tokens([build_context_blocks(blocks)], model)[0] if blocks else 0
+    info["tokens_unpacked"] = count_tokens([build_context_blocks(covered)], model)[0] if covered else 0
+    info["tokens_saved"] = max(0, info["tokens_unpacked"] - info["tokens"])
+    info["blocks"] = len(blocks)
+    return blocks, info
@@ -0,0 +1,280 @@
+"""
+Embedding cache module.
+
+Embeddings are deterministic for a given (model, text), so paying the API for the
+same text twice is wasted time and money. This cache sits in front of the API:
+
+- Key: (model, sha256 of the text)  -> content-addressed, no positional ids
+- Disk tier: per-model append-only files
+    <model>.f32  raw little-endian float32 vectors, back to back
+    <model>.idx  fixed-size records: sha256 digest | dim | offset into .f32
+- Memory tier: LRU bounded by bytes, so hot queries skip the disk as well
+
+Several processes append to the same files (serve.py workers, the app's KB watcher,
+ingest.py). An append holds an exclusive flock() on the .idx file: under it the
+writer first reads the records other processes appended since it last looked, then
+takes its offsets from the real end of the .f32 file, so an index record always
+points at the writer's own vectors.
+
+The files are append-only: a crash can at worst leave a torn vector or index record
+at the end. Readers ignore it; the next writer truncates it away under the lock
+before appending, so later records stay aligned.
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import CONFIG
+
+# digest (32 bytes) | dim (uint32) | offset in floats (uint64)
+_INDEX_RECORD = struct.Struct("<32sIQ")
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _safe_name(model: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", model)
+
+
+def _le_bytes(arr: array) -> bytes:
+    if sys.byteorder == "little":
+        return arr.tobytes()
+    swapped = array(arr.typecode, arr)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+class EmbeddingCache:
+    """
+    Two-tier (memory LRU + disk) embedding cache. Thread-safe.
+    """
+
+    def __init__(self, cache_dir: str, max_memory_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+
+        self._lock = threading.Lock()
+        # model -> {digest: (offset, dim)}
+        self._index: Dict[str, Dict[bytes, Tuple[int, int]]] = {}
+        # model -> bytes of its .idx file read into _index so far (whole records)
+        self._index_bytes: Dict[str, int] = {}
+        # (model, digest) -> float32 array, most recently used last
+        self._lru: "OrderedDict[Tuple[str, bytes], array]" = OrderedDict()
+        self._lru_bytes = 0
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    # ---------- disk tier ----------
+
+    def _paths(self, model: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, _safe_name(model))
+        return base + ".idx", base + ".f32"
+
+    def _load_index(self, model: str) -> Dict[bytes, Tuple[int, int]]:
+        index = self._index.get(model)
+        if index is not None:
+            return index
+
+        index = {}
+        self._index[model] = index
+        self._index_bytes[model] = 0
+        idx_path, _ = self._paths(model)
+        if os.path.exists(idx_path):
+            with open(idx_path, "rb") as f:
+                self._read_records(model, f)
+        return index
+
+    def _read_records(self, model: str, f) -> int:
+        """
+        Add the records appended to the open .idx file since the last read to the
+        model's index. Returns how many torn trailing bytes follow them.
+        """
+        index = self._index[model]
+        size = os.fstat(f.fileno()).st_size
+        if size < self._index_bytes[model]:
+            # The cache directory was wiped and started over; so do we
+            index.clear()
+            self._index_bytes[model] = 0
+        f.seek(self._index_bytes[model])
+        data = f.read(size - self._index_bytes[model])
+        # A torn trailing record (interrupted write) is not read
+        usable = len(data) - len(data) % _INDEX_RECORD.size
+        for digest, dim, offset in _INDEX_RECORD.iter_unpack(data[:usable]):
+            index[digest] = (offset, dim)
+        self._index_bytes[model] += usable
+        return len(data) - usable
+
+    def _read_vectors(
+        self, model: str, wanted: List[Tuple[bytes, int, int]]
+    ) -> Dict[bytes, array]:
+        """
+        Read (digest, offset, dim) entries from the model's .f32 file in one open().
+        """
+        _, vec_path = self._paths(model)
+        out = {}
+        with open(vec_path, "rb") as f:
+            # Sorting by offset turns random reads into a forward scan
+            for digest, offset, dim in sorted(wanted, key=lambda w: w[1]):
+                f.seek(offset * 4)
+                raw = f.read(dim * 4)
+                if len(raw) != dim * 4:
+                    continue  # truncated data file; treat as a miss
+                arr = array("f")
+                arr.frombytes(raw)
+                if sys.byteorder != "little":
+                    arr.byteswap()
+                out[digest] = arr
+        return out
+
+    # ---------- memory tier ----------
+
+    def _remember(self, key: Tuple[str, bytes], arr: array) -> None:
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return
+        size = arr.itemsize * len(arr)
+        if size > self.max_memory_bytes:
+            return
+        self._lru[key] = arr
+        self._lru_bytes += size
+        while self._lru_bytes > self.max_memory_bytes:
+            _, old = self._lru.popitem(last=False)
+            self._lru_bytes -= old.itemsize * len(old)
+            self.stats["evictions"] += 1
+
+    # ---------- public API ----------
+
+    def get_many(self, texts: Sequence[str], model: str) -> List[Optional[List[float]]]:
+        """
+        Look up texts. Returns a list aligned with texts; None marks a miss.
+        """
+        digests = [text_digest(t) for t in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        with self._lock:
+            index = self._load_index(model)
+            on_disk = {}
+            for i, d in enumerate(digests):
+                arr = self._lru.get((model, d))
+                if arr is not None:
+                    self._lru.move_to_end((model, d))
+                    self.stats["memory_hits"] += 1
+                    results[i] = arr.tolist()
+                elif d in index:
+                    on_disk.setdefault(d, []).append(i)
+
+            if on_disk:
+                wanted = [(d, *index[d]) for d in on_disk]
+                loaded = self._read_vectors(model, wanted)
+                for d, positions in on_disk.items():
+                    arr = loaded.get(d)
+                    if arr is None:
+                        continue
+                    self._remember((model, d), arr)
+                    vec = arr.tolist()
+                    for i in positions:
+                        results[i] = vec
+                    self.stats["disk_hits"] += len(positions)
+
+            self.stats["misses"] += sum(1 for r in results if r is None)
+
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]], model: str) -> None:
+        """
+        Store vectors for texts (already-cached texts are skipped).
+        """
+        with self._lock:
+            index = self._load_index(model)
+            new = {}
+            for text, vec in zip(texts, vectors):
+                d = text_digest(text)
+                if d in index or d in new:
+                    continue
+                new[d] = array("f", vec)
+            if not new:
+                return
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            idx_path, vec_path = self._paths(model)
+
+            with open(idx_path, "a+b") as idx:
+                fcntl.flock(idx, fcntl.LOCK_EX)
+                try:
+                    # Catch up with other writers, drop what they already stored
+                    if self._read_records(model, idx):
+                        # Torn record of a crashed writer (a live one would hold the lock)
+                        idx.truncate(self._index_bytes[model])
+                    new = {d: arr for d, arr in new.items() if d not in index}
+
+                    # Data first, index second: an index record never points at unwritten data.
+                    records = []
+                    with open(vec_path, "ab") as f:
+                        end = f.seek(0, os.SEEK_END)
+                        if end % 4:
+                            # Torn vector of a crashed writer; no record points at it
+                            end -= end % 4
+                            f.truncate(end)
+                        offset = end // 4
+                        for d, arr in new.items():
+                            f.write(_le_bytes(arr))
+                            records.append(_INDEX_RECORD.pack(d, len(arr), offset))
+                            index[d] = (offset, len(arr))
+                            offset += len(arr)
+                    idx.write(b"".join(records))
+                    idx.flush()
+                    self._index_bytes[model] += len(records) * _INDEX_RECORD.size
+                finally:
+                    fcntl.flock(idx, fcntl.LOCK_UN)
+
+            for d, arr in new.items():
+                self._remember((model, d), arr)
+            self.stats["stores"] += len(new)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (
+                (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            )
+            stats["memory_bytes"] = self._lru_bytes
+            stats["memory_entries"] = len(self._lru)
+            return stats
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Process-wide cache built from CONFIG. Returns None when caching is disabled
+    (CONFIG.embedding_cache_dir is empty).
+    """
+    global _cache
+    if not CONFIG.embedding_cache_dir:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(
+                CONFIG.embedding_cache_dir,
+                max_memory_bytes=CONFIG.embedding_cache_memory_mb * 1024 * 1024,
+            )
+        return _cache
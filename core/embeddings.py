@@ -2,36 +2,652 @@
 Embeddings module.
 
 Embeddings converts text into a list of numbers (vectors) that represent the text's meaning.
+
+Every call reads through the embedding cache (see embedding_cache.py), so only texts
+that were never embedded with this model reach the OpenAI API.
+
+Batching:
+- The API limits inputs per request and total tokens per request.
+- Cache misses are packed into token-bounded batches (counted with tiktoken),
+  sent through a small thread pool, retried with backoff on rate limits,
+  and reassembled in the original order.
+- embed_texts_async does the same on the shared AsyncOpenAI client: same batches,
+  same retry policy, at most embedding_max_workers requests in flight.
+
+Query coalescing:
+- Every chat message embeds its question, one tiny API call each. Under bursty
+  traffic embed_query / embed_query_async hand their (uncached) query to a
+  QueryCoalescer instead. It collects the queries that arrive within a few ms
+  (CONFIG.embedding_coalesce_window_ms, up to embedding_coalesce_max_batch),
+  embeds them in one call from a background thread and hands each caller its vector.
+  Threads wait on a Future and asyncio callers await it, so both share the batches.
+- Each trace records the time spent waiting for the batch ("embed_queue") and the
+  batch size ("embed_batch_size"); coalescer_stats() has the process-wide figures.
+
+Dimensions:
+- With CONFIG.embedding_dimensions set, the API returns shortened vectors
+  (text-embedding-3 models). Cached vectors are filed under embedding_key(model),
+  which includes the size, so full and shortened vectors never mix.
+
+Backends:
+- The default backend calls OpenAI.
+- FakeEmbeddingBackend returns deterministic hash-based vectors so the whole
+  pipeline can run offline (benchmarks, local experiments).
 """
 
-from typing import List
-from openai import OpenAI
+import asyncio
+import hashlib
+import math
+import random
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .clients import get_async_openai_client, get_openai_client
+from .config import CONFIG
+from .embedding_cache import get_embedding_cache
+
+# A backend takes (texts, model) and returns one vector per text, in order.
+EmbeddingBackend = Callable[[List[str], str], List[List[float]]]
+
+# The API rejects a single input longer than this
+MAX_INPUT_TOKENS = 8191
+
+
+class TransientEmbeddingError(RuntimeError):
+    """Raised by backends to signal a retryable failure (e.g. a simulated 429)."""
+
+
+_retryable: Optional[Tuple[type, ...]] = None
+
+
+def retryable_errors() -> Tuple[type, ...]:
+    """
+    Exceptions worth retrying. Resolved on first use: importing openai takes
+    most of a second, and this module is imported at startup.
+    """
+    global _retryable
+    if _retryable is None:
+        import openai
+        _retryable = (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            TransientEmbeddingError,
+        )
+    return _retryable
+
+
+def dimensions_kwargs() -> Dict[str, int]:
+    """Extra embeddings.create() arguments for CONFIG.embedding_dimensions."""
+    return {"dimensions": CONFIG.embedding_dimensions} if CONFIG.embedding_dimensions else {}
+
+
+def embedding_key(model: str) -> str:
+    """Name vectors are cached under: the model, plus the size if it is reduced."""
+    return f"{model}@{CONFIG.embedding_dimensions}" if CONFIG.embedding_dimensions else model
+
+
+def shorten(vector: List[float], dimensions: int) -> List[float]:
+    """
+    First `dimensions` values, re-normalized: how text-embedding-3 models shorten
+    embeddings (used by the fake backend to behave the same way).
+    """
+    if not dimensions or dimensions >= len(vector):
+        return vector
+    head = vector[:dimensions]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+def openai_backend(texts: List[str], model: str) -> List[List[float]]:
+    resp = get_openai_client().embeddings.create(
+        model=model,
+        input=texts,
+        **dimensions_kwargs(),
+    )
+    return [item.embedding for item in resp.data]
+
+
+async def openai_backend_async(texts: List[str], model: str) -> List[List[float]]:
+    resp = await get_async_openai_client().embeddings.create(
+        model=model,
+        input=texts,
+        **dimensions_kwargs(),
+    )
+    return [item.embedding for item in resp.data]
+
+
+class FakeEmbeddingBackend:
+    """
+    Offline stand-in for the embeddings API.
+
+    - Vectors are hashed bag-of-words ("feature hashing"), unit length: same text ->
+      same vector, and texts sharing words get a smaller cosine distance, so retrieval
+      and the confidence gate behave plausibly on fake data.
+    - latency_s simulates the network round trip per request.
+    - CONFIG.embedding_dimensions shortens the vectors like the real API does.
+    - rate_limit_every=N raises TransientEmbeddingError on every Nth request.
+    """
+
+    def __init__(self, dim: int = 1536, latency_s: float = 0.0, rate_limit_every: int = 0):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.inputs = 0
+        self._lock = threading.Lock()
+
+    def vector(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for word in text.lower().split():
+            h = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            # Each word adds +-1 at two positions
+            for k in (0, 4):
+                pos = int.from_bytes(h[k:k + 3], "little") % self.dim
+                vec[pos] += 1.0 if h[k + 3] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vec))
+        if not norm:
+            vec[0], norm = 1.0, 1.0
+        return [x / norm for x in vec]
+
+    def __call__(self, texts: List[str], model: str) -> List[List[float]]:
+        with self._lock:
+            self.requests += 1
+            n = self.requests
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if self.rate_limit_every and n % self.rate_limit_every == 0:
+            raise TransientEmbeddingError(f"simulated rate limit on request {n}")
+        with self._lock:
+            self.inputs += len(texts)
+        return [shorten(self.vector(t), CONFIG.embedding_dimensions) for t in texts]
+
+
+_backend: EmbeddingBackend = openai_backend
+
+
+def set_embedding_backend(backend: Optional[EmbeddingBackend]) -> None:
+    """Swap the embedding backend (None restores the OpenAI backend)."""
+    global _backend
+    _backend = backend or openai_backend
+
+
+# ---------- token-aware batching ----------
+
+# A failed tiktoken load (offline: it downloads the encoding on first use) is retried after this long
+ENCODING_RETRY_S = 300.0
+
+_encodings: Dict[str, object] = {}
+# model -> time.monotonic() of its last failed load
+_encoding_failed_at: Dict[str, float] = {}
+
+
+def get_encoding(model: str):
+    """
+    The model's tiktoken encoding, cached; False if it can't be loaded.
+
+    A failure is not cached for good: the load is tried again ENCODING_RETRY_S later.
+    """
+    enc = _encodings.get(model)
+    if enc is None or (enc is False and time.monotonic() - _encoding_failed_at[model] >= ENCODING_RETRY_S):
+        try:
+            import tiktoken
+            try:
+                enc = tiktoken.encoding_for_model(model)
+            except KeyError:
+                enc = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            enc = False
+            _encoding_failed_at[model] = time.monotonic()
+        _encodings[model] = enc
+    return enc
+
+
+def tokenizer_name(model: str) -> str:
+    """
+    What count_tokens() etc. use for model right now: the tiktoken encoding's name,
+    or "approx" for the chars-per-token estimate. Token-based chunk boundaries
+    depend on it, so ingest records it with the index settings.
+    """
+    enc = get_encoding(model)
+    return "approx" if enc is False else enc.name
+
+
+def count_tokens(texts: List[str], model: str) -> List[int]:
+    """
+    Token count per text using the model's tiktoken encoding.
+
+    If the encoding can't be loaded (tiktoken downloads it on first use, which
+    fails offline) fall back to a conservative ~3 chars/token estimate.
+    """
+    enc = get_encoding(model)
+    if enc is False:
+        return [len(t) // 3 + 1 for t in texts]
+    return [len(toks) for toks in enc.encode_ordinary_batch(texts)]
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """
+    The longest prefix of text that is at most max_tokens tokens.
+    """
+    enc = get_encoding(model)
+    if enc is False:
+        return text[: max(0, max_tokens - 1) * 3]
+    tokens = enc.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+def pack_batches(
+    texts: List[str],
+    model: str,
+    max_tokens: int,
+    max_inputs: int,
+) -> List[List[int]]:
+    """
+    Greedily pack texts (in order) into batches that respect both limits.
+
+    Returns:
+        list of batches, each a list of indices into texts
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for i, n in enumerate(count_tokens(texts, model)):
+        if n > MAX_INPUT_TOKENS:
+            raise ValueError(
+                f"Text {i} has {n} tokens, above the {MAX_INPUT_TOKENS}-token input limit. "
+                "Lower max_chunk_tokens."
+            )
+        if current and (current_tokens + n > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+_stats_lock = threading.Lock()
+_batch_stats = {"texts": 0, "batches": 0, "retries": 0, "seconds": 0.0}
 
-from dotenv import load_dotenv
-load_dotenv() 
 
-client = OpenAI()
+def _retry_delay(attempt: int) -> float:
+    with _stats_lock:
+        _batch_stats["retries"] += 1
+    # Exponential backoff with jitter so parallel workers don't retry in lockstep
+    delay = min(CONFIG.embedding_retry_max_s, CONFIG.embedding_retry_base_s * 2 ** attempt)
+    return delay * (0.5 + random.random() / 2)
 
-def embed_texts(texts: List[str], model: str) -> List[List[float]]:
+
+def _embed_with_retry(texts: List[str], model: str, max_retries: int) -> List[List[float]]:
+    for attempt in range(max_retries + 1):
+        try:
+            return _backend(texts, model)
+        except retryable_errors():
+            if attempt == max_retries:
+                raise
+            time.sleep(_retry_delay(attempt))
+    raise AssertionError("unreachable")
+
+
+async def _embed_with_retry_async(texts: List[str], model: str, max_retries: int) -> List[List[float]]:
+    for attempt in range(max_retries + 1):
+        try:
+            return await openai_backend_async(texts, model)
+        except retryable_errors():
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+    raise AssertionError("unreachable")
+
+
+def _pack(texts: List[str], model: str) -> List[List[int]]:
+    return pack_batches(
+        texts,
+        model,
+        max_tokens=CONFIG.embedding_batch_max_tokens,
+        max_inputs=CONFIG.embedding_batch_max_inputs,
+    )
+
+
+def _reassemble(texts: List[str], batches: List[List[int]], results: List[List[List[float]]], start: float) -> List[List[float]]:
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    for batch, batch_vectors in zip(batches, results):
+        if len(batch_vectors) != len(batch):
+            raise RuntimeError(f"Embedding backend returned {len(batch_vectors)} vectors for {len(batch)} inputs")
+        for i, vec in zip(batch, batch_vectors):
+            vectors[i] = vec
+
+    with _stats_lock:
+        _batch_stats["texts"] += len(texts)
+        _batch_stats["batches"] += len(batches)
+        _batch_stats["seconds"] += time.perf_counter() - start
+
+    return vectors
+
+
+def embed_batched(texts: List[str], model: str) -> List[List[float]]:
+    """
+    Embed any number of texts: pack into token-bounded batches, send them
+    concurrently (at most CONFIG.embedding_max_workers in flight), and return
+    vectors in the same order as texts.
+    """
+    if not texts:
+        return []
+
+    start = time.perf_counter()
+    batches = _pack(texts, model)
+
+    def run(batch: List[int]) -> List[List[float]]:
+        return _embed_with_retry([texts[i] for i in batch], model, CONFIG.embedding_max_retries)
+
+    if len(batches) == 1:
+        results = [run(batches[0])]
+    else:
+        workers = max(1, min(CONFIG.embedding_max_workers, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, batches))
+
+    return _reassemble(texts, batches, results, start)
+
+
+async def embed_batched_async(texts: List[str], model: str) -> List[List[float]]:
+    """
+    embed_batched on the shared AsyncOpenAI client: the same batches and retry
+    policy, with at most CONFIG.embedding_max_workers requests in flight.
+    """
+    if not texts:
+        return []
+
+    start = time.perf_counter()
+    batches = _pack(texts, model)
+    slots = asyncio.Semaphore(max(1, CONFIG.embedding_max_workers))
+
+    async def run(batch: List[int]) -> List[List[float]]:
+        async with slots:
+            return await _embed_with_retry_async([texts[i] for i in batch], model, CONFIG.embedding_max_retries)
+
+    results = await asyncio.gather(*(run(batch) for batch in batches))
+    return _reassemble(texts, batches, results, start)
+
+
+def embedding_throughput_stats() -> dict:
+    """Cumulative batching stats, including throughput in chunks/sec."""
+    with _stats_lock:
+        stats = dict(_batch_stats)
+    stats["chunks_per_sec"] = stats["texts"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+# ---------- query coalescing ----------
+
+class QueryCoalescer:
+    """
+    Merges single-query embedding requests from concurrent threads and tasks.
+
+    submit() queues a query and returns a Future of (vector, batch_size, queue_ms).
+    A background thread takes the queue and hands it to one of max_workers threads
+    that embed it with embed_batched (one API call per model, retries included).
+    When no call is in flight the queue is taken at once, so a lone query never
+    waits. Otherwise other requests are arriving too: the queue is taken once the
+    oldest query has waited window_s, or as soon as max_batch queries are waiting.
+    Queries arriving meanwhile start the next batch instead of waiting for the call
+    in flight.
+
+    A caller may give up on its future (an async caller that is cancelled cancels
+    it through asyncio.wrap_future). Cancelled queries are left out of the batch;
+    every other future of the batch is always resolved, with the API error if the
+    call fails.
+    """
+
+    def __init__(self, window_s: float, max_batch: int, max_workers: int = 4):
+        self.window_s = window_s
+        self.max_batch = max(1, max_batch)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="query-embed")
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, str, Future, float]] = []  # (query, model, future, queued at)
+        self._thread: Optional[threading.Thread] = None
+        self._inflight = 0  # batches taken and not yet finished
+        self._stats = {"queries": 0, "batches": 0, "max_batch": 0, "queue_ms": 0.0, "max_queue_ms": 0.0, "cancelled": 0}
+
+    def submit(self, query: str, model: str) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((query, model, future, time.perf_counter()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-coalescer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _take(self) -> List[Tuple[str, str, Future, float]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0][3] + self.window_s
+            while self._inflight and len(self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            self._inflight += 1
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            self._pool.submit(self._flush, self._take()).add_done_callback(self._report)
+
+    @staticmethod
+    def _report(flush: Future) -> None:
+        # _flush resolves its callers' futures itself; this only surfaces its own bugs
+        error = flush.exception()
+        if error is not None:
+            print("Query coalescer flush failed:", file=sys.stderr)
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+    def _flush(self, batch: List[Tuple[str, str, Future, float]]) -> None:
+        sent = time.perf_counter()
+        # Once running, a future can no longer be cancelled, so resolving it below can't fail
+        live = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+        queue_ms = [(sent - queued) * 1000 for _, _, _, queued in live]
+        by_model: Dict[str, List[Tuple[str, str, Future, float]]] = {}
+        for entry in live:
+            by_model.setdefault(entry[1], []).append(entry)
+
+        try:
+            for model, entries in by_model.items():
+                # The same question asked twice at once is embedded once
+                queries = list(dict.fromkeys(query for query, _, _, _ in entries))
+                try:
+                    vectors = dict(zip(queries, embed_batched(queries, model)))
+                except Exception as e:
+                    for _, _, future, _ in entries:
+                        future.set_exception(e)
+                    continue
+                for (query, _, future, queued) in entries:
+                    future.set_result((vectors[query], len(live), (sent - queued) * 1000))
+        finally:
+            for _, _, future, _ in live:
+                if not future.done():
+                    future.set_exception(RuntimeError("query coalescer failed to embed this query"))
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify()
+                self._stats["queries"] += len(live)
+                self._stats["cancelled"] += len(batch) - len(live)
+                if live:
+                    self._stats["batches"] += 1
+                    self._stats["max_batch"] = max(self._stats["max_batch"], len(live))
+                    self._stats["queue_ms"] += sum(queue_ms)
+                    self._stats["max_queue_ms"] = max(self._stats["max_queue_ms"], max(queue_ms))
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+        stats["mean_batch"] = round(stats["queries"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["mean_queue_ms"] = round(stats.pop("queue_ms") / stats["queries"], 2) if stats["queries"] else 0.0
+        stats["max_queue_ms"] = round(stats["max_queue_ms"], 2)
+        return stats
+
+
+_coalescer: Optional[QueryCoalescer] = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer() -> Optional[QueryCoalescer]:
+    """
+    The process-wide QueryCoalescer, or None if coalescing is disabled.
+
+    A forked child (serve.py workers) gets a fresh one: the parent's thread
+    doesn't exist there.
+    """
+    global _coalescer
+    if CONFIG.embedding_coalesce_window_ms <= 0:
+        return None
+    with _coalescer_lock:
+        if _coalescer is None or _coalescer.pid != os.getpid():
+            _coalescer = QueryCoalescer(
+                CONFIG.embedding_coalesce_window_ms / 1000,
+                CONFIG.embedding_coalesce_max_batch,
+                CONFIG.embedding_max_workers,
+            )
+        return _coalescer
+
+
+def coalescer_stats() -> dict:
+    """Queries, batches, batch sizes, queueing delay and cancelled queries of the query coalescer."""
+    return _coalescer.stats() if _coalescer is not None else {}
+
+
+def _cached_query(query: str, model: str, trace) -> Tuple[object, Optional[List[float]]]:
+    cache = get_embedding_cache()
+    if cache is None:
+        return None, None
+    vec = cache.get_many([query], embedding_key(model))[0]
+    _count_cache_hits(trace, 1, int(vec is None))
+    return cache, vec
+
+
+def _coalesced(cache, query: str, model: str, result: Tuple[List[float], int, float], trace) -> List[List[float]]:
+    vec, batch_size, queue_ms = result
+    if trace is not None:
+        trace.add_time("embed_queue", queue_ms)
+        trace.count("embed_batch_size", batch_size)
+    if cache is not None:
+        cache.put_many([query], [vec], embedding_key(model))
+    return [vec]
+
+
+# ---------- public API ----------
+
+def embed_texts(texts: List[str], model: str, use_cache: bool = True, trace=None) -> List[List[float]]:
     """Embed a list of texts.
 
     Args:
         text (List[str]): list of strings to embed
         model (str): embedding model name
+        use_cache (bool): read through / populate the embedding cache
+        trace (Trace, optional): counts embedding cache hits/misses
 
     Returns:
         List[List[float]]: list of embedding vectors (each a list of floats)
     """
-    resp = client.embeddings.create(
-        model=model,
-        input=texts
-    )
-    return [item.embedding for item in resp.data]
+    if not texts:
+        return []
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return embed_batched(texts, model)
+
+    vectors = cache.get_many(texts, embedding_key(model))
 
-def embed_query(query: str, model: str) -> List[List[float]]:
-    """Embed a single query string
+    # Only send each distinct missing text once
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    _count_cache_hits(trace, len(texts), len(missing))
+    if missing:
+        fresh = dict(zip(missing, embed_batched(missing, model)))
+        cache.put_many(missing, [fresh[t] for t in missing], embedding_key(model))
+        vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+
+    return vectors
+
+def _count_cache_hits(trace, total: int, missing: int) -> None:
+    if trace is not None:
+        trace.count("embedding_cache_hits", total - missing)
+        trace.count("embedding_cache_misses", missing)
+
+def embed_query(query: str, model: str, trace=None) -> List[List[float]]:
+    """Embed a single query string (coalesced with concurrent queries, see QueryCoalescer)
 
     Returns:
         a single-item list of embedding vectors, ready for ChromaDB
     """
-    return embed_texts([query], model=model)
+    coalescer = get_coalescer()
+    if coalescer is None:
+        return embed_texts([query], model=model, trace=trace)
+    cache, vec = _cached_query(query, model, trace)
+    if vec is not None:
+        return [vec]
+    return _coalesced(cache, query, model, coalescer.submit(query, model).result(), trace)
+
+async def embed_texts_async(texts: List[str], model: str, use_cache: bool = True, trace=None) -> List[List[float]]:
+    """Async version of embed_texts.
+
+    With the OpenAI backend, cache misses go through the shared AsyncOpenAI client
+    (embed_batched_async) and the embedding cache is used from a worker thread (it
+    reads and appends to disk). Other backends run embed_texts in a worker thread.
+    """
+    if not texts:
+        return []
+
+    if _backend is not openai_backend:
+        return await asyncio.to_thread(embed_texts, texts, model, use_cache, trace)
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache is not None:
+        vectors = await asyncio.to_thread(cache.get_many, texts, embedding_key(model))
+    else:
+        vectors = [None] * len(texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if cache is not None:
+        _count_cache_hits(trace, len(texts), len(missing))
+    if missing:
+        fresh = dict(zip(missing, await embed_batched_async(missing, model)))
+        if cache is not None:
+            await asyncio.to_thread(cache.put_many, missing, [fresh[t] for t in missing], embedding_key(model))
+        vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+
+    return vectors
+
+
+async def embed_query_async(query: str, model: str, trace=None) -> List[List[float]]:
+    """
+    Async version of embed_query. Awaits the coalesced batch without blocking the
+    loop; the embedding cache (disk reads and appends) is used from a worker thread.
+    """
+    coalescer = get_coalescer()
+    if coalescer is None:
+        return await embed_texts_async([query], model=model, trace=trace)
+    cache, vec = await asyncio.to_thread(_cached_query, query, model, trace)
+    if vec is not None:
+        return [vec]
+    result = await asyncio.wrap_future(coalescer.submit(query, model))
+    return await asyncio.to_thread(_coalesced, cache, query, model, result, trace)
+
+def embedding_cache_stats() -> dict:
+    """Hit/miss counters of the embedding cache (empty if caching is disabled)."""
+    cache = get_embedding_cache()
+    return cache.get_stats() if cache is not None else {}
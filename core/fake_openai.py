@@ -0,0 +1,139 @@
+"""
+Fake OpenAI clients for offline runs (benchmarks, load tests, local experiments).
+
+They implement the small part of the OpenAI SDK this project uses:
+- embeddings.create(model, input)            -> hashed bag-of-words vectors
+- chat.completions.create(..., stream=...)    -> canned replies with usage counts
+
+Rerank prompts get a valid "1,2,3" style reply; everything else gets a short answer
+citing [1]. chat_latency_s / embed_latency_s simulate network and model time.
+
+install_fake_openai() swaps them in for the real clients process-wide.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from .clients import set_openai_clients
+from .embeddings import FakeEmbeddingBackend, set_embedding_backend
+
+RERANK_PROMPT_PREFIX = "You are a retrieval reranker"
+CANNED_ANSWER = "Based on the knowledge base, this is covered in the provided context [1]."
+
+
+def _reply(messages: List[Dict[str, str]]) -> str:
+    prompt = messages[-1]["content"]
+    if prompt.startswith(RERANK_PROMPT_PREFIX):
+        # One line per candidate after the "CANDIDATES:" header; keep the given order
+        n = prompt.count("\n", prompt.find("CANDIDATES:"))
+        return ",".join(str(i) for i in range(1, max(1, n) + 1))
+    return CANNED_ANSWER
+
+
+def _usage(messages: List[Dict[str, str]], reply: str) -> SimpleNamespace:
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    # ~4 chars per token is close enough for sizing
+    return SimpleNamespace(
+        prompt_tokens=prompt_chars // 4 + 1,
+        completion_tokens=len(reply) // 4 + 1,
+        total_tokens=(prompt_chars + len(reply)) // 4 + 2,
+    )
+
+
+def _completion(reply: str, usage: SimpleNamespace) -> SimpleNamespace:
+    message = SimpleNamespace(role="assistant", content=reply)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)], usage=usage)
+
+
+def _stream_chunks(reply: str, usage: SimpleNamespace, include_usage: bool) -> List[SimpleNamespace]:
+    chunks = [
+        SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=word + " "))], usage=None)
+        for word in reply.split(" ")
+    ]
+    if include_usage:
+        chunks.append(SimpleNamespace(choices=[], usage=usage))
+    return chunks
+
+
+class _Completions:
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        self.calls += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        reply = _reply(messages)
+        usage = _usage(messages, reply)
+        if stream:
+            include_usage = bool((kwargs.get("stream_options") or {}).get("include_usage"))
+            # A generator has close(), like openai's Stream
+            return (chunk for chunk in _stream_chunks(reply, usage, include_usage))
+        return _completion(reply, usage)
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        self.calls += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        reply = _reply(messages)
+        usage = _usage(messages, reply)
+        if stream:
+            include_usage = bool((kwargs.get("stream_options") or {}).get("include_usage"))
+            chunks = _stream_chunks(reply, usage, include_usage)
+
+            async def gen():
+                for chunk in chunks:
+                    yield chunk
+            return gen()
+        return _completion(reply, usage)
+
+
+class _Embeddings:
+    def __init__(self, backend: FakeEmbeddingBackend):
+        self.backend = backend
+
+    def _response(self, texts: List[str], model: str) -> SimpleNamespace:
+        vectors = self.backend(texts, model)
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=v) for i, v in enumerate(vectors)],
+            usage=SimpleNamespace(prompt_tokens=sum(len(t) for t in texts) // 4, total_tokens=0),
+        )
+
+    def create(self, model: str, input: List[str], **kwargs: Any) -> SimpleNamespace:
+        return self._response(list(input), model)
+
+
+class _AsyncEmbeddings(_Embeddings):
+    async def create(self, model: str, input: List[str], **kwargs: Any) -> SimpleNamespace:
+        # Latency is simulated with a blocking sleep in the backend; keep the loop free
+        return await asyncio.to_thread(self._response, list(input), model)
+
+
+class FakeOpenAI:
+    def __init__(self, chat_latency_s: float = 0.0, embed_latency_s: float = 0.0, dim: int = 1536):
+        self.embedding_backend = FakeEmbeddingBackend(dim=dim, latency_s=embed_latency_s)
+        self.embeddings = _Embeddings(self.embedding_backend)
+        self.chat = SimpleNamespace(completions=_Completions(chat_latency_s))
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, sync: FakeOpenAI, chat_latency_s: float = 0.0):
+        self.embeddings = _AsyncEmbeddings(sync.embedding_backend)
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(chat_latency_s))
+
+
+def install_fake_openai(chat_latency_s: float = 0.0, embed_latency_s: float = 0.0, dim: int = 1536) -> FakeOpenAI:
+    """
+    Route every OpenAI call in this process to fakes. Returns the sync fake
+    (its .embedding_backend and .chat.completions keep call counts).
+    """
+    fake = FakeOpenAI(chat_latency_s=chat_latency_s, embed_latency_s=embed_latency_s, dim=dim)
+    set_openai_clients(fake, FakeAsyncOpenAI(fake, chat_latency_s=chat_latency_s))
+    # Embeddings go through the normal OpenAI backend -> fake client, so batching is exercised too
+    set_embedding_backend(None)
+    return fake
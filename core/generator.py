@@ -10,12 +10,10 @@ Key mechanism:
 This reduces hallucinations.
 """
 
-from typing import List, Dict, Any
-from openai import OpenAI
-from dotenv import load_dotenv
-load_dotenv()
+from typing import Any, AsyncIterator, Dict, Iterator, List
 
-client = OpenAI()
+from .clients import get_async_openai_client, get_openai_client
+from .limits import stage_limit
 
 
 def build_context_blocks(hits: List[Dict[str, Any]]) -> str:
@@ -28,14 +26,9 @@ def build_context_blocks(hits: List[Dict[str, Any]]) -> str:
     return "\n\n---\n\n".join(blocks)
 
 
-def generate_grounded_answer(
-    query: str,
-    context_blocks: str,
-    model: str,
-    temperature: float,
-) -> str:
+def build_answer_messages(query: str, context_blocks: str) -> List[Dict[str, str]]:
     """
-    Generate an answer grounded ONLY in context.
+    Build the chat messages for grounded generation.
 
     The prompt forces:
     - citations like [1]
@@ -62,13 +55,105 @@ INSTRUCTIONS:
 - If you cannot find support in context, refuse.
 """.strip()
 
-    resp = client.chat.completions.create(
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+def generate_grounded_answer(
+    query: str,
+    context_blocks: str,
+    model: str,
+    temperature: float,
+    trace=None,
+) -> str:
+    """
+    Generate an answer grounded ONLY in context.
+    """
+    resp = get_openai_client().chat.completions.create(
         model=model,
         temperature=temperature,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
+        messages=build_answer_messages(query, context_blocks),
     )
+    if trace is not None:
+        trace.add_usage("generate", getattr(resp, "usage", None))
 
     return resp.choices[0].message.content.strip()
+
+
+async def generate_grounded_answer_async(
+    query: str,
+    context_blocks: str,
+    model: str,
+    temperature: float,
+    trace=None,
+) -> str:
+    """
+    Async version of generate_grounded_answer.
+    """
+    async with stage_limit("llm", trace):
+        resp = await get_async_openai_client().chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=build_answer_messages(query, context_blocks),
+        )
+    if trace is not None:
+        trace.add_usage("generate", getattr(resp, "usage", None))
+
+    return resp.choices[0].message.content.strip()
+
+
+def generate_grounded_answer_stream(
+    query: str,
+    context_blocks: str,
+    model: str,
+    temperature: float,
+    trace=None,
+) -> Iterator[str]:
+    """
+    Streaming version of generate_grounded_answer: yields text deltas as they arrive.
+    """
+    stream = get_openai_client().chat.completions.create(
+        model=model,
+        temperature=temperature,
+        messages=build_answer_messages(query, context_blocks),
+        stream=True,
+        stream_options={"include_usage": True},  # usage arrives in a final, choice-less chunk
+    )
+    try:
+        for chunk in stream:
+            if trace is not None and getattr(chunk, "usage", None):
+                trace.add_usage("generate", chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        # A caller that stops reading early ends the request instead of leaving it running
+        stream.close()
+
+
+async def generate_grounded_answer_stream_async(
+    query: str,
+    context_blocks: str,
+    model: str,
+    temperature: float,
+    trace=None,
+) -> AsyncIterator[str]:
+    """
+    Async streaming version of generate_grounded_answer.
+
+    The LLM concurrency slot is held until the stream is fully read.
+    """
+    async with stage_limit("llm", trace):
+        stream = await get_async_openai_client().chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=build_answer_messages(query, context_blocks),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            if trace is not None and getattr(chunk, "usage", None):
+                trace.add_usage("generate", chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
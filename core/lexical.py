@@ -0,0 +1,62 @@
+"""
+Lexical scoring module.
+
+Dense vectors capture meaning; exact words (plan names, prices, policy names) are
+better matched lexically. This module provides:
+
+- tokenize(): lowercase word/number tokens, minus a few stopwords
+- bm25_scores(): Okapi BM25 of one query against a small set of documents,
+  vectorized with NumPy (used by the local reranker)
+"""
+
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Tiny list on purpose: only words that carry no signal in this KB's questions
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or "
+    "our so that the their there this to we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def bm25_scores(
+    query: str,
+    documents: Sequence[str],
+    k1: float = 1.5,
+    b: float = 0.75,
+) -> np.ndarray:
+    """
+    BM25 score of query against each document (higher = better match).
+
+    IDF is computed over `documents` themselves, which is what we want when
+    rescoring a handful of retrieved candidates.
+    """
+    n_docs = len(documents)
+    q_terms = list(dict.fromkeys(tokenize(query)))
+    if n_docs == 0 or not q_terms:
+        return np.zeros(n_docs, dtype=np.float32)
+
+    term_pos = {t: j for j, t in enumerate(q_terms)}
+    tf = np.zeros((n_docs, len(q_terms)), dtype=np.float32)
+    doc_len = np.zeros(n_docs, dtype=np.float32)
+    for i, doc in enumerate(documents):
+        tokens = tokenize(doc)
+        doc_len[i] = len(tokens)
+        for t in tokens:
+            j = term_pos.get(t)
+            if j is not None:
+                tf[i, j] += 1
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+    avg_len = doc_len.mean() or 1.0
+    norm = k1 * (1.0 - b + b * doc_len / avg_len)
+    return ((tf * (k1 + 1.0)) / (tf + norm[:, None]) * idf).sum(axis=1)
@@ -0,0 +1,189 @@
+"""
+BM25 inverted index over the whole collection.
+
+The reranker's bm25_scores() only rescores the handful of chunks vector search
+returned. Exact-term questions (plan names, prices, policy names) need lexical
+search over *every* chunk, so ingest.py builds this index after each run.
+
+On-disk layout (vectordb/bm25-<collection>/), CSR-style NumPy arrays:
+- indptr.npy   int64[n_terms + 1]  postings of term t are [indptr[t], indptr[t+1])
+- postings.npy int32[n_postings]   chunk numbers, ascending within a term
+- tfs.npy      uint16[n_postings]  term frequency of the term in that chunk
+- doc_len.npy  uint32[n_chunks]    tokens per chunk
+- vocab.json / ids.json            term strings and chunk ids (array positions)
+- meta.json                        written last; its presence marks a complete index
+
+Each build is written to a new version directory and swapped in atomically by
+repointing the bm25-<collection> symlink (core/versioned_dir.py), so a reader never
+finds the index missing or half-replaced.
+
+Arrays are memory-mapped when loaded, so opening the index costs almost nothing and
+worker processes share its pages. The loaded index is cached per directory and
+reloaded when meta.json changes (i.e. after the next ingest).
+"""
+
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .lexical import tokenize
+from .versioned_dir import new_version_dir, publish_dir, resolve_dir
+
+INDEX_FORMAT = 1
+
+
+def index_dir(db_dir: str, collection_name: str) -> str:
+    return os.path.join(db_dir, f"bm25-{collection_name}")
+
+
+def build_lexical_index(docs: Iterable[Tuple[str, str]], path: str) -> Dict[str, int]:
+    """
+    Build the index from (chunk id, text) pairs and write it to path (replacing it).
+
+    Returns:
+        {"chunks": ..., "terms": ..., "postings": ...}
+    """
+    ids: List[str] = []
+    doc_len: List[int] = []
+    vocab: Dict[str, int] = {}
+    # term number -> [(chunk number, tf), ...]; chunk numbers arrive in ascending order
+    postings: List[List[Tuple[int, int]]] = []
+
+    for doc_no, (chunk_id, text) in enumerate(docs):
+        ids.append(chunk_id)
+        tokens = tokenize(text)
+        doc_len.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            t = vocab.get(term)
+            if t is None:
+                t = vocab[term] = len(postings)
+                postings.append([])
+            postings[t].append((doc_no, min(tf, 65535)))
+
+    # Sort terms so vocab.json is stable and diff-friendly
+    order = sorted(vocab)
+    indptr = np.zeros(len(order) + 1, dtype=np.int64)
+    for n, term in enumerate(order):
+        indptr[n + 1] = indptr[n] + len(postings[vocab[term]])
+    flat_docs = np.empty(int(indptr[-1]), dtype=np.int32)
+    flat_tfs = np.empty(int(indptr[-1]), dtype=np.uint16)
+    for n, term in enumerate(order):
+        plist = postings[vocab[term]]
+        flat_docs[indptr[n]:indptr[n + 1]] = [d for d, _ in plist]
+        flat_tfs[indptr[n]:indptr[n + 1]] = [tf for _, tf in plist]
+
+    # Write a new version, then swap it in
+    tmp = new_version_dir(path)
+    np.save(os.path.join(tmp, "indptr.npy"), indptr)
+    np.save(os.path.join(tmp, "postings.npy"), flat_docs)
+    np.save(os.path.join(tmp, "tfs.npy"), flat_tfs)
+    np.save(os.path.join(tmp, "doc_len.npy"), np.asarray(doc_len, dtype=np.uint32))
+    with open(os.path.join(tmp, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(order, f, ensure_ascii=False)
+    with open(os.path.join(tmp, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    stats = {"chunks": len(ids), "terms": len(order), "postings": int(indptr[-1])}
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"format": INDEX_FORMAT, **stats}, f)
+
+    publish_dir(tmp, path)
+    return stats
+
+
+class LexicalIndex:
+    """
+    A loaded (memory-mapped) index. Searching is read-only and thread-safe.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        # Every file from the same version, even if a new one is published meanwhile
+        path = resolve_dir(path)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported lexical index format in {path}: {meta.get('format')}")
+
+        self.k1 = k1
+        self.b = b
+        self.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        doc_len = np.load(os.path.join(path, "doc_len.npy")).astype(np.float32)
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            self.vocab = {term: n for n, term in enumerate(json.load(f))}
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+
+        self.n_docs = len(self.ids)
+        avg_len = float(doc_len.mean()) if self.n_docs else 1.0
+        # Per-chunk part of the BM25 denominator, computed once
+        self._norm = k1 * (1.0 - b + b * doc_len / (avg_len or 1.0))
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Top-k chunks by BM25 score, as (chunk id, score), best first.
+        Chunks sharing no term with the query are never returned.
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        matched = False
+        for term in dict.fromkeys(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = int(self.indptr[t]), int(self.indptr[t + 1])
+            docs = self.postings[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            idf = np.log(1.0 + (self.n_docs - (end - start) + 0.5) / ((end - start) + 0.5))
+            # Chunk numbers are unique within one posting list, so += is safe
+            scores[docs] += tf * (self.k1 + 1.0) / (tf + self._norm[docs]) * idf
+            matched = True
+        if not matched:
+            return []
+
+        k = min(k, int(np.count_nonzero(scores)))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+
+_lock = threading.Lock()
+# index dir -> (LexicalIndex, mtime_ns of its meta.json)
+_loaded: Dict[str, Tuple[LexicalIndex, int]] = {}
+
+
+def get_lexical_index(db_dir: str, collection_name: str) -> Optional[LexicalIndex]:
+    """
+    The index for a collection, loaded on first use and reloaded after re-ingest.
+    None if ingest.py hasn't built one yet.
+    """
+    path = os.path.abspath(index_dir(db_dir, collection_name))
+    try:
+        mtime = os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+    except OSError:
+        return None
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[1] == mtime:
+            return cached[0]
+        index = LexicalIndex(path)
+        _loaded[path] = (index, mtime)
+        return index
+
+
+def unload_lexical_index(db_dir: str, collection_name: str) -> None:
+    """
+    Forget the loaded index of a collection (e.g. one that is about to be dropped).
+    """
+    with _lock:
+        _loaded.pop(os.path.abspath(index_dir(db_dir, collection_name)), None)
+
+
+def lexical_index_stats(db_dir: str, collection_name: str) -> Dict[str, Any]:
+    index = get_lexical_index(db_dir, collection_name)
+    if index is None:
+        return {}
+    return {"chunks": index.n_docs, "terms": len(index.vocab), "postings": int(index.indptr[-1])}
@@ -0,0 +1,58 @@
+"""
+Per-stage concurrency limits (async paths).
+
+Under load, stages compete for very different resources: LLM calls for the OpenAI
+rate limit, retrieval for CPU and the worker-thread pool. Each stage can be capped
+separately in RAGConfig (max_concurrent_llm / _embed / _retrieve, 0 = unlimited):
+
+    async with stage_limit("llm", trace):
+        resp = await client.chat.completions.create(...)
+
+Callers beyond the cap wait their turn; the wait is recorded in the trace as
+"<stage>_wait", so queueing shows up next to the stage's own latency.
+
+Limits are per process (serve.py runs one event loop per worker process, so the
+whole server allows workers * limit). Semaphores are kept per event loop, because
+an asyncio.Semaphore can't be shared between loops.
+"""
+
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from .config import CONFIG
+
+# stage -> RAGConfig field holding its limit
+STAGE_LIMITS = {
+    "llm": "max_concurrent_llm",
+    "embed": "max_concurrent_embed",
+    "retrieve": "max_concurrent_retrieve",
+}
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _semaphore(stage: str, limit: int) -> asyncio.Semaphore:
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    sem = per_loop.get(stage)
+    if sem is None:
+        sem = per_loop[stage] = asyncio.Semaphore(limit)
+    return sem
+
+
+@asynccontextmanager
+async def stage_limit(stage: str, trace=None) -> AsyncIterator[None]:
+    limit = getattr(CONFIG, STAGE_LIMITS[stage])
+    if limit <= 0:
+        yield
+        return
+
+    start = time.perf_counter()
+    async with _semaphore(stage, limit):
+        if trace is not None:
+            trace.add_time(f"{stage}_wait", (time.perf_counter() - start) * 1000)
+        yield
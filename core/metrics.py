@@ -0,0 +1,242 @@
+"""
+Metrics module.
+
+Where did the time go for a slow answer? Each request gets a Trace:
+
+- trace.stage("rerank") times a pipeline stage with a monotonic clock
+- trace.add_usage("generate", resp.usage) keeps OpenAI token counts
+- trace.count("embedding_cache_hits") counts cache hits and similar events
+
+The trace goes into the debug payload, and record_trace() feeds it to a
+process-wide registry that keeps per-stage latency histograms. The registry can be
+exported as Prometheus text (p50/p95 from a recent-samples window + cumulative
+buckets), and every trace can also be appended to a JSON lines file
+(CONFIG.metrics_jsonl_path) for offline analysis.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from .config import CONFIG
+
+# Histogram bucket upper bounds in milliseconds (Prometheus-style, cumulative)
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Percentiles are computed over the most recent samples per stage
+WINDOW = 2048
+
+
+class Trace:
+    """
+    Per-request timings, token usage and counters.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings_ms: Dict[str, float] = {}
+        self.usage: Dict[str, Dict[str, int]] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, (time.perf_counter() - start) * 1000)
+
+    def add_time(self, name: str, ms: float) -> None:
+        self.timings_ms[name] = round(self.timings_ms.get(name, 0.0) + ms, 2)
+
+    def add_usage(self, name: str, usage: Any) -> None:
+        """
+        Record an OpenAI `usage` object (or dict). Missing usage is ignored.
+        """
+        if usage is None:
+            return
+        if not isinstance(usage, dict):
+            usage = {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            }
+        entry = self.usage.setdefault(name, {"prompt_tokens": 0, "completion_tokens": 0})
+        entry["prompt_tokens"] += usage.get("prompt_tokens", 0) or 0
+        entry["completion_tokens"] += usage.get("completion_tokens", 0) or 0
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timings_ms": dict(self.timings_ms, total=self.elapsed_ms()),
+            "usage": self.usage,
+            "counters": self.counters,
+        }
+
+
+class MetricsRegistry:
+    """
+    Process-wide latency histograms per stage. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._buckets: Dict[str, List[int]] = {}
+        self._sum: Dict[str, float] = {}
+        self._count: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+        self._tokens: Dict[str, int] = {}
+        self._startup: Dict[str, float] = {}
+
+    def set_startup(self, phase: str, ms: float) -> None:
+        """
+        Record when a startup phase finished, in ms since process start (a gauge).
+        """
+        with self._lock:
+            self._startup[phase] = round(ms, 1)
+
+    def observe(self, stage: str, ms: float) -> None:
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=WINDOW)
+                self._buckets[stage] = [0] * len(BUCKETS_MS)
+                self._sum[stage] = 0.0
+                self._count[stage] = 0
+            self._samples[stage].append(ms)
+            for i, bound in enumerate(BUCKETS_MS):
+                if ms <= bound:
+                    self._buckets[stage][i] += 1
+            self._sum[stage] += ms
+            self._count[stage] += 1
+
+    def record(self, data: Dict[str, Any]) -> None:
+        """
+        Add one finished trace (as returned by Trace.to_dict()).
+        """
+        for stage, ms in data["timings_ms"].items():
+            self.observe(stage, ms)
+        with self._lock:
+            for name, n in data["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + n
+            for stage, usage in data["usage"].items():
+                for kind, n in usage.items():
+                    key = f"{stage}_{kind}"
+                    self._tokens[key] = self._tokens.get(key, 0) + n
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    @staticmethod
+    def _percentile(sorted_values: List[float], q: float) -> float:
+        if not sorted_values:
+            return 0.0
+        idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+        return sorted_values[idx]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        {stage: {count, mean_ms, p50_ms, p95_ms}} plus counters and token totals.
+        """
+        with self._lock:
+            stages = {}
+            for stage, samples in self._samples.items():
+                values = sorted(samples)
+                stages[stage] = {
+                    "count": self._count[stage],
+                    "mean_ms": round(self._sum[stage] / self._count[stage], 2),
+                    "p50_ms": round(self._percentile(values, 0.50), 2),
+                    "p95_ms": round(self._percentile(values, 0.95), 2),
+                }
+            return {
+                "stages": stages,
+                "counters": dict(self._counters),
+                "tokens": dict(self._tokens),
+                "startup_ms": dict(self._startup),
+            }
+
+    def prometheus_text(self) -> str:
+        """
+        Prometheus text exposition format.
+        """
+        summary = self.summary()
+        lines = [
+            "# HELP rag_stage_latency_ms Latency of RAG pipeline stages in milliseconds.",
+            "# TYPE rag_stage_latency_ms histogram",
+        ]
+        with self._lock:
+            for stage in sorted(self._buckets):
+                for bound, n in zip(BUCKETS_MS, self._buckets[stage]):
+                    lines.append(f'rag_stage_latency_ms_bucket{{stage="{stage}",le="{bound}"}} {n}')
+                lines.append(f'rag_stage_latency_ms_bucket{{stage="{stage}",le="+Inf"}} {self._count[stage]}')
+                lines.append(f'rag_stage_latency_ms_sum{{stage="{stage}"}} {self._sum[stage]:.2f}')
+                lines.append(f'rag_stage_latency_ms_count{{stage="{stage}"}} {self._count[stage]}')
+
+        lines.append("# HELP rag_stage_latency_ms_quantile Recent-window latency quantiles in milliseconds.")
+        lines.append("# TYPE rag_stage_latency_ms_quantile gauge")
+        for stage, s in sorted(summary["stages"].items()):
+            lines.append(f'rag_stage_latency_ms_quantile{{stage="{stage}",quantile="0.5"}} {s["p50_ms"]}')
+            lines.append(f'rag_stage_latency_ms_quantile{{stage="{stage}",quantile="0.95"}} {s["p95_ms"]}')
+
+        lines.append("# TYPE rag_events_total counter")
+        for name, n in sorted(summary["counters"].items()):
+            lines.append(f'rag_events_total{{event="{name}"}} {n}')
+        lines.append("# TYPE rag_tokens_total counter")
+        for name, n in sorted(summary["tokens"].items()):
+            lines.append(f'rag_tokens_total{{kind="{name}"}} {n}')
+        if summary["startup_ms"]:
+            lines.append("# HELP rag_startup_ms Time from process start until a startup phase finished.")
+            lines.append("# TYPE rag_startup_ms gauge")
+            for phase, ms in summary["startup_ms"].items():
+                lines.append(f'rag_startup_ms{{phase="{phase}"}} {ms}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._buckets.clear()
+            self._sum.clear()
+            self._count.clear()
+            self._counters.clear()
+            self._tokens.clear()
+
+
+REGISTRY = MetricsRegistry()
+_sink_lock = threading.Lock()
+
+
+def record_trace(trace: Trace, query: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Feed a finished trace to the registry (and the JSON lines sink if configured).
+
+    Returns:
+        the trace as a dict, ready for the debug payload
+    """
+    data = trace.to_dict()
+    REGISTRY.record(data)
+    if CONFIG.metrics_jsonl_path:
+        line = json.dumps({"ts": time.time(), "query": query, **data}, ensure_ascii=False)
+        with _sink_lock, open(CONFIG.metrics_jsonl_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    return data
+
+
+def metrics_summary() -> Dict[str, Any]:
+    return REGISTRY.summary()
+
+
+def metrics_counter(name: str) -> int:
+    """Process-wide total of a trace counter."""
+    return REGISTRY.counter(name)
+
+
+def metrics_prometheus_text() -> str:
+    return REGISTRY.prometheus_text()
@@ -0,0 +1,400 @@
+"""
+NumPy vector store (read-only backend, CONFIG.vector_backend = "numpy").
+
+Our KB is read-heavy and changes rarely. For that workload Chroma's PersistentClient
+startup, SQLite layer and per-query overhead dominate retrieval latency. This backend
+keeps the same data as plain arrays:
+
+- vectors.npy    unit-normalized embeddings, float32 / float16 / int8 (CONFIG.numpy_store_dtype)
+- scales.npy     int8 only: per-row scale, row ≈ int8_row * scale
+- ids.json, documents.json, metadatas.json   columnar side files ({key: [value per row]})
+- meta.json      written last: format, dim, dtype, count and a generation id
+
+Vectors are memory-mapped: opening the store is near-instant, and worker processes
+that open the same file share its pages through the OS page cache. Search is an exact
+matrix product (in blocks, so float16/int8 never need a full float32 copy) plus top-k.
+
+Chroma stays the write path: ingest.py exports the collection here after each run,
+into a new version directory that is swapped in atomically (core/versioned_dir.py).
+NumpyCollection implements the read part of Chroma's collection API that the
+retriever uses (id, count, get, query), so store.get_collection can return either.
+That includes `where` metadata filters (field equality, $eq/$ne/$gt/$gte/$lt/$lte,
+$in/$nin, $and/$or): matching rows are found first and only those are scored.
+verify_against_chroma() compares its results with Chroma's on the same queries.
+"""
+
+import json
+import operator
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .versioned_dir import new_version_dir, publish_dir, resolve_dir
+
+STORE_FORMAT = 1
+DTYPES = ("float32", "float16", "int8")
+
+# Rows scored per matrix product; bounds the float32 temporaries for float16/int8
+BLOCK_ROWS = 16384
+
+# Chroma's where operators; rows without the field never match
+WHERE_OPS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$in": lambda value, options: value in options,
+    "$nin": lambda value, options: value not in options,
+}
+# Row masks kept per collection for repeated filters (e.g. the same source file)
+MAX_CACHED_FILTERS = 256
+
+
+def store_dir(db_dir: str, collection_name: str) -> str:
+    return os.path.join(db_dir, f"numpy-{collection_name}")
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    if dtype == "float32":
+        return vectors.astype(np.float32), None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    # int8: symmetric per-row quantization, max |x| maps to 127
+    scale = np.abs(vectors).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    return np.round(vectors / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+
+
+def export_numpy_store(
+    records: Iterable[Tuple[str, str, Dict[str, Any], Sequence[float]]],
+    path: str,
+    dtype: str = "float32",
+    versioned: bool = True,
+) -> Dict[str, Any]:
+    """
+    Write (id, document, metadata, embedding) records as a new store at path (replacing it).
+
+    Args:
+        versioned: write a new version and swap it in atomically (see core/versioned_dir.py).
+            False writes a plain directory, for stores built offline such as snapshots.
+
+    Returns:
+        the store's meta.json contents
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"numpy_store_dtype must be one of {DTYPES}, got {dtype!r}")
+
+    ids: List[str] = []
+    documents: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    blocks: List[np.ndarray] = []
+    for chunk_id, doc, meta, emb in records:
+        ids.append(chunk_id)
+        documents.append(doc)
+        metadatas.append(meta or {})
+        blocks.append(np.asarray(emb, dtype=np.float32))
+
+    vectors = np.stack(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True) if len(vectors) else None
+    if norms is not None:
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+    stored, scale = _quantize(vectors, dtype)
+
+    # Columnar metadata: one list per key, None where a row lacks the key
+    keys = sorted({k for m in metadatas for k in m})
+    columns = {k: [m.get(k) for m in metadatas] for k in keys}
+
+    if versioned:
+        tmp = new_version_dir(path)
+    else:
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+    np.save(os.path.join(tmp, "vectors.npy"), stored)
+    if scale is not None:
+        np.save(os.path.join(tmp, "scales.npy"), scale)
+    for name, value in (("ids.json", ids), ("documents.json", documents), ("metadatas.json", columns)):
+        with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+    meta = {
+        "format": STORE_FORMAT,
+        "id": str(uuid.uuid4()),
+        "dim": int(stored.shape[1]) if stored.ndim == 2 else 0,
+        "dtype": dtype,
+        "count": len(ids),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    if versioned:
+        publish_dir(tmp, path)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+    return meta
+
+
+class NumpyCollection:
+    """
+    Read-only, memory-mapped collection with Chroma's query/get/count interface.
+    Distances are cosine distances (1 - cosine similarity), like our Chroma collections.
+    """
+
+    def __init__(self, path: str):
+        # Every file from the same version, even if a new one is published meanwhile
+        path = resolve_dir(path)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported numpy store format in {path}: {self.meta.get('format')}")
+
+        self.id = self.meta["id"]
+        self.dtype = self.meta["dtype"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy")) if self.dtype == "int8" else None
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+            self.documents: List[str] = json.load(f)
+        with open(os.path.join(path, "metadatas.json"), encoding="utf-8") as f:
+            self.columns: Dict[str, List[Any]] = json.load(f)
+        self._row = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _field_mask(self, key: str, condition: Any) -> np.ndarray:
+        column = self.columns.get(key, [None] * self.count())
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(self.count(), dtype=bool)
+        for op, operand in condition.items():
+            if op not in WHERE_OPS:
+                raise ValueError(f"Unsupported where operator: {op}")
+            test = WHERE_OPS[op]
+            mask &= np.fromiter(
+                (value is not None and test(value, operand) for value in column), dtype=bool, count=self.count()
+            )
+        return mask
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(self.count(), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                mask &= np.logical_or.reduce([self._where_mask(clause) for clause in condition])
+            else:
+                mask &= self._field_mask(key, condition)
+        return mask
+
+    def where_rows(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Indices of the rows matching a Chroma-style where clause; None means all rows.
+        """
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._where_mask(where)
+            if len(self._masks) >= MAX_CACHED_FILTERS:
+                self._masks.clear()
+            self._masks[key] = mask
+        return np.flatnonzero(mask)
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        return {k: col[row] for k, col in self.columns.items() if col[row] is not None}
+
+    def _rows_f32(self, start: int, end: int) -> np.ndarray:
+        block = np.asarray(self.vectors[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:end, None]
+        return block
+
+    def _similarities(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cosine similarity of each (unit) query against every row, or only against
+        `rows`: shape (n_queries, count or len(rows)).
+        """
+        if rows is not None:
+            return self._similarities_of_rows(queries, rows)
+        out = np.empty((len(queries), self.count()), dtype=np.float32)
+        for start in range(0, self.count(), BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, self.count())
+            if self.dtype == "float32":
+                out[:, start:end] = queries @ self.vectors[start:end].T
+            elif self.dtype == "float16":
+                out[:, start:end] = queries @ np.asarray(self.vectors[start:end], dtype=np.float32).T
+            else:
+                # Apply the row scales to the scores, not to every element: (q . x_int8) * scale
+                out[:, start:end] = (queries @ np.asarray(self.vectors[start:end], dtype=np.float32).T) * self.scales[start:end]
+        return out
+
+    def _similarities_of_rows(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        out = np.empty((len(queries), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            idx = rows[start : start + BLOCK_ROWS]
+            # Fancy indexing gathers just these rows out of the memory map
+            sims = queries @ np.asarray(self.vectors[idx], dtype=np.float32).T
+            if self.scales is not None:
+                sims *= self.scales[idx]
+            out[:, start : start + len(idx)] = sims
+        return out
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        q = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        q = q / norms
+
+        rows = self.where_rows(where)
+        k = min(n_results, self.count() if rows is None else len(rows))
+        res: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if k == 0:
+            for key in res:
+                res[key] = [[] for _ in range(len(q))]
+            return res
+
+        sims = self._similarities(q, rows)
+        for row_sims in sims:
+            top = np.argpartition(-row_sims, k - 1)[:k] if k < len(row_sims) else np.arange(len(row_sims))
+            top = top[np.argsort(-row_sims[top], kind="stable")]
+            distances = [float(1.0 - row_sims[i]) for i in top]
+            if rows is not None:
+                top = rows[top]
+            res["ids"].append([self.ids[i] for i in top])
+            res["distances"].append(distances)
+            res["documents"].append([self.documents[i] for i in top] if "documents" in include else None)
+            res["metadatas"].append([self._metadata(i) for i in top] if "metadatas" in include else None)
+        return res
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: int = 0,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        matching = self.where_rows(where)
+        if ids is not None:
+            rows = [self._row[i] for i in ids if i in self._row]
+            if matching is not None:
+                allowed = set(matching.tolist())
+                rows = [r for r in rows if r in allowed]
+        else:
+            candidates = range(self.count()) if matching is None else matching.tolist()
+            rows = list(candidates[offset : None if limit is None else offset + limit])
+
+        res: Dict[str, Any] = {"ids": [self.ids[r] for r in rows]}
+        if "documents" in include:
+            res["documents"] = [self.documents[r] for r in rows]
+        if "metadatas" in include:
+            res["metadatas"] = [self._metadata(r) for r in rows]
+        if "embeddings" in include:
+            res["embeddings"] = [self._rows_f32(r, r + 1)[0] for r in rows]
+        return res
+
+
+_lock = threading.Lock()
+# store dir -> (NumpyCollection, fingerprint of its meta.json)
+_loaded: Dict[str, Tuple[NumpyCollection, Tuple[int, int]]] = {}
+
+
+def meta_fingerprint(db_dir: str, collection_name: str) -> Optional[Tuple[int, int]]:
+    """
+    (mtime_ns, size) of the store's meta.json, which every export rewrites. None if missing.
+    """
+    try:
+        st = os.stat(os.path.join(store_dir(db_dir, collection_name), "meta.json"))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_numpy_collection(db_dir: str, collection_name: str) -> NumpyCollection:
+    """
+    The store for a collection, opened on first use and reopened after each export.
+    """
+    path = os.path.abspath(store_dir(db_dir, collection_name))
+    fp = meta_fingerprint(db_dir, collection_name)
+    if fp is None:
+        raise ValueError(
+            f"No numpy vector store for collection {collection_name!r} in {db_dir}/. "
+            "Run `python ingest.py` with vector_backend='numpy' first."
+        )
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[1] == fp:
+            return cached[0]
+        col = NumpyCollection(path)
+        _loaded[path] = (col, fp)
+        return col
+
+
+def unload_numpy_collection(db_dir: str, collection_name: str) -> None:
+    """
+    Forget the opened store (its files are about to be deleted or were replaced).
+    """
+    with _lock:
+        _loaded.pop(os.path.abspath(store_dir(db_dir, collection_name)), None)
+
+
+def verify_against_chroma(chroma_col, numpy_col: NumpyCollection, n_queries: int = 50, k: int = 10, seed: int = 0) -> Dict[str, float]:
+    """
+    Run the same queries on both stores and compare.
+
+    Queries are stored embeddings with a little noise, so they look like real
+    questions that land near KB chunks. Chroma's HNSW search is approximate and the
+    numpy search exact, so overlap@k slightly below 1.0 is expected.
+
+    Returns:
+        {"queries", "k", "overlap_at_k", "top1_agreement", "max_distance_diff"}
+    """
+    total = numpy_col.count()
+    if total == 0:
+        return {"queries": 0, "k": k, "overlap_at_k": 1.0, "top1_agreement": 1.0, "max_distance_diff": 0.0}
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(total, size=min(n_queries, total), replace=False)
+    picked = numpy_col.get(ids=[numpy_col.ids[r] for r in rows], include=["embeddings"])["embeddings"]
+    queries = np.stack(picked)
+    queries = queries + rng.normal(scale=0.02, size=queries.shape).astype(np.float32)
+
+    k = min(k, total)
+    expected = chroma_col.query(query_embeddings=queries.tolist(), n_results=k, include=["distances"])
+    actual = numpy_col.query(query_embeddings=queries, n_results=k, include=["distances"])
+
+    overlap, top1, max_diff = 0.0, 0, 0.0
+    for e_ids, e_d, a_ids, a_d in zip(expected["ids"], expected["distances"], actual["ids"], actual["distances"]):
+        overlap += len(set(e_ids) & set(a_ids)) / k
+        top1 += e_ids[0] == a_ids[0]
+        a_by_id = dict(zip(a_ids, a_d))
+        for chunk_id, d in zip(e_ids, e_d):
+            if chunk_id in a_by_id:
+                max_diff = max(max_diff, abs(a_by_id[chunk_id] - d))
+
+    n = len(queries)
+    return {
+        "queries": n,
+        "k": k,
+        "overlap_at_k": round(overlap / n, 4),
+        "top1_agreement": round(top1 / n, 4),
+        "max_distance_diff": round(max_diff, 6),
+    }
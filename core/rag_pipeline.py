@@ -7,13 +7,78 @@ The UI calls this. It returns:
 - answer
 - sources
 - debug details (retrieval + reranking) for one to inspect what is happening
+
+run_rag_async is the same pipeline for async callers: OpenAI calls are awaited and
+the Chroma query runs in a worker thread, so one process can serve many chats at once.
+
+run_rag_stream / run_rag_stream_async yield events instead of one result, so the UI
+can show retrieval info right away and then the answer token by token:
+- {"type": "retrieval", "sources": [...], "debug": {...}}  once, before generation
+- {"type": "token", "text": "..."}                         per answer delta
+- {"type": "done", "answer": ..., "sources": ..., "debug": ...}  last, same shape as run_rag()
+debug["time_to_first_token_ms"] records how long the user waited for the first token.
+
+Every run carries a metrics.Trace: per-stage timings (embed, answer_cache, retrieve,
+rerank, generate), OpenAI token usage and cache hits end up in debug["trace"] and in
+the process-wide latency histograms.
+
+The async paths respect the per-stage concurrency limits in core/limits.py
+(embed, retrieve, llm); time spent waiting for a slot shows up as "<stage>_wait".
+
+Context packing:
+- The reranked chunks are packed into a token budget (context_packer.py) before
+  generation: overlapping chunks are merged, repeated text sent once.
+  debug["context"] records the tokens used and saved.
+
+Adaptive rerank (CONFIG.adaptive_rerank):
+- retrieve_k and the rerank (skip / shrink / full) are decided per question from the
+  retrieval distances (rerank_policy.py); debug["retrieval"] and
+  debug["rerank"]["policy"] record the decisions.
+
+Speculative generation (CONFIG.speculative_generation):
+- Rerank and generation are two LLM round trips back to back. With speculation on,
+  generation starts from the top vector hits while the rerank runs. If the context
+  packed from them holds every chunk the reranker kept, its answer is used; otherwise it is cancelled
+  and generation restarts from the reranked chunks.
+- debug["speculative"] records whether the guess was accepted, the latency saved
+  against running rerank and generation back to back, and the acceptance rate of
+  this process. The streaming paths don't speculate: they show the reranked sources
+  before the first token.
+
+Semantic answer cache:
+- The query is embedded first. If a previous question was similar enough (and the
+  KB hasn't changed since), its answer is returned without retrieval, rerank or generation.
+
+Metadata filters:
+- Every entry point takes an optional `where` clause (retriever.metadata_filter), e.g.
+  to answer from one source file or one section only. Retrieval is restricted to the
+  matching chunks; the filter is recorded in debug["where"].
+- Filtered questions skip the answer cache: a cached answer came from the whole KB.
 """
 
-from typing import Any, Dict, List, Tuple
+import asyncio
+import contextlib
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Hashable, Iterator, List, Optional, Tuple
+from .answer_cache import get_answer_cache
+from .clients import get_async_openai_client, get_openai_client
 from .config import CONFIG
-from .retriever import retrieve_candidates
-from .reranker import rerank_with_llm
-from .generator import build_context_blocks, generate_grounded_answer
+from .context_packer import pack_context
+from .embeddings import count_tokens, embed_query, embed_query_async
+from .lexical_index import get_lexical_index
+from .limits import stage_limit
+from .metrics import REGISTRY, Trace, metrics_counter, record_trace
+from .retriever import adaptive_search
+from .reranker import rerank, rerank_async
+from .store import collection_version, get_collection, read_generations, serving_collection
+from .generator import (
+    build_context_blocks,
+    generate_grounded_answer,
+    generate_grounded_answer_async,
+    generate_grounded_answer_stream,
+    generate_grounded_answer_stream_async,
+)
 
 def confidence_gate(candidates: List[Dict[str, Any]], max_best_distance: float) -> Tuple[bool, str]:
     """
@@ -39,71 +104,636 @@ def confidence_gate(candidates: List[Dict[str, Any]], max_best_distance: float)
     return True, f"Retrieval looks OK (best distance={best:.3f})."
 
 
-def run_rag(query: str) -> Dict[str, Any]:
+def refusal_result(
+    gate_reason: str,
+    candidates: List[Dict[str, Any]],
+    retrieval: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Result returned when the confidence gate blocks answering.
+    """
+    result = {
+        "answer": (
+            "I don't know based on the current knowledge base.\n\n"
+            f"Reason: {gate_reason}\n"
+            "Tip: Add or improve a KB document that covers this topic."
+        ),
+        "sources": [],
+        "debug": {
+            "gate_reason": gate_reason,
+            "retrieved": candidates,
+            "reranked": [],
+        },
+    }
+    if retrieval is not None:
+        result["debug"]["retrieval"] = retrieval
+    return result
+
+
+def unique_sources(hits: List[Dict[str, Any]]) -> List[str]:
+    """
+    Source filenames of hits, de-duplicated, in order of first use.
+    """
+    sources = []
+    for h in hits:
+        if h["source"] not in sources:
+            sources.append(h["source"])
+    return sources
+
+
+def cached_answer(
+    qvec: List[List[float]],
+    trace: Trace,
+    where: Optional[Dict[str, Any]] = None,
+    collection: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, Any]], Optional[Hashable]]:
+    """
+    Look the query up in the semantic answer cache (not for filtered queries).
+
+    Entries are keyed by the version of the serving collection, so a KB reload
+    (new generation) invalidates them.
+
+    Returns:
+        (cached result or None, KB version to store a fresh result under)
+    """
+    cache = get_answer_cache()
+    if cache is None or where:
+        return None, None
+    with trace.stage("answer_cache"):
+        version = collection_version(CONFIG.db_dir, collection or serving_collection())
+        hit = cache.lookup(qvec[0], version)
+    trace.count("answer_cache_hits" if hit is not None else "answer_cache_misses")
+    return hit, version
+
+
+def remember_answer(query: str, qvec: List[List[float]], result: Dict[str, Any], version: Optional[Hashable]) -> None:
+    cache = get_answer_cache()
+    if cache is not None and version is not None:
+        cache.store(query, qvec[0], result, version)
+
+
+def pack(reranked: List[Dict[str, Any]], trace: Trace) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Fit the reranked hits into the context token budget (see context_packer.py).
+    """
+    with trace.stage("pack"):
+        blocks, info = pack_context(reranked, CONFIG.context_token_budget, CONFIG.chat_model)
+    trace.count("context_tokens_saved", info["tokens_saved"])
+    return blocks, info
+
+
+def finish(
+    result: Dict[str, Any],
+    trace: Trace,
+    query: str,
+    where: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Close the request's trace and attach it (and the metadata filter, if any) to debug.
+
+    Requests that finish while a KB reload is building also go to the
+    "total_during_kb_reload" histogram: compare it with "total" to see what a reload
+    costs the traffic running next to it.
+    """
+    if where:
+        result["debug"]["where"] = where
+    kb = read_generations(CONFIG.db_dir, CONFIG.collection_name)
+    result["debug"]["kb_generation"] = kb["generation"]
+    reloading = kb.get("building") is not None
+    if reloading:
+        trace.count("during_kb_reload")
+    result["debug"]["trace"] = record_trace(trace, query)
+    if reloading:
+        REGISTRY.observe("total_during_kb_reload", result["debug"]["trace"]["timings_ms"]["total"])
+    return result
+
+
+def warm_up() -> None:
+    """
+    Do the one-time work of the first question ahead of time: build the OpenAI
+    clients, open the vector store, load the tokenizer and the lexical index.
+    """
+    get_openai_client()
+    get_async_openai_client()
+    collection = serving_collection()
+    get_collection(CONFIG.db_dir, collection)
+    count_tokens(["warm up"], CONFIG.embedding_model)
+    count_tokens(["warm up"], CONFIG.chat_model)
+    if CONFIG.hybrid_retrieval:
+        get_lexical_index(CONFIG.db_dir, collection)
+
+
+def speculating() -> bool:
+    # The lexical reranker makes no LLM call, so there is nothing to overlap
+    return CONFIG.speculative_generation and CONFIG.reranker != "lexical"
+
+
+def _guess(candidates: List[Dict[str, Any]], trace: Trace) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    The speculative context: top vector hits, packed. Returns (blocks, info).
+    The packing is timed like any other; the guess's context_tokens_saved (and its
+    generation time and usage) reach the trace only if it is accepted, so a rejected
+    guess isn't counted twice.
+    """
+    hits = candidates[:CONFIG.keep_n_after_rerank]
+    with trace.stage("pack"):
+        blocks, info = pack_context(hits, CONFIG.context_token_budget, CONFIG.chat_model)
+    return blocks, info
+
+
+def _covers(guess_blocks: List[Dict[str, Any]], reranked: List[Dict[str, Any]]) -> bool:
+    """
+    Whether the speculative answer saw every reranked chunk. Checked against what
+    was packed, not the guessed hits: the token budget may have dropped some.
+    """
+    ids = {i for block in guess_blocks for i in block["ids"]}
+    return bool(reranked) and all(h["id"] in ids for h in reranked)
+
+
+async def _cancel(task: "asyncio.Task") -> None:
+    # Await the cancelled task so an error it raised meanwhile is retrieved, not logged
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await task
+
+
+def _speculation_info(
+    trace: Trace,
+    accepted: bool,
+    started: float,
+    rerank_ms: float,
+    speculative_ms: float,
+    generate_ms: float,
+) -> Dict[str, Any]:
+    """
+    debug["speculative"]. saved_ms compares against rerank then generate back to back;
+    it is about 0 (or slightly negative) for a rejected guess.
+    """
+    trace.count("speculative_accepted" if accepted else "speculative_rejected")
+    saved_ms = round(rerank_ms + generate_ms - _elapsed_ms(started), 1)
+    if accepted:
+        trace.count("speculative_saved_ms", max(0, int(saved_ms)))
+    # Process-wide, including this request (its trace isn't recorded yet)
+    accepted_total = metrics_counter("speculative_accepted") + accepted
+    total = accepted_total + metrics_counter("speculative_rejected") + (not accepted)
+    return {
+        "accepted": accepted,
+        "rerank_ms": rerank_ms,
+        "speculative_ms": speculative_ms,
+        "saved_ms": saved_ms,
+        "acceptance_rate": round(accepted_total / total, 3),
+    }
+
+
+class _Speculation(threading.Thread):
+    """
+    Streams the speculative answer in a background thread. cancel() stops reading
+    the stream, which ends the generation early.
+    """
+
+    def __init__(self, query: str, blocks: List[Dict[str, Any]]):
+        super().__init__(daemon=True)
+        self.query = query
+        self.context = build_context_blocks(blocks)
+        self.trace = Trace()  # usage is merged into the request's trace if accepted
+        self.parts: List[str] = []
+        self.error: Optional[BaseException] = None
+        self.started = time.perf_counter()
+        self.ms = 0.0
+        self._cancelled = threading.Event()
+
+    def run(self) -> None:
+        try:
+            for delta in generate_grounded_answer_stream(
+                query=self.query,
+                context_blocks=self.context,
+                model=CONFIG.chat_model,
+                temperature=CONFIG.temperature,
+                trace=self.trace,
+            ):
+                if self._cancelled.is_set():
+                    break
+                self.parts.append(delta)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.ms = _elapsed_ms(self.started)
+
+    def cancel(self) -> float:
+        """Stop generating; returns how long the speculation ran (ms)."""
+        self._cancelled.set()
+        return self.ms if not self.is_alive() else _elapsed_ms(self.started)
+
+    def answer(self) -> str:
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return "".join(self.parts).strip()
+
+
+def speculative_answer(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    trace: Trace,
+) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Rerank and speculatively generate at the same time.
+
+    Returns:
+        (answer, context blocks, debug entries: reranked, rerank, context, speculative)
+    """
+    started = time.perf_counter()
+    guess_blocks, guess_info = _guess(candidates, trace)
+    speculation = _Speculation(query, guess_blocks)
+    speculation.start()
+
+    rerank_start = time.perf_counter()
+    try:
+        with trace.stage("rerank"):
+            reranked, rerank_info = rerank(query, candidates, CONFIG, trace)
+    except BaseException:
+        # Nobody will read the speculative answer; stop paying for it
+        speculation.cancel()
+        raise
+    rerank_ms = _elapsed_ms(rerank_start)
+
+    accepted = _covers(guess_blocks, reranked)
+    if accepted:
+        answer = speculation.answer()
+        blocks, context_info, generate_ms = guess_blocks, guess_info, speculation.ms
+        trace.add_time("generate", generate_ms)
+        trace.add_usage("generate", speculation.trace.usage.get("generate"))
+        trace.count("context_tokens_saved", context_info["tokens_saved"])
+        speculative_ms = speculation.ms
+    else:
+        speculative_ms = speculation.cancel()
+        blocks, context_info = pack(reranked, trace)
+        generate_start = time.perf_counter()
+        with trace.stage("generate"):
+            answer = generate_grounded_answer(
+                query=query,
+                context_blocks=build_context_blocks(blocks),
+                model=CONFIG.chat_model,
+                temperature=CONFIG.temperature,
+                trace=trace,
+            )
+        generate_ms = _elapsed_ms(generate_start)
+
+    return answer, blocks, {
+        "reranked": reranked,
+        "rerank": rerank_info,
+        "context": context_info,
+        "speculative": _speculation_info(trace, accepted, started, rerank_ms, speculative_ms, generate_ms),
+    }
+
+
+async def _timed(coro) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    return await coro, _elapsed_ms(start)
+
+
+async def speculative_answer_async(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    trace: Trace,
+) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Async version of speculative_answer: the speculation is a task, cancelled
+    (request aborted) when the guess is rejected.
+    """
+    started = time.perf_counter()
+    guess_blocks, guess_info = _guess(candidates, trace)
+    speculation_trace = Trace()
+    speculation_started = time.perf_counter()
+
+    async def speculate() -> Tuple[str, float]:
+        # The generation coroutine is created in the task, so cancelling the task
+        # before its first step leaves no never-awaited coroutine behind
+        return await _timed(generate_grounded_answer_async(
+            query=query,
+            context_blocks=build_context_blocks(guess_blocks),
+            model=CONFIG.chat_model,
+            temperature=CONFIG.temperature,
+            trace=speculation_trace,
+        ))
+
+    speculation = asyncio.create_task(speculate())
+
+    rerank_start = time.perf_counter()
+    try:
+        with trace.stage("rerank"):
+            reranked, rerank_info = await rerank_async(query, candidates, CONFIG, trace)
+    except BaseException:
+        await _cancel(speculation)
+        raise
+    rerank_ms = _elapsed_ms(rerank_start)
+
+    accepted = _covers(guess_blocks, reranked)
+    if accepted:
+        answer, generate_ms = await speculation
+        speculative_ms = generate_ms
+        blocks, context_info = guess_blocks, guess_info
+        trace.add_time("generate", generate_ms)
+        trace.add_usage("generate", speculation_trace.usage.get("generate"))
+        trace.count("context_tokens_saved", context_info["tokens_saved"])
+        for name, ms in speculation_trace.timings_ms.items():
+            trace.add_time(name, ms)  # llm_wait
+    else:
+        # How long the speculation ran, as the sync path reports it
+        speculative_ms = _elapsed_ms(speculation_started)
+        await _cancel(speculation)
+        blocks, context_info = pack(reranked, trace)
+        with trace.stage("generate"):
+            answer, generate_ms = await _timed(generate_grounded_answer_async(
+                query=query,
+                context_blocks=build_context_blocks(blocks),
+                model=CONFIG.chat_model,
+                temperature=CONFIG.temperature,
+                trace=trace,
+            ))
+
+    return answer, blocks, {
+        "reranked": reranked,
+        "rerank": rerank_info,
+        "context": context_info,
+        "speculative": _speculation_info(trace, accepted, started, rerank_ms, speculative_ms, generate_ms),
+    }
+
+
+def run_rag(query: str, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Run the full RAG pipeline.
 
     Returns a dict containing:
         - answer: model output
         - sources: unique source filenames used
-        - debug: retrieval/rerank diagnostics
+        - debug: retrieval/rerank diagnostics, plus per-stage timings in debug["trace"]
+
+    `where` restricts retrieval to chunks whose metadata matches (see metadata_filter).
     """
+    trace = Trace()
+    collection = serving_collection()
+    with trace.stage("embed"):
+        qvec = embed_query(query, model=CONFIG.embedding_model, trace=trace)
+    cached, version = cached_answer(qvec, trace, where, collection)
+    if cached is not None:
+        return finish(cached, trace, query)
+
     # 1) Retrieve candidates
-    candidates = retrieve_candidates(
-        query=query,
-        db_dir=CONFIG.db_dir,
-        collection_name=CONFIG.collection_name,
-        embedding_model=CONFIG.embedding_model,
-        k=CONFIG.retrieve_k,
-    )
+    with trace.stage("retrieve"):
+        candidates, retrieval = adaptive_search(
+            query, qvec, CONFIG.db_dir, collection, CONFIG.retrieve_k, where
+        )
 
     # 2) Confidence gate
     allowed, gate_reason = confidence_gate(candidates, CONFIG.max_best_distance)
     if not allowed:
-        return {
-            "answer": (
-                "I don't know based on the current knowledge base.\n\n"
-                f"Reason: {gate_reason}\n"
-                "Tip: Add or improve a KB document that covers this topic."
-            ),
-            "sources": [],
-            "debug": {
-                "gate_reason": gate_reason,
-                "retrieved": candidates,
-                "reranked": [],
-            },
-        }
-
-    # 3) Rerank
-    reranked = rerank_with_llm(
-        query=query,
-        candidates=candidates,
-        model=CONFIG.chat_model,
-        keep_n=CONFIG.keep_n_after_rerank,
-    )
+        return finish(refusal_result(gate_reason, candidates, retrieval), trace, query, where)
+
+    if speculating():
+        # 3) + 4) at the same time
+        answer, blocks, steps = speculative_answer(query, candidates, trace)
+    else:
+        # 3) Rerank
+        with trace.stage("rerank"):
+            reranked, rerank_info = rerank(query, candidates, CONFIG, trace)
+
+        # 4) Generate grounded answer
+        blocks, context_info = pack(reranked, trace)
+        context = build_context_blocks(blocks)
+        with trace.stage("generate"):
+            answer = generate_grounded_answer(
+                query=query,
+                context_blocks=context,
+                model=CONFIG.chat_model,
+                temperature=CONFIG.temperature,
+                trace=trace,
+            )
+        steps = {"reranked": reranked, "rerank": rerank_info, "context": context_info}
+
+    result = {
+        "answer": answer,
+        "sources": unique_sources(blocks),
+        "debug": {"gate_reason": gate_reason, "retrieval": retrieval, "retrieved": candidates, **steps},
+    }
+    finish(result, trace, query, where)
+    remember_answer(query, qvec, result, version)
+    return result
+
+
+async def run_rag_async(query: str, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Async version of run_rag. Same steps, same result shape.
+    """
+    trace = Trace()
+    collection = serving_collection()
+    async with stage_limit("embed", trace):
+        with trace.stage("embed"):
+            qvec = await embed_query_async(query, model=CONFIG.embedding_model, trace=trace)
+    cached, version = cached_answer(qvec, trace, where, collection)
+    if cached is not None:
+        return finish(cached, trace, query)
+
+    async with stage_limit("retrieve", trace):
+        with trace.stage("retrieve"):
+            candidates, retrieval = await asyncio.to_thread(
+                adaptive_search, query, qvec, CONFIG.db_dir, collection, CONFIG.retrieve_k, where
+            )
+    return await answer_candidates_async(query, qvec, candidates, trace, version, where, retrieval)
+
+
+async def answer_candidates_async(
+    query: str,
+    qvec: List[List[float]],
+    candidates: List[Dict[str, Any]],
+    trace: Trace,
+    version: Optional[Hashable],
+    where: Optional[Dict[str, Any]] = None,
+    retrieval: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Second half of run_rag_async: gate, rerank and generate for retrieved candidates.
+
+    Shared with the batch mode, which embeds and retrieves many queries at once.
+    """
+    allowed, gate_reason = confidence_gate(candidates, CONFIG.max_best_distance)
+    if not allowed:
+        return finish(refusal_result(gate_reason, candidates, retrieval), trace, query, where)
+
+    if speculating():
+        answer, blocks, steps = await speculative_answer_async(query, candidates, trace)
+    else:
+        with trace.stage("rerank"):
+            reranked, rerank_info = await rerank_async(query, candidates, CONFIG, trace)
+
+        blocks, context_info = pack(reranked, trace)
+        context = build_context_blocks(blocks)
+        with trace.stage("generate"):
+            answer = await generate_grounded_answer_async(
+                query=query,
+                context_blocks=context,
+                model=CONFIG.chat_model,
+                temperature=CONFIG.temperature,
+                trace=trace,
+            )
+        steps = {"reranked": reranked, "rerank": rerank_info, "context": context_info}
+
+    result = {
+        "answer": answer,
+        "sources": unique_sources(blocks),
+        "debug": {"gate_reason": gate_reason, "retrieval": retrieval, "retrieved": candidates, **steps},
+    }
+    finish(result, trace, query, where)
+    remember_answer(query, qvec, result, version)
+    return result
 
-    # 4) Generate grounded answer
-    context = build_context_blocks(reranked)
-    answer = generate_grounded_answer(
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _replay(
+    result: Dict[str, Any],
+    trace: Trace,
+    query: str,
+    where: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Events for a result that is already complete (refusal or cache hit).
+    """
+    result["debug"]["time_to_first_token_ms"] = _elapsed_ms(trace.started)
+    result["debug"]["total_ms"] = result["debug"]["time_to_first_token_ms"]
+    yield {"type": "done", **finish(result, trace, query, where)}
+
+
+def run_rag_stream(query: str, where: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming version of run_rag (see module docstring for the event types).
+    """
+    trace = Trace()
+    collection = serving_collection()
+    with trace.stage("embed"):
+        qvec = embed_query(query, model=CONFIG.embedding_model, trace=trace)
+    cached, version = cached_answer(qvec, trace, where, collection)
+    if cached is not None:
+        yield from _replay(cached, trace, query)
+        return
+
+    with trace.stage("retrieve"):
+        candidates, retrieval = adaptive_search(
+            query, qvec, CONFIG.db_dir, collection, CONFIG.retrieve_k, where
+        )
+
+    allowed, gate_reason = confidence_gate(candidates, CONFIG.max_best_distance)
+    if not allowed:
+        yield from _replay(refusal_result(gate_reason, candidates, retrieval), trace, query, where)
+        return
+
+    with trace.stage("rerank"):
+        reranked, rerank_info = rerank(query, candidates, CONFIG, trace)
+
+    blocks, context_info = pack(reranked, trace)
+    sources = unique_sources(blocks)
+    debug = {
+        "gate_reason": gate_reason,
+        "retrieval": retrieval,
+        "retrieved": candidates,
+        "reranked": reranked,
+        "rerank": rerank_info,
+        "context": context_info,
+    }
+    yield {"type": "retrieval", "sources": sources, "debug": debug}
+
+    parts = []
+    # Time spent waiting on the model only, not on the consumer of our events
+    waiting_since = time.perf_counter()
+    for delta in generate_grounded_answer_stream(
         query=query,
-        context_blocks=context,
+        context_blocks=build_context_blocks(blocks),
         model=CONFIG.chat_model,
         temperature=CONFIG.temperature,
-    )
+        trace=trace,
+    ):
+        trace.add_time("generate", (time.perf_counter() - waiting_since) * 1000)
+        if not parts:
+            debug["time_to_first_token_ms"] = _elapsed_ms(trace.started)
+        parts.append(delta)
+        yield {"type": "token", "text": delta}
+        waiting_since = time.perf_counter()
+    trace.add_time("generate", (time.perf_counter() - waiting_since) * 1000)
 
-    # Unique sources used
-    sources = []
-    for h in reranked:
-        if h["source"] not in sources:
-            sources.append(h["source"])
+    debug["total_ms"] = _elapsed_ms(trace.started)
+    debug.setdefault("time_to_first_token_ms", debug["total_ms"])
+    result = finish({"answer": "".join(parts).strip(), "sources": sources, "debug": debug}, trace, query, where)
+    remember_answer(query, qvec, result, version)
+    yield {"type": "done", **result}
 
-    return {
-        "answer": answer,
-        "sources": sources,
-        "debug": {
-            "gate_reason": gate_reason,
-            "retrieved": candidates,
-            "reranked": reranked,
-        },
+
+async def run_rag_stream_async(
+    query: str,
+    where: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async streaming version of run_rag (same events as run_rag_stream).
+    """
+    trace = Trace()
+    collection = serving_collection()
+    async with stage_limit("embed", trace):
+        with trace.stage("embed"):
+            qvec = await embed_query_async(query, model=CONFIG.embedding_model, trace=trace)
+    cached, version = cached_answer(qvec, trace, where, collection)
+    if cached is not None:
+        for event in _replay(cached, trace, query):
+            yield event
+        return
+
+    async with stage_limit("retrieve", trace):
+        with trace.stage("retrieve"):
+            candidates, retrieval = await asyncio.to_thread(
+                adaptive_search, query, qvec, CONFIG.db_dir, collection, CONFIG.retrieve_k, where
+            )
+
+    allowed, gate_reason = confidence_gate(candidates, CONFIG.max_best_distance)
+    if not allowed:
+        for event in _replay(refusal_result(gate_reason, candidates, retrieval), trace, query, where):
+            yield event
+        return
+
+    with trace.stage("rerank"):
+        reranked, rerank_info = await rerank_async(query, candidates, CONFIG, trace)
+
+    blocks, context_info = pack(reranked, trace)
+    sources = unique_sources(blocks)
+    debug = {
+        "gate_reason": gate_reason,
+        "retrieval": retrieval,
+        "retrieved": candidates,
+        "reranked": reranked,
+        "rerank": rerank_info,
+        "context": context_info,
     }
+    yield {"type": "retrieval", "sources": sources, "debug": debug}
+
+    parts = []
+    # Time spent waiting on the model only, not on the consumer of our events
+    waiting_since = time.perf_counter()
+    async for delta in generate_grounded_answer_stream_async(
+        query=query,
+        context_blocks=build_context_blocks(blocks),
+        model=CONFIG.chat_model,
+        temperature=CONFIG.temperature,
+        trace=trace,
+    ):
+        trace.add_time("generate", (time.perf_counter() - waiting_since) * 1000)
+        if not parts:
+            debug["time_to_first_token_ms"] = _elapsed_ms(trace.started)
+        parts.append(delta)
+        yield {"type": "token", "text": delta}
+        waiting_since = time.perf_counter()
+    trace.add_time("generate", (time.perf_counter() - waiting_since) * 1000)
 
+    debug["total_ms"] = _elapsed_ms(trace.started)
+    debug.setdefault("time_to_first_token_ms", debug["total_ms"])
+    result = finish({"answer": "".join(parts).strip(), "sources": sources, "debug": debug}, trace, query, where)
+    remember_answer(query, qvec, result, version)
+    yield {"type": "done", **result}
@@ -0,0 +1,89 @@
+"""
+Adaptive rerank policy.
+
+The confidence gate already looks at the retrieval distances, but only to refuse:
+every answered question paid for an LLM rerank of all retrieve_k candidates, even
+when the vector search had one obvious winner.
+
+With CONFIG.adaptive_rerank the distance profile of the candidates decides:
+
+- skip:   the best hit dominates (distance <= adaptive_skip_max_distance and at least
+          adaptive_skip_min_gap ahead of the runner-up): no rerank, the top
+          keep_n_after_rerank hits are used in vector order
+- shrink: only hits within adaptive_shrink_margin of the best (at least
+          keep_n_after_rerank of them) go to the reranker; a shorter prompt
+- full:   all candidates are close to each other; rerank them all
+
+It also adapts retrieve_k per question: the first search asks for
+adaptive_retrieve_k_min hits, and only if all of them are within the margin of the
+best (the close band runs past the cut) is the search repeated with retrieve_k.
+
+Every decision, with the numbers it was made on, ends up in debug (retrieval info
+in debug["retrieval"], rerank decision in debug["rerank"]["policy"]), so the
+thresholds can be tuned offline on batch_qa.py output.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from .config import RAGConfig
+
+
+def distance_profile(candidates: List[Dict[str, Any]], margin: float) -> Dict[str, Any]:
+    """
+    best distance, gap to the second best, and how many hits are within margin of the best.
+    """
+    distances = sorted(c["distance"] for c in candidates)
+    if not distances:
+        return {"best": None, "gap": None, "close": 0}
+    best = distances[0]
+    return {
+        "best": round(best, 4),
+        "gap": round(distances[1] - best, 4) if len(distances) > 1 else None,
+        "close": sum(1 for d in distances if d <= best + margin),
+    }
+
+
+def needs_more_candidates(candidates: List[Dict[str, Any]], k: int, config: RAGConfig) -> bool:
+    """
+    True if a search for k hits was cut inside the band of close hits.
+    """
+    if len(candidates) < k:
+        return False  # there is nothing more to find
+    return distance_profile(candidates, config.adaptive_shrink_margin)["close"] >= len(candidates)
+
+
+def plan_rerank(
+    candidates: List[Dict[str, Any]],
+    config: RAGConfig,
+) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Decide how to rerank.
+
+    Returns:
+        (decision, candidates to rerank, info for debug); for "skip" the candidates
+        are the final reranked list
+    """
+    keep_n = config.keep_n_after_rerank
+    profile = distance_profile(candidates, config.adaptive_shrink_margin)
+    info = dict(profile, candidates=len(candidates))
+
+    dominant = (
+        profile["best"] is not None
+        and profile["best"] <= config.adaptive_skip_max_distance
+        and (profile["gap"] is None or profile["gap"] >= config.adaptive_skip_min_gap)
+    )
+    if dominant or len(candidates) <= 1:
+        return "skip", candidates[:keep_n], dict(info, decision="skip", sent=0)
+
+    # Keep the close hits in their retrieval order (fused order with hybrid retrieval)
+    limit = profile["best"] + config.adaptive_shrink_margin
+    picked = {c["id"] for c in candidates if c["distance"] <= limit}
+    for c in candidates:
+        # Top up to keep_n with the next hits in retrieval order
+        if len(picked) >= keep_n:
+            break
+        picked.add(c["id"])
+    if len(picked) >= len(candidates):
+        return "full", candidates, dict(info, decision="full", sent=len(candidates))
+    shrunk = [c for c in candidates if c["id"] in picked]
+    return "shrink", shrunk, dict(info, decision="shrink", sent=len(shrunk))
@@ -8,33 +8,31 @@ Problem:
 Solution:
 - Retrieve top-k candidates
 - Ask an LLM model to intelligently select relevant chunks for answering the query to significantly improve correctness
+
+Rerankers are pluggable (CONFIG.reranker):
+- "llm":     one chat completion orders the candidates (best quality, slowest)
+- "lexical": local BM25 blended with the vector similarity; CPU only, ~1 ms
+- "hybrid":  lexical first, and the LLM only when the top lexical scores are too close to call
+
+With CONFIG.adaptive_rerank, rerank_policy.py first decides from the retrieval
+distances whether to rerank at all, and how many candidates to send.
 """
 
-from typing import Any, Dict, List
-from openai import OpenAI
-from dotenv import load_dotenv
-load_dotenv()
+from typing import Any, Dict, List, Tuple
 
-client = OpenAI()
+import numpy as np
 
-def rerank_with_llm(
-    query: str,
-    candidates: List[Dict[str, Any]], # chunks retrieved from vector search
-    model: str,
-    keep_n: int,
-) -> List[Dict[str, Any]]:
-    """
-    Rerank candidates using an LLM.
+from .clients import get_async_openai_client, get_openai_client
+from .config import CONFIG, RAGConfig
+from .lexical import bm25_scores
+from .limits import stage_limit
+from .rerank_policy import plan_rerank
 
-    Output is the selected top 'keep_n' candidates, in best-first order.
 
-    Implementation approach:
-    - Provide the query and numbered candidate summaries
-    - Ask the model to return a comma-separated list of best indices
+def build_rerank_prompt(query: str, candidates: List[Dict[str, Any]]) -> str:
+    """
+    Build the reranking prompt: the query plus numbered candidate previews.
     """
-    if not candidates: # if no candidates are retrieved
-        return []
-
     # Create a compact view of candidates
     # Truncate long chunks to reduce token usage during reranking
 
@@ -43,7 +41,7 @@ def rerank_with_llm(
         preview = c["text"][:600].replace("\n", " ")
         numbered.append(f"{i}. ({c['source']}) {preview}")
 
-    prompt = f"""
+    return f"""
 You are a retrieval reranker.
 Given the user question and a list of candidate passages, select the passages
 most useful for answering the question.
@@ -57,19 +55,18 @@ QUESTION:
 {query}
 
 CANDIDATES:
-{chr(10).join(numbered)} 
+{chr(10).join(numbered)}
 """.strip()
 
-    # call the LLM
-    resp = client.chat.completions.create(
-        model=model,
-        temperature=0.0,  # deterministic rerank
-        messages=[{"role": "user", "content": prompt}],
-    )
-
-    # Extract LLM response
-    raw = resp.choices[0].message.content.strip()
 
+def parse_rerank_response(
+    raw: str,
+    candidates: List[Dict[str, Any]],
+    keep_n: int,
+) -> List[Dict[str, Any]]:
+    """
+    Turn the model's "2,5,1" reply into the selected candidates, best-first.
+    """
     # Parse indices safely. LLMs may fail to follow instructions safely
     chosen = []
     for part in raw.split(","):
@@ -93,3 +90,196 @@ CANDIDATES:
 
     reranked = [candidates[i - 1] for i in final_indices]
     return reranked[:keep_n]
+
+
+def _record_usage(trace, prompt: str, resp) -> None:
+    if trace is not None:
+        trace.count("rerank_prompt_chars", len(prompt))
+        trace.add_usage("rerank", getattr(resp, "usage", None))
+
+
+def rerank_with_llm(
+    query: str,
+    candidates: List[Dict[str, Any]], # chunks retrieved from vector search
+    model: str,
+    keep_n: int,
+    trace=None,
+) -> List[Dict[str, Any]]:
+    """
+    Rerank candidates using an LLM.
+
+    Output is the selected top 'keep_n' candidates, in best-first order.
+
+    Implementation approach:
+    - Provide the query and numbered candidate summaries
+    - Ask the model to return a comma-separated list of best indices
+    """
+    if not candidates: # if no candidates are retrieved
+        return []
+
+    prompt = build_rerank_prompt(query, candidates)
+
+    # call the LLM
+    resp = get_openai_client().chat.completions.create(
+        model=model,
+        temperature=0.0,  # deterministic rerank
+        messages=[{"role": "user", "content": prompt}],
+    )
+    _record_usage(trace, prompt, resp)
+
+    # Extract LLM response
+    raw = resp.choices[0].message.content.strip()
+    return parse_rerank_response(raw, candidates, keep_n)
+
+
+async def rerank_with_llm_async(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    model: str,
+    keep_n: int,
+    trace=None,
+) -> List[Dict[str, Any]]:
+    """
+    Async version of rerank_with_llm (same prompt and parsing).
+    """
+    if not candidates:
+        return []
+
+    prompt = build_rerank_prompt(query, candidates)
+    async with stage_limit("llm", trace):
+        resp = await get_async_openai_client().chat.completions.create(
+            model=model,
+            temperature=0.0,
+            messages=[{"role": "user", "content": prompt}],
+        )
+    _record_usage(trace, prompt, resp)
+
+    raw = resp.choices[0].message.content.strip()
+    return parse_rerank_response(raw, candidates, keep_n)
+
+
+def lexical_scores(query: str, candidates: List[Dict[str, Any]], vector_weight: float) -> np.ndarray:
+    """
+    Blend BM25 (max-normalized to 0..1) with vector similarity (1 - cosine distance).
+    """
+    bm25 = bm25_scores(query, [c["text"] for c in candidates])
+    if bm25.max() > 0:
+        bm25 = bm25 / bm25.max()
+    similarity = 1.0 - np.array([c["distance"] for c in candidates], dtype=np.float32)
+    return (1.0 - vector_weight) * bm25 + vector_weight * similarity
+
+
+def rerank_lexical(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    keep_n: int,
+    vector_weight: float = 0.5,
+) -> List[Dict[str, Any]]:
+    """
+    Rerank candidates locally (no API call). Adds "rerank_score" to the returned hits.
+    """
+    if not candidates:
+        return []
+
+    scores = lexical_scores(query, candidates, vector_weight)
+    # Stable sort keeps vector order for ties
+    order = np.argsort(-scores, kind="stable")[:keep_n]
+    return [dict(candidates[i], rerank_score=round(float(scores[i]), 4)) for i in order]
+
+
+def _is_ambiguous(ranked: List[Dict[str, Any]], margin: float) -> bool:
+    # One candidate, or a clear winner -> the local order is good enough
+    if len(ranked) < 2:
+        return False
+    return ranked[0]["rerank_score"] - ranked[1]["rerank_score"] < margin
+
+
+def _plan(candidates: List[Dict[str, Any]], config: RAGConfig, trace) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+    decision, candidates, policy = plan_rerank(candidates, config)
+    if trace is not None:
+        trace.count(f"rerank_{decision}")
+    return decision, candidates, policy
+
+
+def rerank(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    config: RAGConfig = CONFIG,
+    trace=None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Rerank with the strategy selected by config.reranker (after the adaptive policy, if on).
+
+    Returns:
+        (reranked hits, info) where info records which reranker actually ran,
+        and the policy decision under "policy"
+    """
+    if not config.adaptive_rerank:
+        return _rerank(query, candidates, config, trace)
+    decision, candidates, policy = _plan(candidates, config, trace)
+    if decision == "skip":
+        return candidates, {"reranker": "skipped", "policy": policy}
+    reranked, info = _rerank(query, candidates, config, trace)
+    return reranked, dict(info, policy=policy)
+
+
+async def rerank_async(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    config: RAGConfig = CONFIG,
+    trace=None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Async version of rerank.
+    """
+    if not config.adaptive_rerank:
+        return await _rerank_async(query, candidates, config, trace)
+    decision, candidates, policy = _plan(candidates, config, trace)
+    if decision == "skip":
+        return candidates, {"reranker": "skipped", "policy": policy}
+    reranked, info = await _rerank_async(query, candidates, config, trace)
+    return reranked, dict(info, policy=policy)
+
+
+def _rerank(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    config: RAGConfig,
+    trace=None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    keep_n = config.keep_n_after_rerank
+    if config.reranker == "llm":
+        return rerank_with_llm(query, candidates, config.chat_model, keep_n, trace), {"reranker": "llm"}
+
+    local = rerank_lexical(query, candidates, len(candidates), config.lexical_rerank_vector_weight)
+    if config.reranker == "lexical":
+        return local[:keep_n], {"reranker": "lexical"}
+    if config.reranker == "hybrid":
+        if _is_ambiguous(local, config.hybrid_rerank_margin):
+            # Let the LLM see the candidates in local order
+            return rerank_with_llm(query, local, config.chat_model, keep_n, trace), {"reranker": "hybrid", "llm_called": True}
+        return local[:keep_n], {"reranker": "hybrid", "llm_called": False}
+
+    raise ValueError(f"Unknown reranker: {config.reranker!r} (expected 'llm', 'lexical' or 'hybrid')")
+
+
+async def _rerank_async(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    config: RAGConfig,
+    trace=None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    # Local scoring is cheap enough to run inline
+    keep_n = config.keep_n_after_rerank
+    if config.reranker == "llm":
+        return await rerank_with_llm_async(query, candidates, config.chat_model, keep_n, trace), {"reranker": "llm"}
+
+    local = rerank_lexical(query, candidates, len(candidates), config.lexical_rerank_vector_weight)
+    if config.reranker == "lexical":
+        return local[:keep_n], {"reranker": "lexical"}
+    if config.reranker == "hybrid":
+        if _is_ambiguous(local, config.hybrid_rerank_margin):
+            return await rerank_with_llm_async(query, local, config.chat_model, keep_n, trace), {"reranker": "hybrid", "llm_called": True}
+        return local[:keep_n], {"reranker": "hybrid", "llm_called": False}
+
+    raise ValueError(f"Unknown reranker: {config.reranker!r} (expected 'llm', 'lexical' or 'hybrid')")
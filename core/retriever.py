@@ -3,48 +3,262 @@ Retriever module.
 
 - This retrieves candidate chunks from the vector DB.
 - It retrieves more candidates (retrieve_k) because reranking works best when it has options to choose from.
+
+Hybrid retrieval (CONFIG.hybrid_retrieval):
+- The query is also run against the BM25 index built by ingest.py (core/lexical_index.py).
+- Both rankings are merged with reciprocal rank fusion: score = sum over lists of 1 / (rrf_k + rank).
+  RRF only uses ranks, so cosine distances and BM25 scores never need to be put on one scale.
+- Chunks found only lexically get their vector distance computed from their stored
+  embedding, so the confidence gate and rerankers see the same fields as always.
+
+Adaptive retrieve_k (CONFIG.adaptive_rerank):
+- adaptive_search() first asks for adaptive_retrieve_k_min hits and searches again
+  with the full k only if all of them are close to the best (see rerank_policy.py),
+  so clear-cut questions carry fewer candidates into the rerank.
+
+Metadata filters:
+- Every search takes an optional Chroma `where` clause over the chunk metadata
+  (see Chunk.metadata), e.g. metadata_filter(source="02_pricing.md") or
+  metadata_filter(heading="Pricing & Program Structure > Core Programs").
+- The filter is applied by the vector store before the similarity search, so a
+  narrow filter searches fewer vectors and every candidate is from the right place.
+  Lexical hits are held to the same filter.
 """
 
-from typing import Any, Dict, List
-from .embeddings import embed_query
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .chunking import HEADING_SEPARATOR
+from .config import CONFIG
+from .embeddings import embed_query, embed_query_async
+from .lexical_index import get_lexical_index
+from .rerank_policy import needs_more_candidates
 from .store import get_collection
 
-def retrieve_candidates(
-    query: str,
+
+def metadata_filter(
+    source: Union[str, Sequence[str], None] = None,
+    heading: Union[str, Sequence[str], None] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a `where` clause for the common filters (None if there is nothing to filter).
+
+    Args:
+        source: a KB file name, or several
+        heading: a heading path prefix, as "Title > Subtitle" or a sequence of titles,
+            starting at the document's top heading
+    """
+    clauses: List[Dict[str, Any]] = []
+    if source:
+        clauses.append({"source": source} if isinstance(source, str) else {"source": {"$in": list(source)}})
+    if heading:
+        titles = heading.split(HEADING_SEPARATOR.strip()) if isinstance(heading, str) else heading
+        clauses.extend({f"h{depth}": title.strip()} for depth, title in enumerate(titles, start=1))
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _hit(chunk_id: str, doc: str, meta: Optional[Dict[str, Any]], distance: float) -> Dict[str, Any]:
+    meta = meta or {}
+    return {
+        "id": chunk_id,
+        "text": doc,
+        "source": meta.get("source", "unknown"),
+        "heading_path": meta.get("heading_path", ""),
+        "distance": distance,
+    }
+
+
+def query_collection_batch(
+    qvecs: List[List[float]],
     db_dir: str,
     collection_name: str,
-    embedding_model: str,
     k: int,
-) -> List[Dict[str, Any]]:
-    """Retrieve top-k candidate chunks from the vector DB.
+    where: Optional[Dict[str, Any]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """Run the vector similarity search for several already-embedded queries at once.
+
+    Chroma's .query() takes a list of query vectors and searches them in one call,
+    so a batch pays the collection lookup and per-call overhead only once.
+    `where` (a metadata filter) applies to every query.
 
     Returns:
-        List[Dict[str, Any]]: A list of dicts with keys: text, source, distance
+        List[List[Dict[str, Any]]]: one hit list per query vector, in input order;
+        each hit is a dict with keys: id, text, source, heading_path, distance
     """
+    if not qvecs:
+        return []
+
     col = get_collection(db_dir, collection_name)
-    qvec = embed_query(query, model=embedding_model)
 
     # Query the Vector Database to provide vector similarity search functionality
     # .query() is a method of the ChromaDB collection class.
-    # 
     res = col.query(
-        query_embeddings=qvec, # Vector to search for - wrapped in a list because ChromaDB supports batch queries. We search for one query at a time.
+        query_embeddings=qvecs,
         n_results=k,
+        where=where or None,
         include=["documents", "metadatas", "distances"],
     )
 
-    hits = []
-    
-    for doc, meta, dist in zip(
-        res["documents"][0], res["metadatas"][0], res["distances"][0]
-    ):
-        hits.append(
-            {
-                "text": doc,
-                "source": meta.get("source", "unknown"),
-                "distance": dist
-            }
-        )
+    results = []
+    for ids, docs, metas, dists in zip(res["ids"], res["documents"], res["metadatas"], res["distances"]):
+        results.append([_hit(chunk_id, doc, meta, dist) for chunk_id, doc, meta, dist in zip(ids, docs, metas, dists)])
+    return results
+
+
+def query_collection(
+    qvec: List[List[float]],
+    db_dir: str,
+    collection_name: str,
+    k: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Run the vector similarity search for an already-embedded query.
+
+    qvec is a single-item list of vectors, as returned by embed_query.
+
+    Returns:
+        List[Dict[str, Any]]: A list of dicts with keys: id, text, source, heading_path, distance
+    """
+    return query_collection_batch(qvec[:1], db_dir, collection_name, k, where)[0]
+
+
+def fuse_lexical(
+    query: str,
+    qvec: List[List[float]],
+    hits: List[Dict[str, Any]],
+    db_dir: str,
+    collection_name: str,
+    k: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Merge vector hits with BM25 index hits by reciprocal rank fusion.
+
+    Returns the top k fused hits (same keys as query_collection's, plus rrf_score).
+    Without a lexical index the vector hits are returned unchanged.
+    """
+    index = get_lexical_index(db_dir, collection_name)
+    if index is None:
+        return hits
+    lexical = index.search(query, CONFIG.lexical_retrieve_k)
+
+    fused = {h["id"]: h for h in hits}
+    missing = [chunk_id for chunk_id, _ in lexical if chunk_id not in fused]
+    if missing:
+        # The BM25 index isn't filtered: fetching with `where` drops hits outside the filter
+        col = get_collection(db_dir, collection_name)
+        res = col.get(ids=missing, where=where or None, include=["documents", "metadatas", "embeddings"])
+        q = np.asarray(qvec[0], dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        for chunk_id, doc, meta, emb in zip(res["ids"], res["documents"], res["metadatas"], res["embeddings"]):
+            v = np.asarray(emb, dtype=np.float32)
+            # Same cosine distance Chroma reports for the collection ("hnsw:space": "cosine")
+            distance = 1.0 - float(v @ q) / (float(np.linalg.norm(v)) or 1.0)
+            fused[chunk_id] = _hit(chunk_id, doc, meta, distance)
+    # Filtered out, or gone since the index was built (concurrent ingest)
+    lexical = [(chunk_id, score) for chunk_id, score in lexical if chunk_id in fused]
+
+    rrf: Dict[str, float] = {}
+    for rank, h in enumerate(hits, start=1):
+        rrf[h["id"]] = rrf.get(h["id"], 0.0) + 1.0 / (CONFIG.rrf_k + rank)
+    for rank, (chunk_id, _) in enumerate(lexical, start=1):
+        rrf[chunk_id] = rrf.get(chunk_id, 0.0) + 1.0 / (CONFIG.rrf_k + rank)
+    top = sorted(rrf, key=rrf.get, reverse=True)[:k]
+    return [dict(fused[i], rrf_score=round(rrf[i], 5)) for i in top]
+
+
+def search(
+    query: str,
+    qvec: List[List[float]],
+    db_dir: str,
+    collection_name: str,
+    k: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Candidate search for an already-embedded query: vector, or hybrid if enabled."""
+    hits = query_collection(qvec, db_dir, collection_name, k, where)
+    if CONFIG.hybrid_retrieval:
+        hits = fuse_lexical(query, qvec, hits, db_dir, collection_name, k, where)
     return hits
 
 
+def _first_k(k: int) -> int:
+    """Size of the first, small search, or 0 if retrieve_k isn't adaptive."""
+    first_k = CONFIG.adaptive_retrieve_k_min
+    return first_k if CONFIG.adaptive_rerank and 0 < first_k < k else 0
+
+
+def adaptive_search(
+    query: str,
+    qvec: List[List[float]],
+    db_dir: str,
+    collection_name: str,
+    k: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    search() with a per-question retrieve_k (see module docstring).
+
+    Returns:
+        (hits, info for debug["retrieval"]: the k used and whether the search was widened)
+    """
+    first_k = _first_k(k)
+    if not first_k:
+        return search(query, qvec, db_dir, collection_name, k, where), {"retrieve_k": k}
+    hits = search(query, qvec, db_dir, collection_name, first_k, where)
+    if not needs_more_candidates(hits, first_k, CONFIG):
+        return hits, {"retrieve_k": first_k, "widened": False}
+    return search(query, qvec, db_dir, collection_name, k, where), {"retrieve_k": k, "widened": True}
+
+
+def adaptive_cut(hits: List[Dict[str, Any]], k: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    The adaptive_search decision for hits already retrieved with k (batch mode, which
+    searches all questions in one call): keep the first adaptive_retrieve_k_min hits
+    unless they are all close to the best.
+    """
+    first_k = _first_k(k)
+    if not first_k:
+        return hits, {"retrieve_k": k}
+    if needs_more_candidates(hits[:first_k], first_k, CONFIG):
+        return hits, {"retrieve_k": k, "widened": True}
+    return hits[:first_k], {"retrieve_k": first_k, "widened": False}
+
+
+def retrieve_candidates(
+    query: str,
+    db_dir: str,
+    collection_name: str,
+    embedding_model: str,
+    k: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Retrieve top-k candidate chunks from the vector DB (fused with BM25 if hybrid retrieval is on).
+
+    `where` restricts the search to chunks whose metadata matches (see metadata_filter).
+
+    Returns:
+        List[Dict[str, Any]]: A list of dicts with keys: id, text, source, heading_path, distance
+    """
+    qvec = embed_query(query, model=embedding_model)
+    return search(query, qvec, db_dir, collection_name, k, where)
+
+
+async def retrieve_candidates_async(
+    query: str,
+    db_dir: str,
+    collection_name: str,
+    embedding_model: str,
+    k: int,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Async version of retrieve_candidates.
+
+    Chroma's client is synchronous, so the search runs in a worker thread
+    to keep the event loop free for other chats.
+    """
+    qvec = await embed_query_async(query, model=embedding_model)
+    return await asyncio.to_thread(search, query, qvec, db_dir, collection_name, k, where)
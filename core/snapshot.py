@@ -0,0 +1,141 @@
+"""
+Index snapshots.
+
+A fresh container would otherwise rebuild vectordb/ by re-embedding all of kb/, which
+is slow and costs API calls on every deploy. A snapshot is a self-contained copy of
+the index that ships with the app instead:
+
+- the numpy_store layout (vectors.npy in the configured numpy_store_dtype, so an
+  int8 snapshot is a quarter of the float32 size; ids/documents/metadatas JSON)
+- snapshot.json, written last: format, creation time, chunk count, dimension,
+  the settings the vectors depend on (embedding model, chunking config),
+  the ingest manifest of the source files, and a SHA-256 per file
+
+verify_snapshot() checks all of it before anything is loaded: a truncated or edited
+file, or vectors made with another model / chunk config, are rejected rather than
+silently served. ingest.py exports and restores snapshots.
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .numpy_store import NumpyCollection, export_numpy_store
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = "snapshot.json"
+
+
+class SnapshotError(Exception):
+    """The snapshot is missing files, corrupt, or in an unknown format."""
+
+
+class SnapshotMismatch(SnapshotError):
+    """The snapshot is intact but was built with different settings."""
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def export_snapshot(
+    records: Iterable[Tuple[str, str, Dict[str, Any], Sequence[float]]],
+    path: str,
+    settings: Dict[str, Any],
+    files: Dict[str, Any],
+    dtype: str = "float32",
+) -> Dict[str, Any]:
+    """
+    Write (id, document, metadata, embedding) records as a snapshot at path (replacing it).
+
+    Args:
+        settings: ingest settings the vectors were built with
+        files: the ingest manifest's per-file entries (hash + chunk ids)
+        dtype: vector storage, see numpy_store
+
+    Returns:
+        the snapshot manifest
+    """
+    # A plain directory: snapshots are built offline and committed with the app
+    meta = export_numpy_store(records, path, dtype, versioned=False)
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "id": str(uuid.uuid4()),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "count": meta["count"],
+        "dim": meta["dim"],
+        "dtype": meta["dtype"],
+        "settings": settings,
+        "files": files,
+        "checksums": {
+            name: _sha256(os.path.join(path, name))
+            for name in sorted(os.listdir(path))
+            if name != MANIFEST_NAME
+        },
+    }
+    tmp = os.path.join(path, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(path, MANIFEST_NAME))
+    return manifest
+
+
+def read_snapshot_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """
+    The snapshot's manifest, or None if there is no (complete) snapshot at path.
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Unreadable snapshot manifest in {path}: {e}")
+
+
+def verify_snapshot(path: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check format, settings and every checksum. Returns the manifest.
+
+    Raises:
+        SnapshotMismatch: built with other settings than `settings`
+        SnapshotError: missing, corrupt or unsupported
+    """
+    manifest = read_snapshot_manifest(path)
+    if manifest is None:
+        raise SnapshotError(f"No snapshot in {path}")
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')} in {path}")
+
+    if manifest.get("settings") != settings:
+        changed = sorted(
+            k for k in set(settings) | set(manifest.get("settings", {}))
+            if settings.get(k) != manifest.get("settings", {}).get(k)
+        )
+        raise SnapshotMismatch(f"Snapshot in {path} was built with different settings: {', '.join(changed)}")
+
+    for name, expected in manifest.get("checksums", {}).items():
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            raise SnapshotError(f"Snapshot file missing: {file_path}")
+        if _sha256(file_path) != expected:
+            raise SnapshotError(f"Checksum mismatch for {file_path}")
+    return manifest
+
+
+def iter_snapshot_batches(path: str, batch_size: int) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Yield the snapshot's records in batches: {"ids", "documents", "metadatas", "embeddings"}.
+    """
+    col = NumpyCollection(path)
+    for offset in range(0, col.count(), batch_size):
+        page = col.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        page["embeddings"] = [v.tolist() for v in page["embeddings"]]
+        yield page
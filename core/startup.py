@@ -0,0 +1,75 @@
+"""
+Startup tracking.
+
+On a cold container the app has to import its dependencies, possibly build the index
+(ingest.py) and open clients before it can answer. Instead of doing all of that
+before the UI exists, app.py brings the UI up first and warms up in a background
+thread. Startup records:
+
+- state: "warming" until the warm-up finished, then "ready" (or "failed" + error)
+- phases: ms since process start at which each phase finished
+  (e.g. imports, index, pipeline, ready, first_answer)
+
+Phases are printed and exported as the rag_startup_ms gauge (see metrics.py).
+Import this module first, so "process start" is as close to the real one as possible.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .metrics import REGISTRY
+
+# Close enough to interpreter start when imported first by the entry point
+PROCESS_START = time.perf_counter()
+
+
+class Startup:
+    def __init__(self, started: float = PROCESS_START):
+        self.started = started
+        self.phases: Dict[str, float] = {}
+        self.state = "warming"
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+
+    def mark(self, phase: str) -> float:
+        ms = (time.perf_counter() - self.started) * 1000
+        self.phases[phase] = round(ms, 1)
+        REGISTRY.set_startup(phase, ms)
+        print(f"[startup] {phase}: {ms / 1000:.2f}s after process start", flush=True)
+        return ms
+
+    def mark_once(self, phase: str) -> None:
+        if phase not in self.phases:
+            self.mark(phase)
+
+    def warm_up_in_background(self, warm_up: Callable[[], None]) -> threading.Thread:
+        """
+        Run warm_up in a daemon thread; state becomes "ready" or "failed" when it returns.
+        """
+        def run() -> None:
+            try:
+                warm_up()
+                self.state = "ready"
+                self.mark("ready")
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+                print(f"[startup] warm-up failed: {self.error}", flush=True)
+            finally:
+                self._done.set()
+
+        thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the warm-up finished (successfully or not)."""
+        return self._done.wait(timeout)
+
+
+STARTUP = Startup()
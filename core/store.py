@@ -2,17 +2,309 @@
 Vector store module (Chroma).
 
 PersistentClient is used so that the DB. persists locally under vectordb/.
+
+Client pooling:
+- Building a PersistentClient opens SQLite and loads the HNSW index from disk.
+- Doing that on every question adds disk I/O to the hot path.
+- So we keep ONE client per db_dir and cache collection handles for the lifetime of the process.
+
+Swap detection:
+- Ingestion (possibly in another process) can delete and re-create the collection.
+- A cached handle would then point at a collection that no longer exists.
+- Before reusing a handle we stat the Chroma SQLite file (cheap). If it changed since
+  the handle was opened, we re-resolve the collection and compare ids.
+
+Backends:
+- Ingestion always writes to Chroma (get_or_create_collection).
+- Reads (get_collection) go to CONFIG.vector_backend: Chroma, or the memory-mapped
+  NumPy copy ingest.py exports (see numpy_store.py). Both answer the same
+  query/get/count calls, so the retriever doesn't care which one it gets.
+
+Generations (blue/green KB reload, see ingest.reload_index):
+- A reload ingests kb/ into a new physical collection ("<name>-g<n>") while the current
+  one keeps serving, then flips a small state file, generations-<name>.json in db_dir.
+- Readers ask serving_collection() once per request. It stats that file (cheap) and
+  re-reads it only when it changed, so every process switches to the new generation
+  on its next request. Handles of the previous generation are released then.
+- Without a state file the collection itself is served (generation 0).
+- Writers (reloads, in any process) hold generations_lock() while they change it.
 """
 
-import chromadb
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .config import CONFIG
+from .lexical_index import unload_lexical_index
+from .numpy_store import get_numpy_collection, meta_fingerprint, unload_numpy_collection
+
+# Chroma keeps its catalog (collections, ids, metadata) in this file under db_dir.
+SQLITE_FILENAME = "chroma.sqlite3"
+
+_lock = threading.RLock()
+
+# db_dir -> PersistentClient
+_clients: Dict[str, Any] = {}
+
+# (db_dir, collection_name) -> (collection handle, fingerprint of db_dir when it was opened)
+_collections: Dict[Tuple[str, str], Tuple[Any, Optional[Tuple[int, int]]]] = {}
+
+# (db_dir, collection_name) -> (generation state, fingerprint of its state file)
+_generations: Dict[Tuple[str, str], Tuple[Dict[str, Any], Optional[Tuple[int, int]]]] = {}
+
+_stats = {
+    "client_opens": 0,
+    "client_reuses": 0,
+    "collection_opens": 0,
+    "collection_reuses": 0,
+    "collection_revalidations": 0,
+    "collection_swaps": 0,
+    "generation_switches": 0,
+}
+
+
+def _db_key(db_dir: str) -> str:
+    # "vectordb" and "./vectordb/" must share one client
+    return os.path.abspath(db_dir)
+
+
+def _file_fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _fingerprint(db_dir: str) -> Optional[Tuple[int, int]]:
+    """
+    Cheap change detector for a Chroma directory: (mtime_ns, size) of its SQLite file.
+    Returns None when the DB does not exist (yet).
+    """
+    return _file_fingerprint(os.path.join(db_dir, SQLITE_FILENAME))
+
+
+def get_client(db_dir: str):
+    """
+    Return the process-wide PersistentClient for db_dir, creating it on first use.
+    """
+    key = _db_key(db_dir)
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _stats["client_reuses"] += 1
+            return client
+
+        # Imported here: chromadb takes ~0.5 s to import and the numpy backend never needs it
+        import chromadb
+
+        client = chromadb.PersistentClient(path=db_dir)
+        _clients[key] = client
+        _stats["client_opens"] += 1
+        return client
+
+
+def _open_collection(db_dir: str, collection_name: str, create: bool):
+    client = get_client(db_dir)
+    if create:
+        return client.get_or_create_collection(
+            name=collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+    return client.get_collection(name=collection_name)
+
+
+def _cached_collection(db_dir: str, collection_name: str, create: bool):
+    key = (_db_key(db_dir), collection_name)
+    fp = _fingerprint(db_dir)
+
+    with _lock:
+        cached = _collections.get(key)
+        if cached is not None:
+            col, opened_fp = cached
+            if opened_fp == fp:
+                # Warm path: nothing on disk changed since we opened the handle.
+                _stats["collection_reuses"] += 1
+                return col
+
+            # Something was written. Usually it is just new rows in the same collection,
+            # but it may be a delete + re-create by ingestion. Re-resolve to find out.
+            _stats["collection_revalidations"] += 1
+            try:
+                fresh = _open_collection(db_dir, collection_name, create)
+            except Exception:
+                # Collection is gone; drop the stale handle and let the caller see the error.
+                _collections.pop(key, None)
+                raise
+            if fresh.id != col.id:
+                _stats["collection_swaps"] += 1
+            _collections[key] = (fresh, fp)
+            return fresh
+
+        col = _open_collection(db_dir, collection_name, create)
+        _collections[key] = (col, fp)
+        _stats["collection_opens"] += 1
+        return col
+
 
 def get_or_create_collection(db_dir: str, collection_name: str):
-    chroma = chromadb.PersistentClient(path=db_dir)
-    return chroma.get_or_create_collection(
-        name=collection_name,
-        metadata={"hnsw:space": "cosine"} 
-    )
+    return _cached_collection(db_dir, collection_name, create=True)
+
 
 def get_collection(db_dir: str, collection_name: str):
-    chroma = chromadb.PersistentClient(path=db_dir)
-    return chroma.get_collection(name=collection_name)
+    """
+    Collection handle for reads, from the configured vector backend.
+    """
+    if CONFIG.vector_backend == "numpy":
+        return get_numpy_collection(db_dir, collection_name)
+    return get_chroma_collection(db_dir, collection_name)
+
+
+def get_chroma_collection(db_dir: str, collection_name: str):
+    return _cached_collection(db_dir, collection_name, create=False)
+
+
+def collection_version(db_dir: str, collection_name: str) -> Tuple[str, Optional[Tuple[int, int]]]:
+    """
+    Identifies the current contents of a collection: (collection id, on-disk fingerprint).
+
+    Changes whenever ingestion writes to or re-creates the collection, so caches
+    derived from the KB can use it to know when to drop their entries.
+    """
+    col = get_collection(db_dir, collection_name)
+    if CONFIG.vector_backend == "numpy":
+        return (str(col.id), meta_fingerprint(db_dir, collection_name))
+    return (str(col.id), _fingerprint(db_dir))
+
+
+def generations_path(db_dir: str, collection_name: str) -> str:
+    return os.path.join(db_dir, f"generations-{collection_name}.json")
+
+
+def generation_name(collection_name: str, generation: int) -> str:
+    """Physical collection of a generation; generation 0 is the collection itself."""
+    return collection_name if generation == 0 else f"{collection_name}-g{generation}"
+
+
+def read_generations(db_dir: str, collection_name: str) -> Dict[str, Any]:
+    """
+    Serving state of a collection:
+        {"active": physical collection, "generation": n, "building": n or None,
+         "retired": [{"name", "drop_after"}, ...], "last_reload": {...}}
+
+    One stat per call; the file is parsed again only after it changed. When another
+    process switched generations, the handles of the old one are released here.
+    """
+    key = (_db_key(db_dir), collection_name)
+    fp = _file_fingerprint(generations_path(db_dir, collection_name))
+    with _lock:
+        cached = _generations.get(key)
+        if cached is not None and cached[1] == fp:
+            return cached[0]
+
+    state: Dict[str, Any] = {"active": collection_name, "generation": 0, "building": None}
+    if fp is not None:
+        try:
+            with open(generations_path(db_dir, collection_name), encoding="utf-8") as f:
+                state.update(json.load(f))
+        except (OSError, ValueError):
+            # Written with write-then-rename, so this is a deleted file, not a torn one
+            fp = None
+    with _lock:
+        previous = _generations.get(key)
+        _generations[key] = (state, fp)
+        switched = previous is not None and previous[0]["active"] != state["active"]
+        if switched:
+            _stats["generation_switches"] += 1
+    if switched:
+        release_collection(db_dir, previous[0]["active"])
+    return state
+
+
+@contextmanager
+def generations_lock(db_dir: str, collection_name: str) -> Iterator[None]:
+    """
+    Exclusive lock for changing a collection's generations, across processes and threads.
+
+    An flock() on generations-<name>.lock: the kernel releases it when the holder
+    dies, so a "building" generation found while holding the lock was abandoned.
+    """
+    os.makedirs(db_dir, exist_ok=True)
+    with open(generations_path(db_dir, collection_name)[:-len(".json")] + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_generations(db_dir: str, collection_name: str, state: Dict[str, Any]) -> None:
+    """
+    Replace the serving state atomically (write-then-rename): readers see either the
+    old or the new file, never a half-written one. Hold generations_lock().
+    """
+    path = generations_path(db_dir, collection_name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def active_collection(db_dir: str, collection_name: str) -> str:
+    """Physical collection currently serving collection_name."""
+    return read_generations(db_dir, collection_name)["active"]
+
+
+def serving_collection() -> str:
+    """
+    The collection to answer from. Resolve it once per request, so one answer
+    never mixes chunks of two generations.
+    """
+    return active_collection(CONFIG.db_dir, CONFIG.collection_name)
+
+
+def release_collection(db_dir: str, collection_name: str) -> None:
+    """
+    Drop every in-process handle on a collection: Chroma handle, NumPy store, BM25 index.
+    """
+    invalidate_collection(db_dir, collection_name)
+    unload_numpy_collection(db_dir, collection_name)
+    unload_lexical_index(db_dir, collection_name)
+
+
+def invalidate_collection(db_dir: str, collection_name: Optional[str] = None) -> None:
+    """
+    Forget cached collection handles for db_dir (or a single collection).
+
+    Call this after deleting/re-creating a collection in this process, so the next
+    lookup re-resolves it instead of waiting for the on-disk fingerprint to change.
+    """
+    db_key = _db_key(db_dir)
+    with _lock:
+        for key in list(_collections):
+            if key[0] == db_key and (collection_name is None or key[1] == collection_name):
+                del _collections[key]
+
+
+def reset_store() -> None:
+    """
+    Drop every pooled client and collection handle (e.g. after vectordb/ was removed).
+    """
+    with _lock:
+        _collections.clear()
+        _clients.clear()
+        _generations.clear()
+
+
+def store_stats() -> Dict[str, int]:
+    """
+    Open/reuse counters for the client and collection caches.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["clients_cached"] = len(_clients)
+        stats["collections_cached"] = len(_collections)
+        return stats
@@ -0,0 +1,96 @@
+"""
+Atomically replaced index directories.
+
+The BM25 index and the NumPy store are directories of files that readers load
+together. Replacing one with rmtree + rename leaves a moment with no directory
+at all, and a reader that is halfway through loading would find its files gone.
+
+Instead, each build writes a new version next to the live path and the live path
+is a symlink to it:
+
+    vectordb/bm25-kb          -> bm25-kb.v3f2a...   (what readers open)
+    vectordb/bm25-kb.v3f2a... (current version)
+    vectordb/bm25-kb.v91c0... (previous version, kept for readers still loading it)
+
+publish_dir() points a fresh symlink at the new version and os.replace()s it over
+the live path, which is atomic: a reader sees the old version or the new one.
+Readers call resolve_dir() once and load every file from the version it returns.
+Once loaded, a version can be deleted (its files are open or memory-mapped), so a
+replaced version only has to outlive loads that started before it was replaced:
+publish_dir() deletes versions replaced more than RETIRED_VERSION_GRACE_S ago.
+"""
+
+import glob
+import os
+import shutil
+import time
+import uuid
+
+# How long a replaced version stays on disk for readers that were still loading it
+RETIRED_VERSION_GRACE_S = 60.0
+
+
+def new_version_dir(path: str) -> str:
+    """
+    Create an empty, not yet published version directory for path.
+    """
+    version = f"{path}.v{uuid.uuid4().hex[:12]}"
+    os.makedirs(version)
+    return version
+
+
+def resolve_dir(path: str) -> str:
+    """
+    The version directory path points to right now (path itself if it isn't a link).
+    """
+    return os.path.realpath(path)
+
+
+def publish_dir(version: str, path: str) -> None:
+    """
+    Make version the live contents of path, atomically, and delete stale versions.
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Layout from before versioning: move the plain directory aside once
+        # (readers see no index for the moment between the two renames)
+        os.replace(path, f"{path}.v{uuid.uuid4().hex[:12]}")
+
+    link = f"{version}.link"
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, path)
+    _drop_retired_versions(path, os.path.realpath(version))
+
+
+def _drop_retired_versions(path: str, live: str) -> None:
+    # A version was replaced when the next one was written, so order by mtime:
+    # each version's replacement time is its successor's mtime
+    versions = []
+    for candidate in glob.glob(glob.escape(path) + ".v*"):
+        if os.path.islink(candidate):
+            # A link left behind by a publish that crashed before its replace
+            os.remove(candidate)
+            continue
+        try:
+            versions.append((os.stat(candidate).st_mtime_ns, candidate))
+        except OSError:
+            continue  # removed by a concurrent publish
+    versions.sort()
+    cutoff = time.time_ns() - int(RETIRED_VERSION_GRACE_S * 1e9)
+    for (_, version), (replaced_at, _) in zip(versions, versions[1:]):
+        if replaced_at <= cutoff and os.path.realpath(version) != live:
+            shutil.rmtree(version, ignore_errors=True)
+
+
+def remove_dir(path: str) -> None:
+    """
+    Delete path and every version of it.
+    """
+    if os.path.islink(path):
+        os.remove(path)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+    for version in glob.glob(glob.escape(path) + ".v*"):
+        if os.path.islink(version):
+            os.remove(version)
+        else:
+            shutil.rmtree(version, ignore_errors=True)
@@ -5,24 +5,134 @@ Run this to build/update your vector DB from kb/*.md.
 
 Flow:
 1) Read markdown files from kb/
-2) Chunk using markdown-aware chunker
+2) Chunk using markdown-aware, token-bounded chunker (changed files only, in a
+   process pool when there is a lot to chunk)
 3) Embed chunks
 4) Store in Chroma
 
 Re-run whenever KB changes.
+
+Incremental by default:
+- A manifest (vectordb/ingest_manifest-<collection>.json) remembers the hash of every file and the ids of its chunks.
+- Chunk ids are derived from the chunk content, so an unchanged chunk keeps its id across runs.
+- Unchanged files are skipped, only new chunks are embedded, and chunks whose text
+  (or whole file) disappeared are deleted.
+- Changing the embedding model or chunk settings forces a full rebuild. So does a
+  change of tokenizer: tiktoken, or the offline estimate when it can't be loaded.
+
+Use --full to wipe the collection and rebuild from scratch.
+
+Chunk metadata (see Chunk.metadata):
+- source, doc_version (hash of the file), heading_path plus one field per heading
+  depth (h1, h2, ...), section level, char_start/char_end offsets and token count.
+- Retrieval can filter on any of it (retriever.metadata_filter); the filter is
+  applied by the vector store before the similarity search.
+
+Streaming:
+- Files are read one at a time and their chunks flow into a fixed-size buffer.
+- Each full buffer is embedded and upserted, then dropped, so peak memory is
+  bounded by CONFIG.ingest_batch_size (plus the largest single file), not the corpus.
+- After every batch the manifest is saved as a checkpoint. Files that were only
+  partly written are recorded too, so an interrupted run resumes where it stopped.
+
+Lexical index:
+- After the collection is up to date, the BM25 inverted index used by hybrid retrieval
+  (core/lexical_index.py) is rebuilt from the stored chunks, if anything changed.
+
+NumPy vector store:
+- With CONFIG.vector_backend = "numpy" the collection is then exported to the
+  memory-mapped store in core/numpy_store.py, which the app queries instead of Chroma.
+- --verify-numpy compares that store's search results with Chroma's.
+
+Snapshots (core/snapshot.py):
+- --export-snapshot DIR writes a checksummed copy of the index plus the settings it
+  was built with; ship it with the app so deploys don't re-embed kb/.
+- prepare_index() (used by app.py at startup) restores the snapshot instead of
+  ingesting, and rebuilds from kb/ (or refuses, see CONFIG.snapshot_on_mismatch)
+  when the snapshot's embedding model or chunk settings no longer match.
+
+Hot reload (blue/green, see core/store.py "Generations"):
+- Plain `python ingest.py` updates the serving collection in place: fine offline,
+  but a running app sees it half-updated meanwhile.
+- --swap (reload_index) ingests kb/ into a new generation of the collection, with its
+  own manifest, BM25 index and NumPy store, while the current one keeps serving.
+  The new generation is validated (every chunk of its manifest stored, indexes
+  present, a stored vector finds itself), then the serving state is switched
+  atomically and the old generation dropped CONFIG.kb_reload_drain_s later.
+- --watch (watch_kb) polls kb/ and does the same whenever it changed. app.py runs it
+  in a thread (CONFIG.kb_watch); run it next to serve.py, whose workers pick up
+  each new generation on their next request.
+- The reload time is printed, kept in generations-<collection>.json ("last_reload")
+  and observed as the "kb_reload" stage; requests answered while a reload builds
+  are also observed as "total_during_kb_reload".
 """
 
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
 from core.config import CONFIG
-from core.chunking import chunk_markdown
-from core.embeddings import embed_texts
-from core.store import get_or_create_collection
+from core.chunking import CHUNKER_VERSION, Chunk, chunk_files, chunk_text, default_workers
+from core.embeddings import embed_texts, embedding_cache_stats, embedding_throughput_stats, tokenizer_name
+from core.lexical_index import build_lexical_index, get_lexical_index, index_dir
+from core.metrics import REGISTRY
+from core.numpy_store import export_numpy_store, get_numpy_collection, store_dir, verify_against_chroma
+from core.snapshot import SnapshotError, export_snapshot, iter_snapshot_batches, read_snapshot_manifest, verify_snapshot
+from core.store import (
+    SQLITE_FILENAME,
+    active_collection,
+    generation_name,
+    generations_lock,
+    get_chroma_collection,
+    get_client,
+    get_or_create_collection,
+    invalidate_collection,
+    read_generations,
+    release_collection,
+    write_generations,
+)
+from core.versioned_dir import remove_dir
 
 load_dotenv()
 
 KB_DIR = Path("kb")
+MANIFEST_VERSION = 2
+# Bump when the metadata stored per chunk changes (forces a rebuild)
+CHUNK_METADATA_VERSION = 1
+# Below this much changed text, forking chunking workers costs more than it saves
+PARALLEL_CHUNKING_MIN_CHARS = 1_000_000
+# A stored vector searched for must come back this close (int8 stores round a little)
+SELF_MATCH_MAX_DISTANCE = 0.01
+# chromadb versions whose catalog layout segment_dirs() was checked against (keep in
+# step with requirements.txt): a "segments" table with these columns, one row per
+# segment, and a VECTOR segment's index in a directory named like its id
+SEGMENT_CATALOG_CHROMADB_VERSIONS = ("1.4.1",)
+SEGMENT_CATALOG_COLUMNS = ("id", "type", "scope", "collection")
+
+
+class ReloadError(Exception):
+    """A new KB generation failed validation; the current one keeps serving."""
+
+
+def kb_paths(kb_dir: Path = KB_DIR) -> List[Path]:
+    return sorted(Path(kb_dir).glob("*.md"))
+
+
+def iter_kb_files(kb_dir: Path = KB_DIR) -> Iterator[Tuple[str, str]]:
+    """
+    Lazily yield (filename, text), reading one file at a time.
+    """
+    for fp in kb_paths(kb_dir):
+        yield fp.name, fp.read_text(encoding="utf-8")
 
 
 def read_kb_files():
@@ -30,43 +140,792 @@ def read_kb_files():
     Read all markdown files in kb/ folder.
     Returns list of (filename, text).
     """
-    docs = []
-    for fp in sorted(KB_DIR.glob("*.md")):
-        docs.append((fp.name, fp.read_text(encoding="utf-8")))
-    return docs
+    return list(iter_kb_files())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(fname: str, chunks: List[str]) -> List[str]:
+    """
+    Stable, content-derived chunk ids: "<file>-<sha256(chunk)[:16]>".
+
+    The same text appearing twice in one file gets a "-2", "-3", ... suffix
+    so ids stay unique without depending on chunk position.
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for c in chunks:
+        base = f"{fname}-{content_hash(c)[:16]}"
+        seen[base] = seen.get(base, 0) + 1
+        ids.append(base if seen[base] == 1 else f"{base}-{seen[base]}")
+    return ids
+
+
+def ingest_settings() -> Dict[str, Any]:
+    """
+    Everything that changes chunk text or vectors. If any of it changes,
+    stored chunks are no longer comparable and we rebuild from scratch.
+    """
+    return {
+        "embedding_model": CONFIG.embedding_model,
+        "embedding_dimensions": CONFIG.embedding_dimensions,
+        "vector_dtype": CONFIG.numpy_store_dtype,
+        "max_chunk_tokens": CONFIG.max_chunk_tokens,
+        "chunk_overlap_tokens": CONFIG.chunk_overlap_tokens,
+        "chunker": CHUNKER_VERSION,
+        # Without tiktoken (offline) chunks are cut at estimated token offsets instead
+        "tokenizer": tokenizer_name(CONFIG.embedding_model),
+        "chunk_metadata": CHUNK_METADATA_VERSION,
+    }
+
+
+def manifest_path(db_dir: str, collection_name: str) -> str:
+    return os.path.join(db_dir, f"ingest_manifest-{collection_name}.json")
+
+
+def load_manifest(db_dir: str, collection_name: str) -> Dict[str, Any]:
+    try:
+        with open(manifest_path(db_dir, collection_name), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def save_manifest(db_dir: str, collection_name: str, manifest: Dict[str, Any]) -> None:
+    # Write-then-rename so a crash never leaves a half-written manifest
+    path = manifest_path(db_dir, collection_name)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def reset_collection(db_dir: str, collection_name: str):
+    """
+    Drop and re-create the collection (full rebuild).
+    """
+    client = get_client(db_dir)
+    try:
+        client.delete_collection(name=collection_name)
+    except Exception:
+        pass  # nothing to delete on first run
+    invalidate_collection(db_dir, collection_name)
+    return get_or_create_collection(db_dir, collection_name)
+
+
+def plan_file(
+    fname: str,
+    text: str,
+    old_ids: List[str],
+    records: Optional[List[Chunk]] = None,
+) -> Tuple[List[str], List[str], List[str], List[str], Dict[str, Dict[str, Any]]]:
+    """
+    Chunk one file (unless its chunk records are given) and diff it against the ids
+    stored for it last time.
+
+    Returns:
+        (all_ids, new_ids, new_chunks, stale_ids, metadata per id)
+    """
+    if records is None:
+        records = chunk_text(text, CONFIG.max_chunk_tokens, CONFIG.chunk_overlap_tokens, CONFIG.embedding_model)
+    chunks = [c.text(text) for c in records]
+    ids = chunk_ids(fname, chunks)
+    doc_version = content_hash(text)[:16]
+    metadatas = {i: c.metadata(fname, doc_version) for i, c in zip(ids, records)}
+    old = set(old_ids)
+    current = set(ids)
+
+    new_ids = [i for i in ids if i not in old]
+    new_chunks = [c for i, c in zip(ids, chunks) if i not in old]
+    stale_ids = [i for i in old_ids if i not in current]
+    return ids, new_ids, new_chunks, stale_ids, metadatas
+
+
+class _BatchWriter:
+    """
+    Buffers (id, text, metadata) records and writes them to Chroma in fixed-size batches.
+
+    It also owns the manifest checkpoint: a file moves from "partial" to "files"
+    once every one of its new chunks has been written.
+    """
+
+    def __init__(self, col, db_dir: str, collection_name: str, settings: Dict[str, Any],
+                 files: Dict[str, Any], partial: Dict[str, List[str]], batch_size: int, total_files: int):
+        self.col = col
+        self.db_dir = db_dir
+        self.collection_name = collection_name
+        self.settings = settings
+        self.files = files
+        self.partial = partial
+        self.batch_size = batch_size
+        self.total_files = total_files
+
+        self.pending: List[Tuple[str, str, str, Dict[str, Any]]] = []  # (fname, id, text, metadata)
+        self.outstanding: Dict[str, int] = {}  # fname -> chunks not yet written
+        self.finished: Dict[str, Dict[str, Any]] = {}  # fname -> manifest entry once written
+        self.files_done = 0
+        self.chunks_written = 0
+        self.started = time.perf_counter()
+
+    def add_file(self, fname: str, entry: Dict[str, Any], new_ids: List[str], new_chunks: List[str],
+                 metadatas: Dict[str, Dict[str, Any]]) -> None:
+        self.finished[fname] = entry
+        self.outstanding[fname] = len(new_ids)
+        self.partial.setdefault(fname, [])
+        if not new_ids:
+            self._complete(fname)
+        for i, c in zip(new_ids, new_chunks):
+            self.pending.append((fname, i, c, metadatas[i]))
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def mark_unchanged(self, fname: str, entry: Dict[str, Any]) -> None:
+        self.files[fname] = entry
+        self.files_done += 1
+
+    def _complete(self, fname: str) -> None:
+        self.files[fname] = self.finished.pop(fname)
+        self.partial.pop(fname, None)
+        del self.outstanding[fname]
+        self.files_done += 1
+
+    def flush(self) -> None:
+        if self.pending:
+            batch, self.pending = self.pending, []
+            texts = [c for _, _, c, _ in batch]
+            vectors = embed_texts(texts, model=CONFIG.embedding_model)
+            self.col.upsert(
+                ids=[i for _, i, _, _ in batch],
+                documents=texts,
+                metadatas=[meta for _, _, _, meta in batch],
+                embeddings=vectors,
+            )
+            self.chunks_written += len(batch)
+
+            for fname, i, _, _ in batch:
+                self.partial[fname].append(i)
+                self.outstanding[fname] -= 1
+            for fname in {fname for fname, _, _, _ in batch}:
+                if self.outstanding[fname] == 0:
+                    self._complete(fname)
+
+            elapsed = time.perf_counter() - self.started
+            print(
+                f"  ... {self.chunks_written} chunks written, {self.files_done}/{self.total_files} files "
+                f"({self.chunks_written / elapsed if elapsed else 0.0:.1f} chunks/sec)"
+            )
+
+        self.checkpoint()
+
+    def checkpoint(self) -> None:
+        save_manifest(self.db_dir, self.collection_name, {
+            "version": MANIFEST_VERSION,
+            "settings": self.settings,
+            "files": self.files,
+            "partial": self.partial,
+        })
+
+
+def rebuild_lexical_index(col, db_dir: str, collection_name: str, page_size: int = 5000) -> Dict[str, int]:
+    """
+    Rebuild the BM25 index from every chunk in the collection, paging through it.
+    """
+    docs = ((page["ids"][i], page["documents"][i]) for page in iter_collection(col, ["documents"], page_size)
+            for i in range(len(page["ids"])))
+    return build_lexical_index(docs, index_dir(db_dir, collection_name))
+
+
+def iter_collection(col, include: List[str], page_size: int = 5000) -> Iterator[Dict[str, Any]]:
+    """
+    Yield col.get() pages until the collection is exhausted.
+    """
+    offset = 0
+    while True:
+        page = col.get(include=include, limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def export_numpy(col, db_dir: str, collection_name: str) -> Dict[str, Any]:
+    """
+    Copy the Chroma collection into the memory-mapped NumPy store.
+    """
+    records = (
+        (page["ids"][i], page["documents"][i], page["metadatas"][i], page["embeddings"][i])
+        for page in iter_collection(col, ["documents", "metadatas", "embeddings"])
+        for i in range(len(page["ids"]))
+    )
+    return export_numpy_store(records, store_dir(db_dir, collection_name), CONFIG.numpy_store_dtype)
+
+
+def numpy_store_current(db_dir: str, collection_name: str) -> bool:
+    try:
+        with open(os.path.join(store_dir(db_dir, collection_name), "meta.json"), encoding="utf-8") as f:
+            return json.load(f).get("dtype") == CONFIG.numpy_store_dtype
+    except (OSError, ValueError):
+        return False
+
+
+def ingest(
+    kb_dir: Path = KB_DIR,
+    db_dir: Optional[str] = None,
+    collection_name: Optional[str] = None,
+    full: bool = False,
+) -> Dict[str, int]:
+    """
+    Bring the collection in line with kb_dir (incremental, streaming, resumable).
+
+    db_dir defaults to CONFIG's, collection_name to the generation serving CONFIG's
+    collection (updated in place; reload_index builds a new generation instead).
+
+    Returns:
+        counts of changed/unchanged/removed files and added/deleted chunks
+    """
+    db_dir = db_dir or CONFIG.db_dir
+    collection_name = collection_name or active_collection(db_dir, CONFIG.collection_name)
+    os.makedirs(db_dir, exist_ok=True)
+    manifest = load_manifest(db_dir, collection_name)
+    settings = ingest_settings()
+    col = get_or_create_collection(db_dir, collection_name)
+
+    rebuild_reason = None
+    if full:
+        rebuild_reason = "--full"
+    elif not manifest:
+        rebuild_reason = "no manifest"
+    elif manifest.get("settings") != settings:
+        rebuild_reason = "embedding/chunking settings changed"
+    elif col.count() == 0 and manifest.get("files"):
+        rebuild_reason = "collection is empty"
+
+    if rebuild_reason:
+        print(f"Full rebuild ({rebuild_reason})")
+        col = reset_collection(db_dir, collection_name)
+        manifest = {}
+    elif manifest.get("partial"):
+        print(f"Resuming interrupted ingest ({len(manifest['partial'])} partly written files)")
+
+    old_files: Dict[str, Any] = manifest.get("files", {})
+    partial: Dict[str, List[str]] = manifest.get("partial", {})
+    counts = {"unchanged": 0, "changed": 0, "removed": 0, "added": 0, "deleted": 0}
+
+    paths = kb_paths(kb_dir)
+    present = {fp.name for fp in paths}
+    # Start from the previous state; entries are replaced as files complete,
+    # so a checkpoint is always a valid (if partly stale) description of the collection.
+    writer = _BatchWriter(
+        col, db_dir, collection_name, settings,
+        files=dict(old_files), partial=dict(partial),
+        batch_size=CONFIG.ingest_batch_size, total_files=len(paths),
+    )
+    if rebuild_reason:
+        # Save right away so a crash during a rebuild resumes instead of rebuilding again
+        writer.checkpoint()
+
+    # Sources that vanished from kb/ (including half-written ones from an interrupted run)
+    for fname in set(old_files) | set(partial):
+        if fname not in present:
+            gone = list(dict.fromkeys(old_files.get(fname, {}).get("chunks", []) + partial.get(fname, [])))
+            if gone:
+                col.delete(ids=gone)
+            writer.files.pop(fname, None)
+            writer.partial.pop(fname, None)
+            counts["removed"] += 1
+            counts["deleted"] += len(gone)
+
+    # Which files changed (texts aren't kept; changed files are read again for chunking)
+    todo: List[str] = []
+    todo_chars = 0
+    for fname, text in iter_kb_files(kb_dir):
+        old = old_files.get(fname)
+        if old and old["hash"] == content_hash(text) and fname not in partial:
+            writer.mark_unchanged(fname, old)
+            counts["unchanged"] += 1
+            continue
+        todo.append(fname)
+        todo_chars += len(text)
+
+    # Chunk changed files (in a process pool when there is enough text) and stream them into the writer
+    workers = default_workers(CONFIG.chunk_workers) if len(todo) > 1 and todo_chars >= PARALLEL_CHUNKING_MIN_CHARS else 1
+    chunked = chunk_files(
+        [str(Path(kb_dir) / fname) for fname in todo],
+        CONFIG.max_chunk_tokens, CONFIG.chunk_overlap_tokens, CONFIG.embedding_model, workers,
+    )
+    for fname, (_, text, records) in zip(todo, chunked):
+        # Hash what was chunked, in case the file changed in between
+        digest = content_hash(text)
+        old = old_files.get(fname)
+
+        # Chunks already in the collection: last complete run + anything written before an interruption
+        stored = list(dict.fromkeys((old["chunks"] if old else []) + partial.get(fname, [])))
+        ids, new_ids, new_chunks, stale_ids, metadatas = plan_file(fname, text, stored, records)
+        if stale_ids:
+            col.delete(ids=stale_ids)
+        # Unchanged chunks of a changed file keep their vectors, but offsets and doc_version moved
+        new_set = set(new_ids)
+        kept = [i for i in ids if i not in new_set]
+        if kept:
+            col.update(ids=kept, metadatas=[metadatas[i] for i in kept])
+
+        # Already-stored chunks of this file count as written
+        writer.partial[fname] = kept
+        writer.add_file(fname, {"hash": digest, "chunks": ids}, new_ids, new_chunks, metadatas)
+
+        counts["changed"] += 1
+        counts["added"] += len(new_ids)
+        counts["deleted"] += len(stale_ids)
+
+    writer.flush()
+
+    print(
+        f"Files: {counts['changed']} new/changed, {counts['unchanged']} unchanged, {counts['removed']} removed. "
+        f"Chunks: {counts['added']} embedded, {counts['deleted']} deleted."
+    )
+    print(f"Collection now holds {col.count()} chunks in {db_dir}/ (collection={collection_name})")
+
+    index_meta = os.path.join(index_dir(db_dir, collection_name), "meta.json")
+    if counts["changed"] or counts["removed"] or not os.path.exists(index_meta):
+        stats = rebuild_lexical_index(col, db_dir, collection_name)
+        print(f"Lexical index: {stats['chunks']} chunks, {stats['terms']} terms")
+
+    if CONFIG.vector_backend == "numpy" and (
+        counts["changed"] or counts["removed"] or not numpy_store_current(db_dir, collection_name)
+    ):
+        meta = export_numpy(col, db_dir, collection_name)
+        print(f"NumPy vector store: {meta['count']} x {meta['dim']} {meta['dtype']}")
+    return counts
+
+
+def export_index_snapshot(path: str, db_dir: Optional[str] = None, collection_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write the current collection (and its ingest manifest) as a snapshot.
+    """
+    db_dir = db_dir or CONFIG.db_dir
+    collection_name = collection_name or active_collection(db_dir, CONFIG.collection_name)
+    manifest = load_manifest(db_dir, collection_name)
+    if not manifest or manifest.get("partial"):
+        raise RuntimeError("The index is missing or only partly ingested; run ingest first.")
+
+    col = get_or_create_collection(db_dir, collection_name)
+    records = (
+        (page["ids"][i], page["documents"][i], page["metadatas"][i], page["embeddings"][i])
+        for page in iter_collection(col, ["documents", "metadatas", "embeddings"])
+        for i in range(len(page["ids"]))
+    )
+    settings = manifest["settings"]
+    snapshot = export_snapshot(records, path, settings, manifest["files"], settings.get("vector_dtype", "float32"))
+    print(f"Snapshot {snapshot['id']}: {snapshot['count']} chunks x {snapshot['dim']} dims "
+          f"({snapshot['dtype']}) -> {path}/")
+    return snapshot
+
+
+def restore_snapshot(path: str, db_dir: Optional[str] = None, collection_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Verify a snapshot and load it into the collection (no embedding calls).
+
+    Raises SnapshotError / SnapshotMismatch without touching the collection if the
+    snapshot is corrupt or was built with other settings.
+    """
+    db_dir = db_dir or CONFIG.db_dir
+    collection_name = collection_name or active_collection(db_dir, CONFIG.collection_name)
+    snapshot = verify_snapshot(path, ingest_settings())
+
+    os.makedirs(db_dir, exist_ok=True)
+    col = reset_collection(db_dir, collection_name)
+    for page in iter_snapshot_batches(path, CONFIG.ingest_batch_size):
+        col.upsert(
+            ids=page["ids"],
+            documents=page["documents"],
+            metadatas=page["metadatas"],
+            embeddings=page["embeddings"],
+        )
+    # The ingest manifest lets the next `python ingest.py` continue incrementally;
+    # "snapshot" records where the collection came from (dropped by the next ingest).
+    save_manifest(db_dir, collection_name, {
+        "version": MANIFEST_VERSION,
+        "settings": snapshot["settings"],
+        "files": snapshot["files"],
+        "partial": {},
+        "snapshot": snapshot["id"],
+    })
+
+    rebuild_lexical_index(col, db_dir, collection_name)
+    if CONFIG.vector_backend == "numpy":
+        export_numpy(col, db_dir, collection_name)
+    print(f"Restored snapshot {snapshot['id']} ({snapshot['count']} chunks, created {snapshot['created']})")
+    return snapshot
+
+
+def prepare_index(snapshot_dir: Optional[str] = None) -> str:
+    """
+    Make sure there is an index to serve from, preferring the snapshot over ingesting.
+
+    Returns:
+        what was done: "snapshot-restored", "up-to-date", "ingested" or "existing"
+    """
+    snapshot_dir = CONFIG.snapshot_dir if snapshot_dir is None else snapshot_dir
+    manifest = load_manifest(CONFIG.db_dir, active_collection(CONFIG.db_dir, CONFIG.collection_name))
+    index_ok = bool(manifest) and not manifest.get("partial") and manifest.get("settings") == ingest_settings()
+
+    snapshot = None
+    if snapshot_dir:
+        try:
+            snapshot = read_snapshot_manifest(snapshot_dir)
+        except SnapshotError as e:
+            print(f"Ignoring snapshot: {e}")
+
+    if snapshot is not None:
+        if index_ok and manifest.get("snapshot") == snapshot.get("id"):
+            return "up-to-date"
+        if not index_ok or manifest.get("snapshot"):
+            # Nothing usable locally, or it came from an older snapshot: load this one
+            try:
+                restore_snapshot(snapshot_dir)
+                return "snapshot-restored"
+            except SnapshotError as e:
+                if CONFIG.snapshot_on_mismatch == "refuse":
+                    raise
+                print(f"Snapshot not usable ({e}); rebuilding from {KB_DIR}/")
+
+    if index_ok:
+        return "existing"
+    ingest()
+    return "ingested"
+
+
+def validate_generation(db_dir: str, collection_name: str) -> Dict[str, int]:
+    """
+    Check a freshly built generation before it is allowed to serve.
+
+    Raises ReloadError unless every chunk of its manifest is stored, the read-side
+    indexes exist and a stored vector finds itself through the configured backend.
+    """
+    manifest = load_manifest(db_dir, collection_name)
+    if not manifest or manifest.get("partial"):
+        raise ReloadError("ingest did not complete")
+    expected = sum(len(entry["chunks"]) for entry in manifest["files"].values())
+    if expected == 0:
+        raise ReloadError("the knowledge base produced no chunks")
 
+    col = get_chroma_collection(db_dir, collection_name)
+    if col.count() != expected:
+        raise ReloadError(f"collection holds {col.count()} chunks, its manifest lists {expected}")
+    if get_lexical_index(db_dir, collection_name) is None:
+        raise ReloadError("lexical index is missing")
+    reader = col
+    if CONFIG.vector_backend == "numpy":
+        try:
+            reader = get_numpy_collection(db_dir, collection_name)
+        except ValueError as e:
+            raise ReloadError(str(e)) from e
+        if reader.count() != expected:
+            raise ReloadError(f"numpy store holds {reader.count()} chunks, the manifest lists {expected}")
 
-def main():
-    col = get_or_create_collection(CONFIG.db_dir, CONFIG.collection_name)
+    probe = col.get(limit=1, include=["embeddings"])
+    res = reader.query(query_embeddings=[probe["embeddings"][0]], n_results=1, include=["distances"])
+    if not res["ids"][0] or res["distances"][0][0] > SELF_MATCH_MAX_DISTANCE:
+        raise ReloadError("a stored vector does not find itself")
+    return {"files": len(manifest["files"]), "chunks": expected}
+
+
+def segment_dirs(db_dir: str, collection_name: str) -> List[str]:
+    """
+    Directories holding a Chroma collection's vector index.
 
+    delete_collection() leaves them on disk (chromadb 1.x), which would leak a copy
+    of the index per reload. There is no public API for them, so they are read from
+    Chroma's private catalog, which fails closed: only for the pinned chromadb
+    versions (SEGMENT_CATALOG_CHROMADB_VERSIONS), only if the segments table still
+    has the known columns, and only directories named by a VECTOR segment's UUID.
+    Anything else is reported and nothing is returned, so nothing is deleted.
+    """
+    import chromadb
+
+    def unknown(reason: str) -> List[str]:
+        print(f"{reason}: index files of {collection_name} can't be located and stay in {db_dir}/ "
+              f"after it is dropped")
+        return []
+
+    if chromadb.__version__ not in SEGMENT_CATALOG_CHROMADB_VERSIONS:
+        return unknown(f"chromadb {chromadb.__version__} (catalog layout not checked)")
     try:
-        col.delete(where={})
+        collection_id = str(get_client(db_dir).get_collection(name=collection_name).id)
     except Exception:
+        return []  # no such collection: nothing on disk either
+    try:
+        uri = f"file:{os.path.join(os.path.abspath(db_dir), SQLITE_FILENAME)}?mode=ro"
+        with sqlite3.connect(uri, uri=True) as con:
+            columns = tuple(row[1] for row in con.execute("PRAGMA table_info(segments)"))
+            if columns != SEGMENT_CATALOG_COLUMNS:
+                return unknown(f"Chroma catalog has segments columns {columns}")
+            rows = con.execute(
+                "SELECT id FROM segments WHERE collection = ? AND scope = 'VECTOR'", (collection_id,)
+            ).fetchall()
+    except sqlite3.Error as e:
+        return unknown(f"Chroma catalog lookup failed ({e})")
+
+    dirs = []
+    for (segment_id,) in rows:
+        try:
+            name = str(uuid.UUID(str(segment_id)))
+        except ValueError:
+            return unknown(f"Chroma segment id {segment_id!r} is not a UUID")
+        path = os.path.join(db_dir, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            dirs.append(path)
+    return dirs
+
+
+def drop_generation(db_dir: str, collection_name: str) -> None:
+    """
+    Delete a generation: its Chroma collection and index files, manifest, BM25 index
+    and NumPy store.
+    """
+    segments = segment_dirs(db_dir, collection_name)
+    try:
+        get_client(db_dir).delete_collection(name=collection_name)
+    except Exception:
+        pass  # never written, or already gone
+    for path in segments:
+        shutil.rmtree(path, ignore_errors=True)
+    release_collection(db_dir, collection_name)
+    remove_dir(index_dir(db_dir, collection_name))
+    remove_dir(store_dir(db_dir, collection_name))
+    try:
+        os.remove(manifest_path(db_dir, collection_name))
+    except OSError:
         pass
 
-    docs = read_kb_files()
 
-    all_chunks = []
-    metadatas = []
-    ids = []
+def drop_retired(db_dir: str, collection_name: str) -> None:
+    """
+    Drop the generations whose drain period is over. Hold generations_lock().
+
+    Retired generations are listed with their drop time in the generations file, so
+    one left behind by a process that died while draining is dropped by the next reload.
+    """
+    state = read_generations(db_dir, collection_name)
+    retired = state.get("retired", [])
+    now = time.time()
+    due = [r for r in retired if r["drop_after"] <= now and r["name"] != state["active"]]
+    if not due:
+        return
+    for r in due:
+        drop_generation(db_dir, r["name"])
+    write_generations(db_dir, collection_name, dict(state, retired=[r for r in retired if r not in due]))
+
+
+def reload_index(
+    kb_dir: Path = KB_DIR,
+    db_dir: Optional[str] = None,
+    collection_name: Optional[str] = None,
+    drain_s: Optional[float] = None,
+    if_changed: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild the index from kb_dir into a new generation and switch readers to it
+    (blue/green), without pausing queries. Blocks until the old generation is dropped.
+
+    Reloads are serialized across processes (generations_lock). With if_changed, a
+    reload that waited for another one returns None if that one already built
+    the current kb_dir.
+
+    Raises ReloadError (or the ingest error) and leaves the current generation
+    serving if the new one can't be built or doesn't validate.
+
+    Returns:
+        the reload report, also stored as "last_reload" in the generations file
+    """
+    db_dir = db_dir or CONFIG.db_dir
+    collection_name = collection_name or CONFIG.collection_name
+    drain_s = CONFIG.kb_reload_drain_s if drain_s is None else drain_s
+
+    with generations_lock(db_dir, collection_name):
+        if if_changed and not kb_changed(kb_dir, db_dir, collection_name):
+            return None
+        drop_retired(db_dir, collection_name)
+        state = read_generations(db_dir, collection_name)
+        if state.get("building") is not None:
+            # Nobody holds the lock, so the reload that was building it died half-way
+            drop_generation(db_dir, generation_name(collection_name, state["building"]))
+        previous = state["active"]
+        generation = max(state["generation"], state.get("building") or 0) + 1
+        shadow = generation_name(collection_name, generation)
+
+        started = time.perf_counter()
+        print(f"KB reload: building generation {generation} ({shadow}) while {previous} serves", flush=True)
+        write_generations(db_dir, collection_name, dict(state, building=generation))
+        try:
+            ingest(kb_dir, db_dir, shadow)
+            built = time.perf_counter()
+            info = validate_generation(db_dir, shadow)
+        except Exception as e:
+            drop_generation(db_dir, shadow)
+            write_generations(db_dir, collection_name, dict(state, building=None, last_reload={
+                "ok": False,
+                "generation": generation,
+                "error": f"{type(e).__name__}: {e}",
+                "ts": time.time(),
+            }))
+            raise
+
+        report = {
+            "ok": True,
+            "generation": generation,
+            "previous": previous,
+            **info,
+            "build_ms": round((built - started) * 1000, 1),
+            "validate_ms": round((time.perf_counter() - built) * 1000, 1),
+            "reload_ms": round((time.perf_counter() - started) * 1000, 1),
+            "ts": time.time(),
+        }
+        # Requests that resolved the old generation just before the switch may still be reading it
+        retired = state.get("retired", []) + [{"name": previous, "drop_after": time.time() + drain_s}]
+        write_generations(db_dir, collection_name, {
+            "active": shadow,
+            "generation": generation,
+            "building": None,
+            "retired": retired,
+            "last_reload": report,
+        })
+        # Switch this process right away (other processes do on their next request)
+        read_generations(db_dir, collection_name)
+    REGISTRY.observe("kb_reload", report["reload_ms"])
+    print(
+        f"KB reload: generation {generation} serving {info['chunks']} chunks after "
+        f"{report['reload_ms'] / 1000:.2f}s; dropping {previous} in {drain_s:g}s",
+        flush=True,
+    )
+
+    # Drain without the lock, so another reload can start meanwhile
+    time.sleep(drain_s)
+    with generations_lock(db_dir, collection_name):
+        drop_retired(db_dir, collection_name)
+    return report
 
-    idx = 0
-    for fname, text in docs:
-        chunks = chunk_markdown(
-            text,
-            max_chars=CONFIG.max_chunk_chars,
-            overlap=CONFIG.chunk_overlap_chars,
+
+def kb_signature(kb_dir: Path = KB_DIR) -> Tuple[Tuple[str, int, int], ...]:
+    """
+    Cheap change detector for kb_dir: (name, mtime_ns, size) of every markdown file.
+    """
+    signature = []
+    for path in kb_paths(kb_dir):
+        try:
+            st = path.stat()
+        except OSError:
+            continue  # deleted between glob and stat
+        signature.append((path.name, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def kb_changed(kb_dir: Path = KB_DIR, db_dir: Optional[str] = None, collection_name: Optional[str] = None) -> bool:
+    """
+    True if kb_dir's contents differ from what the serving generation was built from.
+    """
+    db_dir = db_dir or CONFIG.db_dir
+    manifest = load_manifest(db_dir, active_collection(db_dir, collection_name or CONFIG.collection_name))
+    built_from = {fname: entry["hash"] for fname, entry in manifest.get("files", {}).items()}
+    current = {fname: content_hash(text) for fname, text in iter_kb_files(kb_dir)}
+    return bool(manifest.get("partial")) or current != built_from
+
+
+def watch_kb(
+    kb_dir: Path = KB_DIR,
+    interval_s: Optional[float] = None,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Poll kb_dir and reload the index (reload_index) whenever its contents change.
+
+    A change is acted on once kb_dir looked the same for one more poll, so an editor
+    or a sync that is still writing doesn't start one rebuild per file. Files that
+    were only touched are hashed and found unchanged. Runs until stop is set.
+    """
+    interval_s = CONFIG.kb_watch_interval_s if interval_s is None else interval_s
+    stop = stop or threading.Event()
+    checked = None  # signature the index was last compared with
+    settling = None  # latest signature, waiting for one quiet poll
+    while not stop.wait(interval_s):
+        signature = kb_signature(kb_dir)
+        if signature == checked:
+            continue
+        if signature != settling:
+            settling = signature
+            continue
+        checked, settling = signature, None
+        if not kb_changed(kb_dir):
+            continue
+        try:
+            # Another process may be reloading the same change; if so this returns None
+            reload_index(kb_dir, if_changed=True)
+        except Exception as e:
+            print(f"KB reload failed, the current generation keeps serving: {type(e).__name__}: {e}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build/update the vector DB from kb/*.md")
+    parser.add_argument("--full", action="store_true", help="wipe the collection and rebuild everything")
+    parser.add_argument("--verify-numpy", action="store_true",
+                        help="compare the NumPy vector store's search results with Chroma's")
+    parser.add_argument("--export-snapshot", metavar="DIR",
+                        help="after ingesting, write a checksummed snapshot of the index to DIR")
+    parser.add_argument("--restore-snapshot", metavar="DIR",
+                        help="load the index from a snapshot instead of ingesting")
+    parser.add_argument("--swap", action="store_true",
+                        help="build a new generation of the index and switch to it atomically "
+                             "(safe while the app is serving)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and rebuild (like --swap) whenever kb/ changes")
+    args = parser.parse_args(argv)
+
+    if args.restore_snapshot:
+        restore_snapshot(args.restore_snapshot)
+        return
+
+    if args.watch:
+        print(f"Watching {KB_DIR}/ every {CONFIG.kb_watch_interval_s:g}s (Ctrl+C to stop)", flush=True)
+        try:
+            watch_kb()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.swap:
+        reload_index()
+    else:
+        ingest(full=args.full)
+
+    if args.export_snapshot:
+        export_index_snapshot(args.export_snapshot)
+
+    if args.verify_numpy:
+        collection = active_collection(CONFIG.db_dir, CONFIG.collection_name)
+        report = verify_against_chroma(
+            get_chroma_collection(CONFIG.db_dir, collection),
+            get_numpy_collection(CONFIG.db_dir, collection),
         )
-        for c in chunks:
-            ids.append(f"{fname}-{idx}")
-            all_chunks.append(c)
-            metadatas.append({"source": fname})
-            idx += 1
+        print(f"NumPy vs Chroma: {json.dumps(report)}")
 
-    vectors = embed_texts(all_chunks, model=CONFIG.embedding_model)
+    stats = embedding_cache_stats()
+    if stats:
+        print(
+            f"Embedding cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+            f"{stats['misses']} misses (hit rate {stats['hit_rate']:.0%})"
+        )
 
-    col.add(ids=ids, documents=all_chunks, metadatas=metadatas, embeddings=vectors)
-    print(f"Ingested {len(all_chunks)} chunks into {CONFIG.db_dir}/ (collection={CONFIG.collection_name})")
+    throughput = embedding_throughput_stats()
+    if throughput["texts"]:
+        print(
+            f"Embedded {throughput['texts']} chunks in {throughput['batches']} batches "
+            f"({throughput['chunks_per_sec']:.1f} chunks/sec, {throughput['retries']} retries)"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,352 @@
+"""
+Multi-process HTTP server for the RAG pipeline (JSON API, no UI).
+
+app.py runs everything in one Gradio process. To use more than one core, this
+server pre-forks worker processes:
+
+1) The parent loads everything that is safe to share across fork: imports, the
+   tiktoken encoding, and the read-only indexes (NumPy vector store and BM25
+   index are memory-mapped, so forked workers share those pages).
+2) It binds the listening socket, then forks N workers. Each worker runs its own
+   event loop on the shared socket; the kernel spreads connections across them.
+3) Each worker builds its own OpenAI clients and Chroma client after the fork
+   (HTTP pools and SQLite connections must not be shared between processes)
+   and warms them before accepting requests.
+   The embedding cache is built in the parent, with its on-disk index loaded, and
+   inherited. No process owns cache writes: every worker (and ingest.py, the app's
+   KB watcher) appends query embeddings it had to fetch, and appends are serialized
+   by a file lock (see core/embedding_cache.py).
+4) The parent restarts workers that die. A worker that fails during start-up
+   prints its traceback and exits non-zero; restarts then back off, and after
+   MAX_FAILED_STARTS failed starts in a row the server stops with an error.
+
+Backpressure (per worker): at most serve_max_inflight requests run at once and up to
+serve_max_queue wait for a slot. Beyond that the server answers 503 with Retry-After
+instead of letting latency grow without bound. Stages can also be capped separately
+(max_concurrent_llm etc., see core/limits.py).
+
+Endpoints:
+    POST /ask      {"question": "..."} -> {"answer", "sources", "timings_ms", "queue_ms", "worker"}
+                   optional "source" (file name or list) and "heading" ("Title > Subtitle")
+                   restrict retrieval to that part of the KB
+    GET  /healthz  worker liveness, and the KB generation it serves
+    GET  /metrics  Prometheus text of the worker that answers
+
+KB hot reload: run `python ingest.py --watch` (or `--swap` once) next to the server.
+It builds each new index generation in the background; workers switch to it on
+their next request, without a restart.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    python serve.py --fake --llm-latency-ms 300     # offline, fake OpenAI backend
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from core.config import CONFIG, override_config
+
+
+# A worker that exits sooner than this after it was forked failed to start
+WORKER_STARTUP_GRACE_S = 10.0
+# Restart delay after consecutive failed starts: base, doubling, capped
+RESTART_BACKOFF_S = 0.5
+RESTART_BACKOFF_MAX_S = 30.0
+# Give up (stop every worker, exit non-zero) after this many failed starts in a row
+MAX_FAILED_STARTS = 5
+
+
+class Overloaded(Exception):
+    pass
+
+
+class RestartPolicy:
+    """
+    When to restart a worker that exited.
+
+    A worker that ran past the start-up grace period crashed in service: restart it
+    right away. One that died during start-up (missing index, bad config) would
+    fail again, so restarts back off exponentially, and after max_failed_starts
+    failed starts in a row there is nothing left to try.
+    """
+
+    def __init__(self, grace_s: float = WORKER_STARTUP_GRACE_S, base_s: float = RESTART_BACKOFF_S,
+                 max_s: float = RESTART_BACKOFF_MAX_S, max_failed_starts: int = MAX_FAILED_STARTS):
+        self.grace_s = grace_s
+        self.base_s = base_s
+        self.max_s = max_s
+        self.max_failed_starts = max_failed_starts
+        self.failed_starts = 0
+
+    def delay(self, lifetime_s: float) -> Optional[float]:
+        """
+        Seconds to wait before restarting, or None to give up.
+        """
+        if lifetime_s >= self.grace_s:
+            self.failed_starts = 0
+            return 0.0
+        self.failed_starts += 1
+        if self.failed_starts >= self.max_failed_starts:
+            return None
+        return min(self.max_s, self.base_s * 2 ** (self.failed_starts - 1))
+
+
+class Admission:
+    """
+    Bounded in-flight slots plus a bounded wait queue, for one event loop.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int):
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_inflight)
+
+    async def __aenter__(self) -> float:
+        """
+        Wait for a slot; returns the time spent queued in ms.
+        """
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded()
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        return (time.perf_counter() - start) * 1000
+
+    async def __aexit__(self, *exc) -> None:
+        self._slots.release()
+
+
+def preload() -> None:
+    """
+    Fork-safe warm-up in the parent: imports, tokenizer, memory-mapped indexes,
+    the embedding cache's index.
+    """
+    from core.embedding_cache import get_embedding_cache
+    from core.embeddings import count_tokens
+    from core.lexical_index import get_lexical_index
+    import core.rag_pipeline  # noqa: F401  (imports the whole pipeline)
+
+    # The pipeline imports these lazily; load them once here so workers inherit them
+    import httpx  # noqa: F401
+    import openai  # noqa: F401
+    if CONFIG.vector_backend == "chroma":
+        import chromadb  # noqa: F401
+
+    from core.store import serving_collection
+
+    count_tokens(["warm up"], CONFIG.embedding_model)
+    count_tokens(["warm up"], CONFIG.chat_model)
+    collection = serving_collection()
+    if CONFIG.vector_backend == "numpy":
+        from core.numpy_store import get_numpy_collection
+        col = get_numpy_collection(CONFIG.db_dir, collection)
+        # Touch every page once so workers start with a hot, shared page cache
+        col.vectors.sum()
+    get_lexical_index(CONFIG.db_dir, collection)
+
+    cache = get_embedding_cache()
+    if cache is not None:
+        # Loads the on-disk index; workers then only read what was appended after the fork
+        cache.get_many([], CONFIG.embedding_model)
+
+
+def build_app():
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse, PlainTextResponse
+    from starlette.routing import Route
+
+    from core.metrics import metrics_prometheus_text
+    from core.rag_pipeline import run_rag_async
+    from core.retriever import metadata_filter
+    from core.store import read_generations
+
+    admission: Dict[str, Optional[Admission]] = {"current": None}
+
+    def get_admission() -> Admission:
+        # Created lazily so the semaphore belongs to the server's event loop
+        if admission["current"] is None:
+            admission["current"] = Admission(CONFIG.serve_max_inflight, CONFIG.serve_max_queue)
+        return admission["current"]
+
+    async def ask(request: Request):
+        try:
+            body = await request.json()
+            question = body["question"]
+            where = metadata_filter(source=body.get("source"), heading=body.get("heading"))
+        except Exception:
+            return JSONResponse({"error": "expected JSON body {\"question\": \"...\"}"}, status_code=400)
+
+        try:
+            async with get_admission() as queue_ms:
+                result = await run_rag_async(question, where)
+        except Overloaded:
+            return JSONResponse({"error": "overloaded, retry later"}, status_code=503, headers={"Retry-After": "1"})
+
+        trace = result["debug"]["trace"]
+        return JSONResponse({
+            "answer": result["answer"],
+            "sources": result["sources"],
+            "timings_ms": trace["timings_ms"],
+            "usage": trace["usage"],
+            "queue_ms": round(queue_ms, 2),
+            "worker": os.getpid(),
+        })
+
+    async def healthz(request: Request):
+        adm = get_admission()
+        kb = read_generations(CONFIG.db_dir, CONFIG.collection_name)
+        return JSONResponse({
+            "ok": True,
+            "worker": os.getpid(),
+            "waiting": adm.waiting,
+            "rejected": adm.rejected,
+            "kb_generation": kb["generation"],
+            "kb_reloading": kb.get("building") is not None,
+        })
+
+    async def metrics(request: Request):
+        return PlainTextResponse(metrics_prometheus_text())
+
+    return Starlette(routes=[
+        Route("/ask", ask, methods=["POST"]),
+        Route("/healthz", healthz),
+        Route("/metrics", metrics),
+    ])
+
+
+def run_worker(sock: socket.socket, args) -> None:
+    import uvicorn
+
+    if args.fake:
+        # Fake clients are per process too
+        from core.fake_openai import install_fake_openai
+        install_fake_openai(
+            chat_latency_s=args.llm_latency_ms / 1000,
+            embed_latency_s=args.embed_latency_ms / 1000,
+            dim=args.dim,
+        )
+    # Per-process warm-up after fork: clients and the vector store handle
+    from core.rag_pipeline import warm_up
+    warm_up()
+    config = uvicorn.Config(build_app(), log_level="warning", access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Pre-forked RAG HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=CONFIG.serve_workers, help="0 = one per CPU core")
+    parser.add_argument("--max-inflight", type=int, default=CONFIG.serve_max_inflight)
+    parser.add_argument("--max-queue", type=int, default=CONFIG.serve_max_queue)
+    parser.add_argument("--max-llm", type=int, default=CONFIG.max_concurrent_llm,
+                        help="concurrent LLM calls per worker (0 = unlimited)")
+    parser.add_argument("--fake", action="store_true", help="use the fake OpenAI backend (load tests)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="fake chat latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="fake embeddings latency")
+    parser.add_argument("--dim", type=int, default=1536, help="fake embedding dimension")
+    args = parser.parse_args(argv)
+
+    override_config(
+        serve_max_inflight=args.max_inflight,
+        serve_max_queue=args.max_queue,
+        max_concurrent_llm=args.max_llm,
+    )
+    workers = args.workers or os.cpu_count() or 1
+
+    preload()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children: Dict[int, int] = {}  # pid -> worker number
+    started: Dict[int, float] = {}  # pid -> fork time
+    policy = RestartPolicy(WORKER_STARTUP_GRACE_S, RESTART_BACKOFF_S, RESTART_BACKOFF_MAX_S, MAX_FAILED_STARTS)
+    stopping = False
+
+    def spawn(n: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(sock, args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = n
+        started[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for n in range(workers):
+        spawn(n)
+    print(f"Serving on http://{args.host}:{args.port} with {workers} workers (pid {os.getpid()})", flush=True)
+
+    # Supervise: restart workers that die unexpectedly, backing off on failed starts
+    exit_code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        n = children.pop(pid, None)
+        lifetime = time.monotonic() - started.pop(pid, 0.0)
+        if n is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        delay = policy.delay(lifetime)
+        if delay is None:
+            print(f"Worker {pid} exited (code {code}) during start-up {policy.failed_starts} times in a row; "
+                  f"giving up", file=sys.stderr, flush=True)
+            exit_code = 1
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"Worker {pid} exited (code {code}) after {lifetime:.1f}s; restarting in {delay:g}s",
+              file=sys.stderr, flush=True)
+        time.sleep(delay)
+        if not stopping:
+            spawn(n)
+    sock.close()
+    if exit_code:
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Shared fixtures.
+
+Tests run offline against the in-repo fakes (core/fake_openai.py,
+FakeEmbeddingBackend) with CONFIG pointed at a temporary db_dir. Process-wide
+singletons (pooled clients, caches, the query coalescer) are reset around each test.
+"""
+
+import dataclasses
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from core import answer_cache, clients, embedding_cache, embeddings, store  # noqa: E402
+from core.config import CONFIG, override_config  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    saved = dataclasses.asdict(CONFIG)
+    override_config(
+        db_dir=str(tmp_path / "db"),
+        embedding_cache_dir="",
+        snapshot_dir="",
+        metrics_jsonl_path="",
+        kb_reload_drain_s=0.0,
+    )
+    monkeypatch.setattr(answer_cache, "_cache", None)
+    monkeypatch.setattr(embedding_cache, "_cache", None)
+    monkeypatch.setattr(embeddings, "_coalescer", None)
+    store.reset_store()
+    yield
+    store.reset_store()
+    clients.set_openai_clients(None, None)
+    embeddings.set_embedding_backend(None)
+    override_config(**saved)
+
+
+@pytest.fixture
+def fake_openai():
+    from core.fake_openai import install_fake_openai
+    return install_fake_openai()
+
+
+@pytest.fixture
+def kb_dir(tmp_path) -> Path:
+    """A copy of the shipped kb/, safe to edit."""
+    path = tmp_path / "kb"
+    shutil.copytree(ROOT / "kb", path)
+    return path
+
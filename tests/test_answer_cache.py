@@ -0,0 +1,94 @@
+import threading
+
+from core import answer_cache
+from core.answer_cache import SemanticAnswerCache
+from core.store import collection_version, get_or_create_collection
+
+V1 = ("collection-id", (1, 100))
+
+
+def result(answer):
+    return {"answer": answer, "debug": {}}
+
+
+def test_similar_queries_hit_and_dissimilar_miss():
+    cache = SemanticAnswerCache(threshold=0.95, ttl_s=60, max_entries=10)
+    cache.store("opening hours?", [1.0, 0.0, 0.0], result("9 to 5"), V1)
+
+    hit = cache.lookup([0.99, 0.05, 0.0], V1)
+    assert hit["answer"] == "9 to 5"
+    assert hit["debug"]["answer_cache"]["matched_query"] == "opening hours?"
+    assert cache.lookup([0.5, 0.5, 0.0], V1) is None
+    # Callers get a copy; the cached result is untouched
+    hit["answer"] = "changed"
+    assert cache.lookup([1.0, 0.0, 0.0], V1)["answer"] == "9 to 5"
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(threshold=0.9, ttl_s=10, max_entries=10)
+    cache.store("q", [1.0, 0.0], result("a"), V1)
+
+    now[0] += 9
+    assert cache.lookup([1.0, 0.0], V1) is not None
+    now[0] += 2
+    assert cache.lookup([1.0, 0.0], V1) is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(threshold=0.9, ttl_s=60, max_entries=2)
+    cache.store("a", [1.0, 0.0, 0.0], result("a"), V1)
+    cache.store("b", [0.0, 1.0, 0.0], result("b"), V1)
+    assert cache.lookup([1.0, 0.0, 0.0], V1) is not None  # "a" is now the most recent
+    cache.store("c", [0.0, 0.0, 1.0], result("c"), V1)
+
+    assert cache.lookup([0.0, 1.0, 0.0], V1) is None
+    assert cache.lookup([1.0, 0.0, 0.0], V1)["answer"] == "a"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_new_kb_version_clears_the_cache():
+    cache = SemanticAnswerCache(threshold=0.9, ttl_s=60, max_entries=10)
+    cache.store("q", [1.0, 0.0], result("old"), V1)
+
+    assert cache.lookup([1.0, 0.0], ("collection-id", (2, 120))) is None
+    stats = cache.get_stats()
+    assert stats["invalidations"] == 1 and stats["entries"] == 0
+
+
+def test_concurrent_stores_and_lookups():
+    cache = SemanticAnswerCache(threshold=0.99, ttl_s=60, max_entries=50)
+    errors = []
+
+    def worker(k):
+        try:
+            for i in range(200):
+                vec = [float(k), float(i % 60), 1.0]
+                cache.store(f"{k}-{i}", vec, result(str(i)), V1)
+                cache.lookup(vec, V1)
+        except Exception as e:  # noqa: BLE001 - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    stats = cache.get_stats()
+    assert stats["entries"] == 50 and stats["stores"] == 800
+    assert stats["hits"] + stats["misses"] == 800
+
+
+def test_kb_version_changes_when_the_collection_is_written(tmp_path):
+    db_dir = str(tmp_path)
+    col = get_or_create_collection(db_dir, "kb-test")
+    col.upsert(ids=["a"], documents=["a"], embeddings=[[1.0, 0.0]])
+    before = collection_version(db_dir, "kb-test")
+    assert collection_version(db_dir, "kb-test") == before
+
+    col.upsert(ids=["b"], documents=["b"], embeddings=[[0.0, 1.0]])
+    assert collection_version(db_dir, "kb-test") != before
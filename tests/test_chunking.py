@@ -0,0 +1,88 @@
+import random
+import sys
+import types
+
+import pytest
+
+from core import embeddings
+from core.chunking import (
+    HEADING_RE,
+    SENTENCE_START_RE,
+    _first_sentence_start,
+    _last_sentence_start,
+    chunk_markdown,
+    chunk_text,
+    iter_headings,
+)
+from core.embeddings import count_tokens, tokenizer_name
+
+MODEL = "text-embedding-3-small"
+PIECES = [
+    "# A\n", "## B c\n", "#\n# D\n", "####### no\n", "#NoSpace\n", "\n", "\n\n", " \n \n",
+    "word ", "text. ", "more! ", "why? ", "3.5 ", "e.g.x ", ".\t", ";\x0b", ":", "é ", "x" * 40,
+]
+
+
+def random_texts(n, seed=0):
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 80))) for _ in range(n)]
+
+
+def test_heading_scan_matches_the_heading_regex():
+    for text in random_texts(500):
+        assert [m.span() for m in HEADING_RE.finditer(text)] == [
+            (m.start(1), m.end()) for m in iter_headings(text)
+        ]
+
+
+def test_sentence_start_search_matches_the_regex():
+    for text in random_texts(300, seed=1):
+        for pos in range(len(text)):
+            for endpos in (pos + 1, pos + 7, len(text)):
+                matches = list(SENTENCE_START_RE.finditer(text, pos, endpos))
+                assert _first_sentence_start(text, pos, endpos) == (matches[0].end() if matches else -1)
+                assert _last_sentence_start(text, pos, endpos) == (matches[-1].end() if matches else -1)
+
+
+def test_long_sections_split_at_sentences_within_budget():
+    sentence = "The clinic follows a long-term plan for every patient. "
+    text = "# Plans\n\n" + sentence * 60 + "\n## Short\nOne line."
+    chunks = chunk_text(text, max_tokens=60, overlap_tokens=10, model=MODEL)
+
+    assert len(chunks) > 3 and chunks[-1].heading_path == ("Plans", "Short")
+    for c in chunks[:-1]:
+        assert c.tokens <= 60
+        assert c.text(text).endswith(".")
+        assert c.heading_path == ("Plans",)
+    # Consecutive pieces overlap
+    assert chunks[1].start < chunks[0].end
+
+
+def test_chunk_markdown_accepts_the_old_character_sizes():
+    text = "# Title\n\n" + "Some sentence here. " * 200
+    with pytest.warns(DeprecationWarning):
+        old = chunk_markdown(text, max_chars=1200, overlap=200)
+    assert old == chunk_markdown(text, max_tokens=300, overlap_tokens=50)
+    assert max(count_tokens(old, MODEL)) <= 300 + 1
+
+
+def test_failed_tokenizer_load_is_retried(monkeypatch):
+    attempts = []
+
+    class Encoding:
+        name = "stub_base"
+
+    def encoding_for_model(model):
+        attempts.append(model)
+        if len(attempts) == 1:
+            raise OSError("offline")
+        return Encoding()
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(encoding_for_model=encoding_for_model))
+    monkeypatch.setattr(embeddings, "_encodings", {})
+    monkeypatch.setattr(embeddings, "_encoding_failed_at", {})
+
+    assert tokenizer_name("stub-model") == "approx"
+    assert tokenizer_name("stub-model") == "approx" and len(attempts) == 1
+    monkeypatch.setattr(embeddings, "ENCODING_RETRY_S", 0.0)
+    assert tokenizer_name("stub-model") == "stub_base" and len(attempts) == 2
@@ -0,0 +1,37 @@
+import pytest
+
+from core.config import CONFIG
+from core.context_packer import BLOCK_OVERHEAD_TOKENS, pack_context
+from core.embeddings import count_tokens
+
+MODEL = CONFIG.chat_model
+LONG = " ".join(f"word{i}" for i in range(400))
+
+
+def hit(chunk_id, text, source="a.md"):
+    return {"id": chunk_id, "text": text, "source": source}
+
+
+def test_overlapping_hits_are_merged_and_repeats_dropped():
+    first = "Opening hours are Monday to Friday. " * 3 + "The clinic is closed on public holidays."
+    second = "The clinic is closed on public holidays. Call the front desk to reschedule."
+    blocks, info = pack_context([hit("1", first), hit("2", second), hit("3", first[:60])], 0, MODEL)
+
+    assert len(blocks) == 1 and blocks[0]["ids"] == ["1", "2"]
+    assert blocks[0]["text"].count("public holidays") == 1
+    assert info["merged"] == 1 and info["deduped"] == 1
+
+
+def test_best_hit_is_truncated_to_the_budget():
+    blocks, info = pack_context([hit("1", LONG)], 50, MODEL)
+
+    assert info["truncated"] and len(blocks) == 1
+    assert count_tokens([blocks[0]["text"]], MODEL)[0] <= 50 - BLOCK_OVERHEAD_TOKENS
+
+
+@pytest.mark.parametrize("budget", [1, BLOCK_OVERHEAD_TOKENS - 1, BLOCK_OVERHEAD_TOKENS])
+def test_budget_below_block_overhead_packs_nothing(budget):
+    blocks, info = pack_context([hit("1", LONG), hit("2", "short")], budget, MODEL)
+
+    assert blocks == []
+    assert info["over_budget"] == 2 and info["tokens"] == 0
@@ -0,0 +1,47 @@
+import os
+import threading
+
+from core.embedding_cache import _INDEX_RECORD, EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+def vec(i, dim=4):
+    return [float(i + k) for k in range(dim)]
+
+
+def test_append_after_a_torn_record_keeps_later_entries(tmp_path):
+    EmbeddingCache(str(tmp_path)).put_many(["a"], [vec(1)], MODEL)
+    # A writer crashed halfway through a vector and an index record
+    with open(tmp_path / f"{MODEL}.f32", "ab") as f:
+        f.write(b"\x01\x02")
+    with open(tmp_path / f"{MODEL}.idx", "ab") as f:
+        f.write(b"\x00" * 10)
+
+    EmbeddingCache(str(tmp_path)).put_many(["b", "c"], [vec(2), vec(3)], MODEL)
+
+    assert EmbeddingCache(str(tmp_path)).get_many(["a", "b", "c"], MODEL) == [vec(1), vec(2), vec(3)]
+    assert os.path.getsize(tmp_path / f"{MODEL}.idx") % _INDEX_RECORD.size == 0
+
+
+def test_concurrent_writers_never_mix_up_vectors(tmp_path):
+    # One cache per thread, as in separate processes: only the file lock is shared
+    start = threading.Barrier(4)
+
+    def write(worker):
+        cache = EmbeddingCache(str(tmp_path))
+        start.wait()
+        for i in range(200):
+            # Every worker also stores the shared texts, to exercise dedupe across writers
+            cache.put_many([f"{worker}-{i}", f"shared-{i}"], [vec(worker * 1000 + i), vec(-i)], MODEL)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    texts = [f"{w}-{i}" for w in range(4) for i in range(200)] + [f"shared-{i}" for i in range(200)]
+    expected = [vec(w * 1000 + i) for w in range(4) for i in range(200)] + [vec(-i) for i in range(200)]
+    assert EmbeddingCache(str(tmp_path)).get_many(texts, MODEL) == expected
+    assert os.path.getsize(tmp_path / f"{MODEL}.idx") == _INDEX_RECORD.size * len(texts)
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import pytest
+
+from core.config import CONFIG, override_config
+from core.embedding_cache import EmbeddingCache
+from core.embeddings import TransientEmbeddingError, count_tokens, embed_texts_async, embedding_throughput_stats
+
+
+def test_async_path_packs_batches_and_retries_rate_limits(fake_openai):
+    texts = [f"question number {i}" for i in range(5)]
+    # One text per token-bounded batch
+    override_config(embedding_batch_max_tokens=max(count_tokens(texts, CONFIG.embedding_model)), embedding_retry_base_s=0.0)
+    backend = fake_openai.embedding_backend
+    backend.rate_limit_every = 2
+    retries = embedding_throughput_stats()["retries"]
+
+    vectors = asyncio.run(embed_texts_async(texts, CONFIG.embedding_model))
+
+    assert vectors == [backend.vector(t) for t in texts]
+    # 5 batches, every rate-limited request retried
+    assert backend.inputs == 5
+    assert backend.requests > 5
+    assert embedding_throughput_stats()["retries"] - retries == backend.requests - 5
+
+
+def test_async_path_gives_up_after_max_retries(fake_openai):
+    override_config(embedding_max_retries=2, embedding_retry_base_s=0.0)
+    fake_openai.embedding_backend.rate_limit_every = 1
+
+    with pytest.raises(TransientEmbeddingError):
+        asyncio.run(embed_texts_async(["hello"], CONFIG.embedding_model))
+    assert fake_openai.embedding_backend.requests == 3
+
+
+def test_async_path_uses_the_embedding_cache_off_the_event_loop(fake_openai, tmp_path, monkeypatch):
+    override_config(embedding_cache_dir=str(tmp_path / "cache"))
+    threads = []
+    for name in ("get_many", "put_many"):
+        original = getattr(EmbeddingCache, name)
+
+        def recording(self, *args, _original=original, **kwargs):
+            threads.append(threading.current_thread())
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(EmbeddingCache, name, recording)
+
+    asyncio.run(embed_texts_async(["a", "b"], CONFIG.embedding_model))
+    asyncio.run(embed_texts_async(["a", "b"], CONFIG.embedding_model))
+
+    assert fake_openai.embedding_backend.requests == 1
+    assert len(threads) == 3 and threading.main_thread() not in threads
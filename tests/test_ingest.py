@@ -0,0 +1,121 @@
+import dataclasses
+import hashlib
+
+import pytest
+
+import ingest
+from core.store import get_collection
+
+
+class OfflineIngest:
+    """ingest.ingest() from kb_dir into a temporary db_dir, with a fake embedder."""
+
+    def __init__(self, kb_dir, db_dir, monkeypatch):
+        self.kb_dir = kb_dir
+        self.db_dir = db_dir
+        self.collection_name = ingest.CONFIG.collection_name
+        self.monkeypatch = monkeypatch
+        self.embedded = []
+        monkeypatch.setattr(ingest, "embed_texts", self.embed)
+
+    def configure(self, **changes):
+        self.monkeypatch.setattr(ingest, "CONFIG", dataclasses.replace(ingest.CONFIG, **changes))
+
+    def embed(self, texts, model):
+        self.embedded.extend(texts)
+        return [[b / 255 + 0.01 for b in hashlib.sha256(t.encode("utf-8")).digest()[:8]] for t in texts]
+
+    def run(self):
+        return ingest.ingest(self.kb_dir, self.db_dir, self.collection_name)
+
+    def stored_ids(self):
+        return set(get_collection(self.db_dir, self.collection_name).get()["ids"])
+
+    def manifest(self):
+        return ingest.load_manifest(self.db_dir, self.collection_name)
+
+    def manifest_ids(self):
+        return {i for entry in self.manifest()["files"].values() for i in entry["chunks"]}
+
+
+@pytest.fixture
+def offline(kb_dir, tmp_path, monkeypatch):
+    return OfflineIngest(kb_dir, str(tmp_path / "db"), monkeypatch)
+
+
+def test_rerun_skips_unchanged_files(offline):
+    first = offline.run()
+    embedded = len(offline.embedded)
+
+    again = offline.run()
+    assert first["changed"] == 5 and first["added"] == embedded == len(offline.stored_ids())
+    assert again == {"unchanged": 5, "changed": 0, "removed": 0, "added": 0, "deleted": 0}
+    assert len(offline.embedded) == embedded
+
+
+def test_only_changed_chunks_are_embedded_and_stale_ones_deleted(offline, kb_dir):
+    offline.run()
+    before = offline.stored_ids()
+    about = kb_dir / "01_about.md"
+    about.write_text(about.read_text(encoding="utf-8") + "\n## Parking\n\nFree parking behind the clinic.\n",
+                     encoding="utf-8")
+    (kb_dir / "05_FAQ.md").unlink()
+    embedded = len(offline.embedded)
+
+    counts = offline.run()
+    after = offline.stored_ids()
+    assert counts["changed"] == 1 and counts["unchanged"] == 3 and counts["removed"] == 1
+    assert len(offline.embedded) - embedded == counts["added"] == len(after - before)
+    assert counts["deleted"] == len(before - after)
+    assert not any(i.startswith("05_FAQ.md") for i in after)
+    assert after == offline.manifest_ids()
+
+
+def test_changed_settings_force_a_full_rebuild(offline):
+    offline.run()
+    offline.configure(max_chunk_tokens=ingest.CONFIG.max_chunk_tokens // 2)
+
+    counts = offline.run()
+    assert counts["changed"] == 5 and counts["unchanged"] == 0
+    assert offline.stored_ids() == offline.manifest_ids()
+    assert offline.manifest()["settings"] == ingest.ingest_settings()
+
+
+def test_interrupted_ingest_resumes_from_its_checkpoint(offline):
+    offline.configure(ingest_batch_size=4)
+    batches = []
+
+    def embed_then_crash(texts, model):
+        if len(batches) == 3:
+            raise RuntimeError("embeddings API down")
+        batches.append(len(texts))
+        return offline.embed(texts, model)
+
+    offline.monkeypatch.setattr(ingest, "embed_texts", embed_then_crash)
+    with pytest.raises(RuntimeError):
+        offline.run()
+    checkpoint = offline.manifest()
+    written = offline.stored_ids()
+    assert batches == [4, 4, 4] and len(written) == 12
+    assert checkpoint["partial"]
+    # Every chunk the checkpoint knows about is stored
+    recorded = {i for ids in checkpoint["partial"].values() for i in ids}
+    assert recorded | {i for e in checkpoint["files"].values() for i in e["chunks"]} <= written
+
+    offline.monkeypatch.setattr(ingest, "embed_texts", offline.embed)
+    embedded = len(offline.embedded)
+    counts = offline.run()
+    assert not offline.manifest()["partial"]
+    assert offline.stored_ids() == offline.manifest_ids()
+    assert len(offline.embedded) - embedded == len(offline.manifest_ids()) - 12
+    assert counts["unchanged"] == len(checkpoint["files"])
+
+
+def test_changed_tokenizer_forces_a_full_rebuild(offline, monkeypatch):
+    offline.run()
+    tokenizer = offline.manifest()["settings"]["tokenizer"]
+    monkeypatch.setattr(ingest, "tokenizer_name", lambda model: tokenizer + "-other")
+
+    counts = offline.run()
+    assert counts["changed"] == 5 and counts["unchanged"] == 0
+    assert offline.manifest()["settings"]["tokenizer"] == tokenizer + "-other"
@@ -0,0 +1,134 @@
+import os
+import re
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+import ingest
+from core.config import CONFIG, override_config
+from core.store import generation_name, generations_lock, get_client, get_or_create_collection, read_generations, write_generations
+
+from .conftest import ROOT
+
+UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+@pytest.fixture
+def served(fake_openai, kb_dir):
+    """An index built in place from kb_dir (generation 0), as plain ingest.py leaves it."""
+    override_config(max_best_distance=2.0, answer_cache_enabled=False)
+    ingest.ingest(kb_dir)
+    return kb_dir
+
+
+def state():
+    return read_generations(CONFIG.db_dir, CONFIG.collection_name)
+
+
+def collections():
+    return sorted(c.name for c in get_client(CONFIG.db_dir).list_collections())
+
+
+def test_reload_switches_readers_to_the_new_generation(served):
+    from core.rag_pipeline import run_rag
+
+    (served / "06_new.md").write_text("# Gym partners\n\nMembers get free entry to Zorblax gyms.\n")
+    report = ingest.reload_index(served)
+
+    assert report["ok"] and report["generation"] == 1
+    assert state()["active"] == generation_name(CONFIG.collection_name, 1)
+    assert collections() == [generation_name(CONFIG.collection_name, 1)]
+    result = run_rag("Zorblax gyms")
+    assert result["debug"]["kb_generation"] == 1
+    assert result["debug"]["retrieved"][0]["source"] == "06_new.md"
+
+
+def test_failed_validation_keeps_the_current_generation(served, tmp_path):
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    with pytest.raises(ingest.ReloadError):
+        ingest.reload_index(empty)
+
+    current = state()
+    assert current["active"] == CONFIG.collection_name
+    assert current["building"] is None
+    assert current["last_reload"]["ok"] is False
+    assert collections() == [CONFIG.collection_name]
+
+
+def test_reloads_leave_no_orphan_index_files(served):
+    for n in range(2):
+        (served / "06_new.md").write_text(f"# Update {n}\n\nRevision {n} of the gym partner list.\n")
+        ingest.reload_index(served)
+
+    live = {os.path.basename(p) for p in ingest.segment_dirs(CONFIG.db_dir, state()["active"])}
+    on_disk = {name for name in os.listdir(CONFIG.db_dir) if UUID.match(name)}
+    assert live, "segment lookup found nothing: has chromadb's catalog layout changed?"
+    assert on_disk == live
+
+
+def test_reloads_wait_for_a_reload_in_another_process(served):
+    # Another process holds the generations lock, as a reload in progress would
+    holder = subprocess.Popen(
+        [sys.executable, "-c", textwrap.dedent(f"""
+            import sys
+            sys.path.insert(0, {str(ROOT)!r})
+            from core.store import generations_lock
+            with generations_lock({CONFIG.db_dir!r}, {CONFIG.collection_name!r}):
+                print("locked", flush=True)
+                sys.stdin.read()
+        """)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        reload = threading.Thread(target=ingest.reload_index, args=(served,))
+        reload.start()
+        time.sleep(0.5)
+        assert reload.is_alive()
+        assert state()["building"] is None
+    finally:
+        holder.stdin.close()
+        holder.wait(timeout=10)
+    reload.join(timeout=60)
+    assert state()["generation"] == 1
+
+
+def test_abandoned_build_and_retired_generation_are_reclaimed(served):
+    stale, retired = generation_name(CONFIG.collection_name, 3), "old_generation"
+    get_or_create_collection(CONFIG.db_dir, stale)
+    get_or_create_collection(CONFIG.db_dir, retired)
+    with generations_lock(CONFIG.db_dir, CONFIG.collection_name):
+        write_generations(CONFIG.db_dir, CONFIG.collection_name, dict(
+            state(), building=3, retired=[{"name": retired, "drop_after": time.time() - 1}],
+        ))
+
+    report = ingest.reload_index(served)
+
+    assert report["generation"] == 4
+    assert collections() == [generation_name(CONFIG.collection_name, 4)]
+    assert state()["retired"] == []
+
+
+def test_if_changed_skips_a_reload_that_another_one_already_did(served):
+    assert ingest.reload_index(served, if_changed=True) is None
+    assert state()["generation"] == 0
+
+
+def test_segment_lookup_fails_closed_on_an_untested_chromadb(served, monkeypatch):
+    import chromadb
+
+    monkeypatch.setattr(chromadb, "__version__", "9.0.0")
+    assert ingest.segment_dirs(CONFIG.db_dir, CONFIG.collection_name) == []
+    ingest.drop_generation(CONFIG.db_dir, CONFIG.collection_name)
+    assert any(UUID.match(name) for name in os.listdir(CONFIG.db_dir))
+
+
+def test_segment_lookup_fails_closed_on_an_unknown_catalog_schema(served, monkeypatch):
+    assert ingest.segment_dirs(CONFIG.db_dir, CONFIG.collection_name)
+    monkeypatch.setattr(ingest, "SEGMENT_CATALOG_COLUMNS", ("id", "type", "scope", "collection", "path"))
+    assert ingest.segment_dirs(CONFIG.db_dir, CONFIG.collection_name) == []
@@ -0,0 +1,97 @@
+import glob
+import os
+import threading
+
+import ingest
+from core.config import CONFIG
+from core.embeddings import embed_texts
+from core.lexical_index import LexicalIndex, build_lexical_index, get_lexical_index, index_dir
+from core.retriever import fuse_lexical
+from core.store import active_collection
+from core import versioned_dir
+from core.versioned_dir import remove_dir
+
+DOCS = [
+    ("a", "gastric sleeve surgery recovery takes two weeks"),
+    ("b", "pricing for the gastric balloon program"),
+    ("c", "our privacy policy covers patient data"),
+    ("d", "sleeve sleeve sleeve surgery"),
+]
+
+
+def test_bm25_ranks_matching_chunks_only(tmp_path):
+    path = str(tmp_path / "bm25")
+    build_lexical_index(DOCS, path)
+    index = LexicalIndex(path)
+
+    hits = index.search("sleeve surgery", 10)
+    assert [chunk_id for chunk_id, _ in hits] == ["d", "a"]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search("unrelated words", 10) == []
+    assert [chunk_id for chunk_id, _ in index.search("gastric", 1)] in (["a"], ["b"])
+
+
+def test_rebuild_never_hides_the_index_from_readers(tmp_path, monkeypatch):
+    path = str(tmp_path / "bm25")
+    build_lexical_index(DOCS, path)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                assert LexicalIndex(path).search("privacy", 5)[0][0] == "c"
+            except Exception as e:  # noqa: BLE001 - reported below
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for _ in range(30):
+            build_lexical_index(DOCS, path)
+    finally:
+        done.set()
+        reader.join()
+
+    assert errors == []
+    assert os.path.islink(path)
+    # Replaced versions stay for readers still loading them, then go
+    assert len(glob.glob(path + ".v*")) == 31
+    monkeypatch.setattr(versioned_dir, "RETIRED_VERSION_GRACE_S", 0.0)
+    build_lexical_index(DOCS, path)
+    assert glob.glob(path + ".v*") == [os.path.realpath(path)]
+
+    remove_dir(path)
+    assert not os.path.lexists(path) and glob.glob(path + ".v*") == []
+
+
+def test_plain_index_dir_is_migrated(tmp_path):
+    path = str(tmp_path / "bm25")
+    os.makedirs(path)
+    build_lexical_index(DOCS, path)
+    build_lexical_index(DOCS[:2], path)
+
+    assert os.path.islink(path)
+    assert LexicalIndex(path).n_docs == 2
+
+
+def test_rrf_merges_vector_and_bm25_hits(fake_openai, kb_dir):
+    ingest.ingest(kb_dir)
+    db_dir = CONFIG.db_dir
+    name = active_collection(db_dir, CONFIG.collection_name)
+    index = get_lexical_index(db_dir, name)
+    assert index is not None and os.path.islink(index_dir(db_dir, name))
+
+    query = "privacy policy"
+    qvec = embed_texts([query], CONFIG.embedding_model)
+    lexical = index.search(query, CONFIG.lexical_retrieve_k)
+    fused = fuse_lexical(query, qvec, [], db_dir, name, k=3)
+
+    # No vector hits: BM25 order, each hit fetched from the store with its rrf_score
+    assert [h["id"] for h in fused] == [chunk_id for chunk_id, _ in lexical[:3]]
+    assert all(h["text"] and h["rrf_score"] > 0 for h in fused)
+
+    # A chunk in both rankings beats the one only BM25 ranked first
+    vector_hits = [dict(fused[1], distance=0.1), dict(fused[2], distance=0.2)]
+    both = fuse_lexical(query, qvec, vector_hits, db_dir, name, k=3)
+    assert both[0]["id"] == fused[1]["id"]
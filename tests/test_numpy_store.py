@@ -0,0 +1,72 @@
+import glob
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from core.numpy_store import NumpyCollection, export_numpy_store
+from core.snapshot import export_snapshot, verify_snapshot
+
+
+def records(n=50, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return [(f"id{i}", f"doc {i}", {"source": f"{i % 3}.md"}, vectors[i]) for i in range(n)], vectors
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_query_matches_exact_cosine_ranking(tmp_path, dtype):
+    recs, vectors = records()
+    path = str(tmp_path / "store")
+    export_numpy_store(recs, path, dtype)
+    col = NumpyCollection(path)
+
+    q = vectors[7] + 0.01
+    res = col.query([q.tolist()], n_results=5, where={"source": "1.md"})
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    sims = unit @ (q / np.linalg.norm(q))
+    expected = [f"id{i}" for i in np.argsort(-sims) if i % 3 == 1][:5]
+    assert res["ids"][0][0] == "id7"
+    if dtype == "float32":
+        assert res["ids"][0] == expected
+    assert all(m["source"] == "1.md" for m in res["metadatas"][0])
+
+
+def test_reexport_never_hides_the_store_from_readers(tmp_path):
+    recs, _ = records()
+    path = str(tmp_path / "store")
+    export_numpy_store(recs, path)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                col = NumpyCollection(path)
+                assert col.get(ids=["id3"])["documents"] == ["doc 3"]
+            except Exception as e:  # noqa: BLE001 - reported below
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for _ in range(30):
+            export_numpy_store(recs, path)
+    finally:
+        done.set()
+        reader.join()
+
+    assert errors == []
+    assert os.path.islink(path)
+
+
+def test_snapshot_stays_a_plain_directory(tmp_path):
+    recs, _ = records()
+    path = str(tmp_path / "snapshot")
+    export_snapshot(recs, path, {"model": "m"}, {})
+    export_snapshot(recs, path, {"model": "m"}, {})
+
+    assert os.path.isdir(path) and not os.path.islink(path)
+    assert glob.glob(path + ".*") == []
+    assert verify_snapshot(path, {"model": "m"})["count"] == 50
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.config import override_config
+from core.embedding_cache import EmbeddingCache
+from core.embeddings import FakeEmbeddingBackend, QueryCoalescer, embed_query_async, set_embedding_backend
+
+MODEL = "text-embedding-3-small"
+
+
+@pytest.fixture
+def backend():
+    fake = FakeEmbeddingBackend(dim=8, latency_s=0.2)
+    set_embedding_backend(fake)
+    return fake
+
+
+def keep_busy(coalescer, backend):
+    """Put a call in flight, so the next queries wait for company."""
+    future = coalescer.submit("primer", MODEL)
+    deadline = time.monotonic() + 5
+    while not backend.requests and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return future
+
+
+def test_lone_query_is_sent_at_once(backend):
+    coalescer = QueryCoalescer(window_s=10.0, max_batch=64)
+    started = time.perf_counter()
+    vec, batch_size, queue_ms = coalescer.submit("question", MODEL).result(timeout=5)
+
+    assert time.perf_counter() - started < 5
+    assert vec == backend.vector("question") and batch_size == 1 and queue_ms < 100
+
+
+def test_queries_arriving_during_a_call_share_the_next_one(backend):
+    coalescer = QueryCoalescer(window_s=0.05, max_batch=64)
+    primer = keep_busy(coalescer, backend)
+    futures = [coalescer.submit(f"question {i}", MODEL) for i in range(10)]
+    results = [f.result(timeout=5) for f in futures]
+
+    assert primer.result(timeout=5)[1] == 1
+    assert backend.requests == 2
+    assert [r[0] for r in results] == [backend.vector(f"question {i}") for i in range(10)]
+    assert {r[1] for r in results} == {10}
+    assert coalescer.stats()["batches"] == 2
+
+
+def test_cancelled_async_caller_does_not_block_thread_caller(backend):
+    coalescer = QueryCoalescer(window_s=0.05, max_batch=64)
+    keep_busy(coalescer, backend)
+    thread_result = {}
+
+    async def impatient():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.wrap_future(coalescer.submit("async question", MODEL)), 0.01)
+
+    def patient():
+        thread_result["value"] = coalescer.submit("thread question", MODEL).result(timeout=5)
+
+    thread = threading.Thread(target=patient)
+    thread.start()
+    asyncio.run(impatient())
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert thread_result["value"][0] == backend.vector("thread question")
+    stats = coalescer.stats()
+    assert stats["cancelled"] == 1
+    assert stats["queries"] == 2  # primer and thread question
+
+
+def test_backend_failure_resolves_every_future():
+    def broken(texts, model):
+        raise RuntimeError("api down")
+
+    set_embedding_backend(broken)
+    coalescer = QueryCoalescer(window_s=0.02, max_batch=64)
+    futures = [coalescer.submit(f"q{i}", MODEL) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="api down"):
+            future.result(timeout=5)
+
+
+def test_async_query_uses_the_embedding_cache_off_the_event_loop(backend, tmp_path, monkeypatch):
+    override_config(embedding_cache_dir=str(tmp_path / "cache"), embedding_coalesce_window_ms=5.0)
+    threads = []
+    for name in ("get_many", "put_many"):
+        original = getattr(EmbeddingCache, name)
+
+        def recording(self, *args, _original=original, **kwargs):
+            threads.append(threading.current_thread())
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(EmbeddingCache, name, recording)
+
+    async def ask_twice():
+        first = await embed_query_async("question", MODEL)
+        return first, await embed_query_async("question", MODEL)
+
+    first, second = asyncio.run(ask_twice())
+    expected = pytest.approx(backend.vector("question"), abs=1e-6)
+    assert first[0] == expected and second[0] == expected
+    assert backend.requests == 1
+    assert len(threads) == 3 and threading.main_thread() not in threads
@@ -0,0 +1,71 @@
+import multiprocessing
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import ingest
+import serve
+from core.config import CONFIG, override_config
+from core.embedding_cache import EmbeddingCache
+from serve import RestartPolicy
+
+from .conftest import ROOT
+
+
+def test_restart_policy_backs_off_then_gives_up():
+    policy = RestartPolicy(grace_s=10, base_s=0.5, max_s=1.5, max_failed_starts=4)
+    assert [policy.delay(0.1) for _ in range(3)] == [0.5, 1.0, 1.5]
+    assert policy.delay(0.1) is None
+
+
+def test_restart_policy_resets_after_a_healthy_run():
+    policy = RestartPolicy(grace_s=10, base_s=0.5, max_failed_starts=3)
+    policy.delay(0.1)
+    policy.delay(0.1)
+    assert policy.delay(60.0) == 0.0
+    assert policy.delay(0.1) == 0.5
+
+
+def test_server_exits_nonzero_when_workers_cannot_start(tmp_path):
+    # Empty db_dir: every worker fails its warm-up (no collection)
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {str(ROOT)!r})
+        import serve
+        from core.config import override_config
+        override_config(db_dir={str(tmp_path / "db")!r}, snapshot_dir="")
+        serve.RESTART_BACKOFF_S = 0.01
+        serve.MAX_FAILED_STARTS = 3
+        serve.main(["--fake", "--workers", "1", "--port", "0"])
+    """)
+    proc = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, timeout=120)
+
+    assert proc.returncode == 1
+    assert proc.stderr.count("Traceback") == 3
+    assert "giving up" in proc.stderr
+
+
+def embed_in_worker(worker):
+    from core.embeddings import embed_texts
+    embed_texts([f"question {worker}-{i}" for i in range(30)], CONFIG.embedding_model)
+
+
+def test_forked_workers_append_to_one_embedding_cache(fake_openai, kb_dir, tmp_path):
+    override_config(embedding_cache_dir=str(tmp_path / "cache"))
+    ingest.ingest(kb_dir)
+    serve.preload()
+
+    # As serve.py's workers: forked after preload(), each appending what it embedded
+    workers = multiprocessing.get_context("fork").Pool(3)
+    try:
+        workers.map(embed_in_worker, range(3))
+    finally:
+        workers.close()
+        workers.join()
+
+    texts = [f"question {w}-{i}" for w in range(3) for i in range(30)]
+    stored = EmbeddingCache(CONFIG.embedding_cache_dir).get_many(texts, CONFIG.embedding_model)
+    backend = fake_openai.embedding_backend
+    assert all(vec == pytest.approx(backend.vector(t), abs=1e-6) for t, vec in zip(texts, stored))
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from core import rag_pipeline
+from core.config import override_config
+
+
+def test_failed_rerank_cancels_the_speculative_generation(fake_openai, monkeypatch):
+    override_config(speculative_generation=True)
+    started = []
+
+    class Recording(rag_pipeline._Speculation):
+        def start(self):
+            started.append(self)
+            super().start()
+
+    def broken_rerank(*args, **kwargs):
+        raise RuntimeError("rerank failed")
+
+    monkeypatch.setattr(rag_pipeline, "_Speculation", Recording)
+    monkeypatch.setattr(rag_pipeline, "rerank", broken_rerank)
+    candidates = [{"id": f"c{i}", "text": f"chunk {i}", "source": "a.md", "distance": 0.5} for i in range(3)]
+
+    with pytest.raises(RuntimeError, match="rerank failed"):
+        rag_pipeline.speculative_answer("question", candidates, rag_pipeline.Trace())
+
+    assert len(started) == 1
+    assert started[0]._cancelled.is_set()
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_guess_is_rejected_when_the_budget_dropped_the_top_reranked_hit(fake_openai, monkeypatch, use_async):
+    # Five long hits against a budget that packs only the first one or two
+    override_config(speculative_generation=True, keep_n_after_rerank=5, context_token_budget=450)
+    candidates = [
+        {"id": f"c{i}", "text": f"topic{i} " * 100, "source": f"{i}.md", "distance": 0.1 * i}
+        for i in range(5)
+    ]
+    guess_blocks, _ = rag_pipeline._guess(candidates, rag_pipeline.Trace())
+    packed = {i for b in guess_blocks for i in b["ids"]}
+    assert "c0" in packed and "c4" not in packed
+
+    promoted = [candidates[4], candidates[0]]
+    monkeypatch.setattr(rag_pipeline, "rerank", lambda *args: (promoted, {}))
+
+    async def rerank_async(*args):
+        return promoted, {}
+
+    monkeypatch.setattr(rag_pipeline, "rerank_async", rerank_async)
+    trace = rag_pipeline.Trace()
+    if use_async:
+        _, blocks, debug = asyncio.run(rag_pipeline.speculative_answer_async("question", candidates, trace))
+    else:
+        _, blocks, debug = rag_pipeline.speculative_answer("question", candidates, trace)
+
+    assert debug["speculative"]["accepted"] is False
+    assert "c4" in {i for b in blocks for i in b["ids"]}
+    assert debug["speculative"]["speculative_ms"] >= 0
+
+
+def test_rejected_async_speculation_has_ended_before_the_answer_returns(fake_openai, monkeypatch):
+    override_config(speculative_generation=True)
+    candidates = [{"id": f"c{i}", "text": f"chunk {i}", "source": "a.md", "distance": 0.5} for i in range(3)]
+    events = []
+
+    async def generation(**kwargs):
+        if events:
+            return "answer"
+        events.append("speculation started")
+        try:
+            await asyncio.sleep(10)
+        finally:
+            events.append("speculation ended")
+
+    async def slow_rerank(*args):
+        await asyncio.sleep(0.01)
+        return [{"id": "other", "text": "other chunk", "source": "b.md"}], {}
+
+    monkeypatch.setattr(rag_pipeline, "rerank_async", slow_rerank)
+    monkeypatch.setattr(rag_pipeline, "generate_grounded_answer_async", generation)
+
+    async def main():
+        result = await rag_pipeline.speculative_answer_async("question", candidates, rag_pipeline.Trace())
+        return result, list(events)
+
+    (answer, _, debug), seen = asyncio.run(main())
+    assert answer == "answer" and debug["speculative"]["accepted"] is False
+    # The cancelled task was awaited, not left for the event loop to finish later
+    assert seen == ["speculation started", "speculation ended"]
+    assert 10 <= debug["speculative"]["speculative_ms"] < 5000
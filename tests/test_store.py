@@ -0,0 +1,74 @@
+import threading
+
+from core import store
+from core.store import get_client, get_collection, get_or_create_collection, store_stats
+
+NAME = "kb-test"
+
+
+def counters_since(before):
+    after = store_stats()
+    return {k: after[k] - before.get(k, 0) for k in after}
+
+
+def add(col, *ids):
+    col.upsert(ids=list(ids), documents=list(ids), embeddings=[[1.0, 0.0, 0.0]] * len(ids))
+
+
+def test_one_client_and_handle_per_collection(tmp_path):
+    db_dir = str(tmp_path)
+    before = store_stats()
+    add(get_or_create_collection(db_dir, NAME), "a")
+    first = get_collection(db_dir, NAME)
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(get_collection(db_dir, NAME)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert get_client(db_dir + "/") is get_client(db_dir)
+    assert all(h is first for h in handles)
+    stats = counters_since(before)
+    assert stats["client_opens"] == 1 and stats["collection_opens"] == 1
+    assert stats["collection_reuses"] >= 8 and store_stats()["collections_cached"] == 1
+
+
+def test_writes_revalidate_the_cached_handle(tmp_path):
+    db_dir = str(tmp_path)
+    col = get_or_create_collection(db_dir, NAME)
+    add(col, "a")
+    get_collection(db_dir, NAME)
+    before = store_stats()
+    add(col, "b")
+
+    again = get_collection(db_dir, NAME)
+    assert again.id == col.id and again.count() == 2
+    stats = counters_since(before)
+    assert stats["collection_revalidations"] == 1 and stats["collection_swaps"] == 0
+
+
+def test_recreated_collection_is_detected_as_a_swap(tmp_path):
+    db_dir = str(tmp_path)
+    old = get_or_create_collection(db_dir, NAME)
+    add(old, "a", "b")
+    get_collection(db_dir, NAME)
+    before = store_stats()
+
+    # As ingest --full in another process would: delete and re-create behind our back
+    client = get_client(db_dir)
+    client.delete_collection(name=NAME)
+    add(client.create_collection(name=NAME, metadata={"hnsw:space": "cosine"}), "c")
+
+    fresh = get_collection(db_dir, NAME)
+    assert fresh.id != old.id and fresh.get()["ids"] == ["c"]
+    assert counters_since(before)["collection_swaps"] == 1
+
+
+def test_reset_store_drops_pooled_clients(tmp_path):
+    get_or_create_collection(str(tmp_path), NAME)
+    store.reset_store()
+
+    stats = store_stats()
+    assert stats["clients_cached"] == 0 and stats["collections_cached"] == 0